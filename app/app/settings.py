@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
 from pathlib import Path
+import copy
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',  # first, so it times everything below
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,6 +84,13 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Set DB_CONN_MAX_AGE to keep connections open between requests for that
+# many seconds (checked before reuse) under WSGI only. Under ASGI (app.asgi,
+# uvicorn) Django opens persistent connections per request and never
+# reuses them, so they pile up until the server's max_connections; leave
+# it at 0 there. Set DB_POOL_MAX_SIZE to use a psycopg 3 connection pool
+# per process instead, which works under both; size it to the worker's
+# threads (see /api/internal/db-pool/ for its usage).
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -89,9 +98,47 @@ DATABASES = {
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
     }
 }
 
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 0))
+if DB_POOL_MAX_SIZE:
+    DATABASES['default']['CONN_MAX_AGE'] = 0  # the pool replaces persistent connections
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': min(int(os.environ.get('DB_POOL_MIN_SIZE', 2)), DB_POOL_MAX_SIZE),
+        'max_size': DB_POOL_MAX_SIZE,
+        # seconds a request waits for a connection before failing
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'max_waiting': int(os.environ.get('DB_POOL_MAX_WAITING', 0)),
+        'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 600)),
+        'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 3600)),
+    }
+
+# Read replicas with the primary's credentials, e.g.
+# DB_REPLICA_HOSTS=db-replica-1,db-replica-2. Safe requests to the recipe
+# and user APIs read from a random one (core/db.py), except for
+# DB_REPLICA_PIN_SECONDS after the user's last write. The pin is kept in
+# the default cache, so with several worker processes CACHE_BACKEND must
+# be shared (e.g. Redis or memcached); the default locmem cache only pins
+# the user in the worker that handled the write.
+# In tests every replica is a mirror of the default test database rather
+# than a database of its own (core/testing.py adds one if there are none).
+DB_REPLICA_HOSTS = [
+    host.strip() for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host.strip()
+]
+for number, host in enumerate(DB_REPLICA_HOSTS, 1):
+    DATABASES[f'replica{number}'] = {
+        **copy.deepcopy(DATABASES['default']),
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+DB_REPLICAS = [f'replica{n}' for n in range(1, len(DB_REPLICA_HOSTS) + 1)]
+DB_REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', 5))
+DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -135,6 +182,13 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Stores media like FileSystemStorage, but writes content-addressed names
+# (see RECIPE_IMAGE_CONTENT_ADDRESSED) only once
+STORAGES = {
+    'default': {'BACKEND': 'core.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -148,6 +202,106 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# Cache used for per-user API responses. Local memory by default; set
+# CACHE_BACKEND/CACHE_LOCATION to share it between workers, e.g.
+# django.core.cache.backends.redis.RedisCache and redis://redis:6379/0
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 10000)),
+        },
+    }
+}
+RECIPE_CACHE_ALIAS = 'default'
+RECIPE_CACHE_TIMEOUT = int(os.environ.get('RECIPE_CACHE_TIMEOUT', 300))
+
+# In-process cache of token -> user lookups for CachedTokenAuthentication.
+# Set TOKEN_AUTH_SHARED_CACHE to a CACHES alias to share it between workers.
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': int(os.environ.get('TOKEN_AUTH_CACHE_SIZE', 10000)),
+    'TTL': int(os.environ.get('TOKEN_AUTH_CACHE_TTL', 60)),
+    'SHARED_CACHE_ALIAS': os.environ.get('TOKEN_AUTH_SHARED_CACHE') or None,
+}
+
+# Password checks of the async token endpoint (user/login.py) run on
+# WORKERS threads; once QUEUE more are waiting, logins get a 503. Tokens
+# of just-verified credentials are reused for REUSE_TTL seconds.
+TOKEN_LOGIN = {
+    'WORKERS': int(os.environ.get('TOKEN_LOGIN_WORKERS', os.cpu_count() or 1)),
+    'QUEUE': int(os.environ.get('TOKEN_LOGIN_QUEUE', 32)),
+    'REUSE_TTL': int(os.environ.get('TOKEN_LOGIN_REUSE_TTL', 30)),
+    'REUSE_SIZE': int(os.environ.get('TOKEN_LOGIN_REUSE_SIZE', 10000)),
+}
+
+# Opt-in cursor pagination for the recipe list (?cursor= / ?page_size=)
+RECIPE_PAGE_SIZE = int(os.environ.get('RECIPE_PAGE_SIZE', 25))
+RECIPE_MAX_PAGE_SIZE = int(os.environ.get('RECIPE_MAX_PAGE_SIZE', 100))
+
+# Render recipe, tag and ingredient lists from values() rows instead of
+# through the DRF serializers (recipe/fast.py); same output, less CPU
+RECIPE_FAST_SERIALIZERS = bool(int(os.environ.get('RECIPE_FAST_SERIALIZERS', 1)))
+
+# Recipes read (and tags/ingredients prefetched) per query by the export
+RECIPE_EXPORT_CHUNK_SIZE = int(os.environ.get('RECIPE_EXPORT_CHUNK_SIZE', 500))
+
+# Number of best matches returned for ?search= on the recipe list
+RECIPE_SEARCH_LIMIT = int(os.environ.get('RECIPE_SEARCH_LIMIT', 50))
+
+# Resized copies of uploaded recipe images, generated off the request
+# thread (recipe/images.py). Set RECIPE_IMAGE_VARIANTS_SYNC=1 to generate
+# them inline instead, e.g. when no worker threads are wanted.
+RECIPE_IMAGE_VARIANTS = {
+    'SIZES': (128, 512, 1024),
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': int(os.environ.get('RECIPE_IMAGE_QUALITY', 80)),
+    'LIST_SIZE': 128,  # size shipped as the list thumbnail
+    'WORKERS': int(os.environ.get('RECIPE_IMAGE_WORKERS', 2)),
+    'SYNC': bool(int(os.environ.get('RECIPE_IMAGE_VARIANTS_SYNC', 0))),
+}
+
+# Limits for recipe image uploads (recipe/uploads.py); larger files are
+# rejected with 413 while they are still being received.
+RECIPE_IMAGE_UPLOAD = {
+    'MAX_BYTES': int(os.environ.get('RECIPE_IMAGE_MAX_BYTES', 10 * 2**20)),
+    'MAX_PIXELS': int(os.environ.get('RECIPE_IMAGE_MAX_PIXELS', 40_000_000)),
+    'CHUNK_SIZE': 64 * 2**10,
+}
+
+# Name recipe images by the SHA-256 of their contents so identical uploads
+# share one file (core/storage.py). Run `manage.py gc_media` periodically
+# to delete files no recipe uses any more.
+RECIPE_IMAGE_CONTENT_ADDRESSED = bool(int(os.environ.get('RECIPE_IMAGE_CONTENT_ADDRESSED', 0)))
+
+# Per-request metrics (core/middleware.py). Set REQUEST_SERVER_TIMING=0 to
+# keep the timings out of responses; the JSON log lines and histograms of
+# the last HISTOGRAM_WINDOW seconds are always kept.
+REQUEST_METRICS = {
+    'SERVER_TIMING': bool(int(os.environ.get('REQUEST_SERVER_TIMING', 1))),
+    'HISTOGRAM_SAMPLES': int(os.environ.get('REQUEST_HISTOGRAM_SAMPLES', 1000)),
+    'HISTOGRAM_WINDOW': int(os.environ.get('REQUEST_HISTOGRAM_WINDOW', 300)),
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.middleware': {
+            'handlers': ['console'],
+            'level': os.environ.get('REQUEST_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+TEST_RUNNER = 'core.testing.TestRunner'
+
 # DRF Spectacular settings
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST':True,
@@ -17,6 +17,11 @@ urlpatterns = [
     path('api/schema/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
+    # Native async read endpoints, served without a sync bridge under ASGI
+    path('api/async/user/', include('user.async_urls')),
+    path('api/async/recipe/', include('recipe.async_urls')),
+    # Staff-only operational endpoints
+    path('api/internal/', include('core.urls')),
 ]
 
 if settings.DEBUG:
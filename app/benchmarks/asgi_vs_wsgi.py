@@ -0,0 +1,85 @@
+'''
+Compare WSGI and ASGI throughput at the same worker count
+
+Starts gunicorn (sync workers, app.wsgi) and uvicorn (app.asgi) in turn
+against the configured database and loads the same read endpoint on each:
+the DRF view under WSGI, and both the DRF and the native async view under
+ASGI. Needs gunicorn and uvicorn installed and a token for a user with
+some recipes, e.g. from `python manage.py drf_create_token <email>`.
+
+    python -m benchmarks.asgi_vs_wsgi --token <key> --workers 1 -c 100
+'''
+
+import argparse
+import json
+import os
+import sys
+
+from benchmarks.common import free_port, run_load, start_server, stop_server
+
+ENDPOINTS = {
+    'recipes': ('/api/recipe/recipes/', '/api/async/recipe/recipes/'),
+    'tags': ('/api/recipe/tags/', '/api/async/recipe/tags/'),
+    'me': ('/api/user/me/', '/api/async/user/me/'),
+}
+
+
+def server_args(kind, port, workers):
+    bind = f'127.0.0.1:{port}'
+    if kind == 'wsgi':
+        return [
+            sys.executable, '-m', 'gunicorn', 'app.wsgi:application',
+            '--bind', bind, '--workers', str(workers), '--log-level', 'warning',
+        ]
+    return [
+        sys.executable, '-m', 'uvicorn', 'app.asgi:application',
+        '--host', '127.0.0.1', '--port', str(port),
+        '--workers', str(workers), '--log-level', 'warning', '--no-access-log',
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--token', default=os.environ.get('BENCH_TOKEN'), required='BENCH_TOKEN' not in os.environ)
+    parser.add_argument('--endpoint', choices=ENDPOINTS, default='recipes')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('-c', '--concurrency', type=int, default=50)
+    parser.add_argument('-d', '--duration', type=float, default=10)
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    args = parser.parse_args(argv)
+
+    sync_path, async_path = ENDPOINTS[args.endpoint]
+    headers = {'Authorization': f'Token {args.token}'}
+    runs = (
+        ('wsgi', 'drf', sync_path),
+        ('asgi', 'drf', sync_path),
+        ('asgi', 'async', async_path),
+    )
+
+    results = []
+    for kind, view, path in runs:
+        port = free_port()
+        proc = start_server(server_args(kind, port, args.workers), port)
+        try:
+            url = f'http://127.0.0.1:{port}{path}'
+            # Warm up connections, caches and the token LRU
+            run_load(url, headers, concurrency=args.concurrency, duration=1)
+            stats = run_load(url, headers, args.concurrency, args.duration)
+        finally:
+            stop_server(proc)
+        stats.update(server=kind, view=view, path=path, workers=args.workers,
+                     concurrency=args.concurrency)
+        results.append(stats)
+        print(
+            f'{kind:<5} {view:<6} {stats["req_per_sec"]:>9} req/s  '
+            f'p50 {stats["p50_ms"]}ms  p95 {stats["p95_ms"]}ms  '
+            f'p99 {stats["p99_ms"]}ms  errors {stats["errors"]}'
+        )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
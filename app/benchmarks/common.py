@@ -0,0 +1,124 @@
+'''
+Helpers shared by the benchmark scripts
+'''
+
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import threading
+import time
+from urllib.parse import urlsplit
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    '''Return a TCP port nothing is listening on.'''
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, port, timeout=30):
+    '''Start a server process from the app directory and wait for its port.'''
+    proc = subprocess.Popen(args, cwd=APP_DIR)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'{args[0]} exited with {proc.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f'{args[0]} did not start listening on {port}')
+
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def percentile(samples, pct):
+    '''Return the pct-th percentile of sorted samples.'''
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, round(pct / 100 * (len(samples) - 1)))
+    return samples[index]
+
+
+def run_requests(base_url, make_request, concurrency=50, duration=10, ok=(200,)):
+    '''Send requests from concurrency keep-alive connections for duration seconds.
+
+    make_request() returns (method, path, body, headers) for the next
+    request, or None once it has nothing left to send (e.g. no more rows
+    to delete). Returns a dict with the request rate, error count and
+    latency percentiles in milliseconds.
+    '''
+    parts = urlsplit(base_url)
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def connect():
+        return http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+
+    def worker():
+        conn = connect()
+        mine, failed = [], 0
+        while time.monotonic() < stop_at:
+            request = make_request()
+            if request is None:
+                break
+            method, path, body, headers = request
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                res = conn.getresponse()
+                res.read()
+                if res.status not in ok:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = connect()
+                continue
+            mine.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+            errors.append(failed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'req_per_sec': round(len(latencies) / elapsed, 1),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def run_load(url, headers=None, concurrency=50, duration=10):
+    '''GET url from concurrency keep-alive connections for duration seconds.'''
+    parts = urlsplit(url)
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    request = ('GET', path, None, headers)
+    return run_requests(url, lambda: request, concurrency, duration)
@@ -0,0 +1,482 @@
+'''
+Latency and throughput of every recipe and user API route
+
+Seeds one user per data profile (10, 1k and 100k recipes, each with 5-30
+tags and 5-30 ingredients) with the generate_dataset command into the
+benchmark database described in
+benchmarks/settings.py, starts the app under gunicorn or uvicorn and loads
+every route of recipe/urls.py and user/urls.py at each concurrency level.
+Reads run before writes, and deletes run last. Writes and deletes only
+touch rows created for them (recipes, tags and ingredients of the
+profile's user, and a user of their own for the me routes), which are
+removed once the profile's scenarios are done. The seeded rows are never
+changed, so runs on the same --seed and profiles, --reuse included, see
+the same data and can be compared:
+
+    python -m benchmarks.endpoints --profiles small,medium -c 1,10 --output new.json
+    python -m benchmarks.endpoints --reuse --compare new.json --output newer.json
+
+--compare exits with status 1 if a run's p95 latency or throughput got
+worse than the baseline by more than --threshold percent.
+'''
+
+import argparse
+import fnmatch
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from benchmarks.asgi_vs_wsgi import server_args
+from benchmarks.common import APP_DIR, free_port, run_requests, start_server, stop_server
+
+PROFILES = {'small': 10, 'medium': 1_000, 'large': 100_000}
+PASSWORD = 'benchpass123'
+TAGS_PER_RECIPE = (5, 30)
+TAG_POOL = 300
+INGREDIENT_POOL = 600
+DELETE_POOL = 2_000
+UPDATE_POOL = 200
+SCRATCH = 'scratch'  # prefix of the titles, names and emails of created rows
+
+
+def bench_email(profile):
+    return f'bench-{profile}@example.com'
+
+
+def seed_profile(profile, recipes, seed):
+    '''Create the user of a profile with its tags, ingredients and recipes.'''
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from rest_framework.authtoken.models import Token
+
+    call_command(
+        'generate_dataset', users=1, recipes=recipes, email=bench_email(profile),
+        password=PASSWORD, tags_per_user=TAG_POOL, ingredients_per_user=INGREDIENT_POOL,
+        tags_per_recipe=TAGS_PER_RECIPE, ingredients_per_recipe=TAGS_PER_RECIPE,
+        seed=seed, verbosity=0, stdout=io.StringIO(),
+    )
+    user = get_user_model().objects.get(email=bench_email(profile))
+    Token.objects.create(user=user)
+    return user
+
+
+def load_profile(profile, recipes, seed, reuse):
+    '''Return the ids and token the scenarios of a profile need.'''
+    from django.contrib.auth import get_user_model
+
+    from core.models import Ingredient, Recipe, Tag
+
+    user = get_user_model().objects.filter(email=bench_email(profile)).first()
+    if user is not None:
+        remove_scratch(user.id)  # left behind by an interrupted run
+        if not (reuse and user.recipe_set.count() >= recipes):
+            user.delete()
+            user = None
+    if user is None:
+        started = time.monotonic()
+        user = seed_profile(profile, recipes, seed)
+        print(f'Seeded {profile}: {recipes} recipes in {time.monotonic() - started:.1f}s')
+
+    return {
+        'name': profile,
+        'recipes': recipes,
+        'user_id': user.id,
+        'email': user.email,
+        'token': user.auth_token.key,
+        'recipe_ids': list(Recipe.objects.filter(user=user).values_list('id', flat=True)[:1000]),
+        'tag_ids': list(Tag.objects.filter(user=user).values_list('id', flat=True)),
+        'ingredient_ids': list(Ingredient.objects.filter(user=user).values_list('id', flat=True)),
+    }
+
+
+def create_deletable(profile, kind):
+    '''Create rows for a delete scenario to remove; return their ids.'''
+    from core.models import Ingredient, Recipe, Tag
+
+    user_id = profile['user_id']
+    prefix = f'{SCRATCH}-{uuid.uuid4().hex[:8]}'
+    if kind == 'recipe':
+        objs = [
+            Recipe(user_id=user_id, title=f'{prefix} {i}', time_minutes=1, price=Decimal('1.00'))
+            for i in range(DELETE_POOL)
+        ]
+    else:
+        model = Tag if kind == 'tag' else Ingredient
+        objs = [model(user_id=user_id, name=f'{prefix}-{i}') for i in range(DELETE_POOL)]
+    return [obj.id for obj in type(objs[0]).objects.bulk_create(objs)]
+
+
+def create_updatable(profile):
+    '''Create recipes, tags and ingredients for the update scenarios.
+
+    Each recipe gets 5-30 of the new tags and ingredients, like the seeded
+    ones, so renaming them touches only new recipes. Returns their ids by
+    kind.
+    '''
+    from core.models import Ingredient, Recipe, Tag
+
+    user_id = profile['user_id']
+    prefix = f'{SCRATCH}-{uuid.uuid4().hex[:8]}'
+    rng = random.Random(profile['name'])
+    ids = {
+        kind: [obj.id for obj in model.objects.bulk_create(
+            model(user_id=user_id, name=f'{prefix}-{i}') for i in range(UPDATE_POOL)
+        )]
+        for kind, model in (('tag', Tag), ('ingredient', Ingredient))
+    }
+    recipes = Recipe.objects.bulk_create(
+        Recipe(user_id=user_id, title=f'{prefix} {i}', time_minutes=1, price=Decimal('1.00'))
+        for i in range(UPDATE_POOL)
+    )
+    ids['recipe'] = [recipe.id for recipe in recipes]
+    for kind, through in (('tag', Recipe.tags.through), ('ingredient', Recipe.ingredients.through)):
+        through.objects.bulk_create(
+            through(recipe_id=recipe.id, **{f'{kind}_id': pk})
+            for recipe in recipes
+            for pk in rng.sample(ids[kind], rng.randint(*TAGS_PER_RECIPE))
+        )
+    return ids
+
+
+def create_scratch_user():
+    '''Create a user for the me update scenarios; return its email and token.'''
+    from django.contrib.auth import get_user_model
+    from rest_framework.authtoken.models import Token
+
+    user = get_user_model().objects.create_user(
+        email=f'{SCRATCH}-{uuid.uuid4().hex}@example.com', password=PASSWORD, name='Scratch',
+    )
+    return user.email, Token.objects.create(user=user).key
+
+
+def remove_scratch(user_id):
+    '''Delete the rows the scenarios created for a profile's user.'''
+    from django.contrib.auth import get_user_model
+
+    from core.models import Ingredient, Recipe, Tag
+
+    Recipe.objects.filter(user_id=user_id, title__startswith=SCRATCH).delete()
+    for model in (Tag, Ingredient):
+        model.objects.filter(user_id=user_id, name__startswith=f'{SCRATCH}-').delete()
+    get_user_model().objects.filter(email__startswith=f'{SCRATCH}-').delete()
+
+
+def multipart_image():
+    '''Return (body, content type) of an image upload.'''
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (800, 600), (200, 120, 40)).save(buffer, format='JPEG')
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        'Content-Disposition: form-data; name="image"; filename="bench.jpg"\r\n'
+        'Content-Type: image/jpeg\r\n\r\n'
+    ).encode() + buffer.getvalue() + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def scenarios(profile):
+    '''Return [(name, ok statuses, make_request factory)] for every route.
+
+    Factories are called right before their scenario runs, so the rows the
+    update and delete scenarios change are only created when needed.
+    '''
+    auth = {'Authorization': f'Token {profile["token"]}'}
+    json_auth = {**auth, 'Content-Type': 'application/json'}
+    rng = random.Random(profile['name'])
+    counter = itertools.count()
+    recipes, tags, ingredients = (
+        profile['recipe_ids'], profile['tag_ids'], profile['ingredient_ids'],
+    )
+
+    def get(path):
+        request = ('GET', path, None, auth)
+        return lambda: lambda: request
+
+    def each(method, make_path, make_body=None, headers=json_auth):
+        def factory():
+            def make_request():
+                n = next(counter)
+                body = json.dumps(make_body(n)).encode() if make_body else None
+                return method, make_path(n), body, headers
+            return make_request
+        return factory
+
+    updatable = {}
+
+    def pool(kind):
+        '''Return a random id of the rows created for the update scenarios.'''
+        if not updatable:
+            updatable.update(create_updatable(profile))
+        return rng.choice(updatable[kind])
+
+    me_user = {}
+
+    def me_auth():
+        if not me_user:
+            email, token = create_scratch_user()
+            me_user.update(email=email, headers={
+                'Authorization': f'Token {token}', 'Content-Type': 'application/json',
+            })
+        return me_user
+
+    def each_me(method, make_body):
+        def factory():
+            user = me_auth()
+            return each(method, lambda n: '/api/user/me/', lambda n: make_body(n, user),
+                        headers=user['headers'])()
+        return factory
+
+    def drain(kind, path):
+        def factory():
+            ids = iter(create_deletable(profile, kind))
+            return lambda: (
+                None if (pk := next(ids, None)) is None
+                else ('DELETE', path.format(pk), None, auth)
+            )
+        return factory
+
+    def recipe_body(n):
+        return {
+            'title': f'{SCRATCH} recipe {n}', 'time_minutes': 30, 'price': '9.99',
+            'tags': [{'name': f'Tag {i}'} for i in rng.sample(range(TAG_POOL), 5)],
+            'ingredients': [{'name': f'Ingredient {i}'} for i in rng.sample(range(INGREDIENT_POOL), 5)],
+        }
+
+    def upload_image():
+        body, content_type = multipart_image()
+        headers = {**auth, 'Content-Type': content_type}
+        return lambda: lambda: (
+            'POST', f'/api/recipe/recipes/{pool("recipe")}/upload-image/', body, headers,
+        )
+
+    tag_filter = ','.join(str(pk) for pk in tags[:3])
+    ingredient_filter = ','.join(str(pk) for pk in ingredients[:3])
+
+    recipe = '/api/recipe/recipes/{}/'
+    tag = '/api/recipe/tags/{}/'
+    ingredient = '/api/recipe/ingredients/{}/'
+    return [
+        # reads
+        ('recipe-list', (200,), get('/api/recipe/recipes/')),
+        ('recipe-list?page_size', (200,), get('/api/recipe/recipes/?page_size=25')),
+        ('recipe-list?tags', (200,), get(f'/api/recipe/recipes/?tags={tag_filter}&page_size=25')),
+        ('recipe-list?ingredients', (200,), get(
+            f'/api/recipe/recipes/?ingredients={ingredient_filter}&page_size=25'
+        )),
+        ('recipe-list?search', (200,), get('/api/recipe/recipes/?search=tomato+soup')),
+        ('recipe-list?fields', (200,), get(
+            '/api/recipe/recipes/?fields=id,title,tags&expand=&page_size=25'
+        )),
+        ('recipe-retrieve', (200,), each(
+            'GET', lambda n: recipe.format(rng.choice(recipes)), headers=auth,
+        )),
+        ('recipe-export', (200,), get('/api/recipe/recipes/export/')),
+        ('tag-list', (200,), get('/api/recipe/tags/')),
+        ('tag-list?assigned_only', (200,), get('/api/recipe/tags/?assigned_only=1')),
+        ('tag-list?with_counts', (200,), get('/api/recipe/tags/?with_counts=1')),
+        ('ingredient-list', (200,), get('/api/recipe/ingredients/')),
+        ('ingredient-list?assigned_only', (200,), get('/api/recipe/ingredients/?assigned_only=1')),
+        ('user-me', (200,), get('/api/user/me/')),
+        # writes
+        ('recipe-create', (201,), each('POST', lambda n: '/api/recipe/recipes/', recipe_body)),
+        ('recipe-update', (200,), each(
+            'PUT', lambda n: recipe.format(pool('recipe')), recipe_body,
+        )),
+        ('recipe-partial-update', (200,), each(
+            'PATCH', lambda n: recipe.format(pool('recipe')),
+            lambda n: {'time_minutes': n % 180 + 1},
+        )),
+        ('recipe-upload-image', (200,), upload_image()),
+        ('tag-update', (200,), each(
+            'PUT', lambda n: tag.format(pool('tag')),
+            lambda n: {'name': f'{SCRATCH}-renamed-{uuid.uuid4().hex}'},
+        )),
+        ('tag-partial-update', (200,), each(
+            'PATCH', lambda n: tag.format(pool('tag')),
+            lambda n: {'name': f'{SCRATCH}-renamed-{uuid.uuid4().hex}'},
+        )),
+        ('ingredient-update', (200,), each(
+            'PUT', lambda n: ingredient.format(pool('ingredient')),
+            lambda n: {'name': f'{SCRATCH}-renamed-{uuid.uuid4().hex}'},
+        )),
+        ('ingredient-partial-update', (200,), each(
+            'PATCH', lambda n: ingredient.format(pool('ingredient')),
+            lambda n: {'name': f'{SCRATCH}-renamed-{uuid.uuid4().hex}'},
+        )),
+        ('user-create', (201,), each(
+            'POST', lambda n: '/api/user/create/',
+            lambda n: {'email': f'{SCRATCH}-{uuid.uuid4().hex}@example.com',
+                       'password': PASSWORD, 'name': 'New'},
+            headers={'Content-Type': 'application/json'},
+        )),
+        ('user-token', (200,), each(
+            'POST', lambda n: '/api/user/token/',
+            lambda n: {'email': profile['email'], 'password': PASSWORD},
+            headers={'Content-Type': 'application/json'},
+        )),
+        ('user-me-update', (200,), each_me(
+            'PUT', lambda n, user: {'email': user['email'], 'password': PASSWORD, 'name': f'Bench {n}'},
+        )),
+        ('user-me-partial-update', (200,), each_me(
+            'PATCH', lambda n, user: {'name': f'Bench {n}'},
+        )),
+        # deletes
+        ('recipe-destroy', (204,), drain('recipe', recipe)),
+        ('tag-destroy', (204,), drain('tag', tag)),
+        ('ingredient-destroy', (204,), drain('ingredient', ingredient)),
+    ]
+
+
+def compare(baseline, results, threshold):
+    '''Return the runs whose p95 or throughput regressed by more than threshold %.'''
+    def key(run):
+        return run['scenario'], run['profile'], run['concurrency']
+
+    before = {key(run): run for run in baseline['results']}
+    regressions = []
+    for run in results:
+        old = before.get(key(run))
+        if not old or not old['requests'] or not run['requests']:
+            continue
+        p95 = (run['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0
+        rate = (old['req_per_sec'] - run['req_per_sec']) / old['req_per_sec'] * 100
+        if p95 > threshold or rate > threshold:
+            regressions.append({
+                'scenario': run['scenario'], 'profile': run['profile'],
+                'concurrency': run['concurrency'],
+                'p95_ms': (old['p95_ms'], run['p95_ms']),
+                'req_per_sec': (old['req_per_sec'], run['req_per_sec']),
+            })
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', choices=('sqlite', 'postgres'),
+                        default=os.environ.get('BENCH_DATABASE', 'sqlite'))
+    parser.add_argument('--profiles', default=','.join(PROFILES),
+                        help='Comma separated data profiles (default: all).')
+    parser.add_argument('--scenarios', default='*',
+                        help='Comma separated scenario names or patterns (default: all).')
+    parser.add_argument('-c', '--concurrency', default='1,10',
+                        help='Comma separated concurrency levels (default: 1,10).')
+    parser.add_argument('-d', '--duration', type=float, default=5)
+    parser.add_argument('--warmup', type=float, default=1)
+    parser.add_argument('--server', choices=('wsgi', 'asgi'), default='wsgi')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--reuse', action='store_true',
+                        help='Keep previously seeded profiles instead of seeding again.')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Disable the response and token caches.')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    parser.add_argument('--compare', help='Results file to compare against.')
+    parser.add_argument('--threshold', type=float, default=10,
+                        help='Regression threshold in percent (default: 10).')
+    args = parser.parse_args(argv)
+
+    profiles = args.profiles.split(',')
+    unknown = set(profiles) - set(PROFILES)
+    if unknown:
+        parser.error(f'unknown profiles: {", ".join(sorted(unknown))}')
+    levels = [int(level) for level in args.concurrency.split(',')]
+    patterns = args.scenarios.split(',')
+
+    # The server processes inherit these
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    os.environ['BENCH_DATABASE'] = args.database
+    os.environ['REQUEST_LOG_LEVEL'] = 'WARNING'
+    if args.no_cache:
+        os.environ['CACHE_BACKEND'] = 'django.core.cache.backends.dummy.DummyCache'
+
+    import django
+    from django.core.management import call_command
+    from django.db import connection, connections
+
+    django.setup()
+    call_command('migrate', verbosity=0)
+    loaded = [
+        load_profile(name, PROFILES[name], args.seed, args.reuse) for name in profiles
+    ]
+    connections.close_all()
+
+    meta = {
+        'started': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'server': args.server,
+        'workers': args.workers,
+        'seed': args.seed,
+        'duration': args.duration,
+        'cache': not args.no_cache,
+    }
+    results = []
+    port = free_port()
+    proc = start_server(server_args(args.server, port, args.workers), port)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        for profile in loaded:
+            try:
+                for name, ok, factory in scenarios(profile):
+                    if not any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns):
+                        continue
+                    for concurrency in levels:
+                        if args.warmup and not name.endswith('-destroy'):
+                            run_requests(base_url, factory(), concurrency, args.warmup, ok)
+                        stats = run_requests(base_url, factory(), concurrency, args.duration, ok)
+                        stats.update(scenario=name, profile=profile['name'],
+                                     recipes=profile['recipes'], concurrency=concurrency)
+                        results.append(stats)
+                        print(
+                            f'{profile["name"]:<7} {name:<32} c={concurrency:<4} '
+                            f'{stats["req_per_sec"]:>8} req/s  p50 {stats["p50_ms"]}ms  '
+                            f'p95 {stats["p95_ms"]}ms  p99 {stats["p99_ms"]}ms  '
+                            f'errors {stats["errors"]}'
+                        )
+            finally:
+                remove_scratch(profile['user_id'])
+    finally:
+        stop_server(proc)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        for run in regressions:
+            print(
+                f'REGRESSION {run["profile"]} {run["scenario"]} c={run["concurrency"]}: '
+                f'p95 {run["p95_ms"][0]} -> {run["p95_ms"][1]}ms, '
+                f'{run["req_per_sec"][0]} -> {run["req_per_sec"][1]} req/s'
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
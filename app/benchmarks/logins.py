@@ -0,0 +1,182 @@
+'''
+Logins per second per core of the token endpoints
+
+Seeds --users users with the generate_dataset command into the benchmark
+database described in benchmarks/settings.py and posts their credentials
+to the DRF token view under gunicorn (/api/user/token/) and to the async
+token view under uvicorn (/api/async/user/token/). Each is run twice:
+with the login reuse window off, so every login hashes its password, and
+with it on while --repeat users who just logged in do so again, which is
+what clients retrying or opening several sessions do:
+
+    python -m benchmarks.logins --workers 2 -c 1,16 --output logins.json
+
+Rates are also given per core, dividing by the CPUs the server can keep
+busy: its worker processes, times the password check threads of each for
+the async view, up to the CPU count. Requests refused with 503 by the
+async view's back-pressure count as errors.
+'''
+
+import argparse
+import io
+import itertools
+import json
+import os
+import platform
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from benchmarks.asgi_vs_wsgi import server_args
+from benchmarks.common import free_port, run_requests, start_server, stop_server
+
+PASSWORD = 'benchpass123'
+EMAIL = 'login-{n}@example.com'
+VIEWS = {
+    'drf': ('wsgi', '/api/user/token/'),
+    'async': ('asgi', '/api/async/user/token/'),
+}
+
+
+def seed_users(count):
+    '''Create count users sharing PASSWORD, unless they exist already.'''
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+
+    emails = [EMAIL.format(n=n) for n in range(count)]
+    if get_user_model().objects.filter(email__in=emails).count() == count:
+        return emails
+    get_user_model().objects.filter(email__startswith='login-').delete()
+    started = time.monotonic()
+    call_command(
+        'generate_dataset', users=count, recipes=0, email=EMAIL, password=PASSWORD,
+        tags_per_user=0, ingredients_per_user=0, tags_per_recipe=(0, 0),
+        ingredients_per_recipe=(0, 0), verbosity=0, stdout=io.StringIO(),
+    )
+    print(f'Seeded {count} users in {time.monotonic() - started:.1f}s')
+    return emails
+
+
+def login_requests(path, emails, repeat=True):
+    '''Return a make_request() posting the credentials of each user in turn.
+
+    Without repeat it returns None once every user has logged in.
+    '''
+    bodies = [urlencode({'email': email, 'password': PASSWORD}).encode() for email in emails]
+    bodies = itertools.cycle(bodies) if repeat else iter(bodies)
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    lock = threading.Lock()
+
+    def make_request():
+        with lock:
+            body = next(bodies, None)
+        if body is None:
+            return None
+        return 'POST', path, body, headers
+    return make_request
+
+
+def cores_used(kind, workers, threads):
+    '''Return how many CPUs a server with this many workers can keep busy.'''
+    busy = workers * threads if kind == 'asgi' else workers
+    return max(1, min(busy, os.cpu_count() or 1))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', choices=('sqlite', 'postgres'),
+                        default=os.environ.get('BENCH_DATABASE', 'sqlite'))
+    parser.add_argument('--views', default=','.join(VIEWS),
+                        help='Comma separated token views (default: all).')
+    parser.add_argument('--users', type=int, default=1_000)
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='Users logging in again in the reuse runs (default: 10).')
+    parser.add_argument('-c', '--concurrency', default='1,16',
+                        help='Comma separated concurrency levels (default: 1,16).')
+    parser.add_argument('-d', '--duration', type=float, default=5)
+    parser.add_argument('--warmup', type=float, default=1)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Server worker processes (default: 1).')
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1,
+                        help='Password check threads per async worker (default: CPU count).')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    args = parser.parse_args(argv)
+
+    views = args.views.split(',')
+    unknown = set(views) - set(VIEWS)
+    if unknown:
+        parser.error(f'unknown views: {", ".join(sorted(unknown))}')
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    # The server processes inherit these
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    os.environ['BENCH_DATABASE'] = args.database
+    os.environ['REQUEST_LOG_LEVEL'] = 'WARNING'
+    os.environ['TOKEN_LOGIN_WORKERS'] = str(args.threads)
+
+    import django
+    from django.core.management import call_command
+    from django.db import connection, connections
+
+    django.setup()
+    call_command('migrate', verbosity=0)
+    emails = seed_users(args.users)
+    connections.close_all()
+
+    meta = {
+        'started': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'cpus': os.cpu_count(),
+        'workers': args.workers,
+        'threads': args.threads,
+        'users': args.users,
+        'duration': args.duration,
+    }
+    results = []
+    for view in views:
+        kind, path = VIEWS[view]
+        cores = cores_used(kind, args.workers, args.threads)
+        for mode, ttl, users in (
+            ('hash', '0', emails),
+            ('reuse', '3600', emails[:args.repeat]),
+        ):
+            os.environ['TOKEN_LOGIN_REUSE_TTL'] = ttl
+            port = free_port()
+            proc = start_server(server_args(kind, port, args.workers), port)
+            base_url = f'http://127.0.0.1:{port}'
+            try:
+                if mode == 'reuse':
+                    # Log every user in once per worker process, each of
+                    # which has a reuse window of its own
+                    prime = login_requests(path, users * args.workers * 2, repeat=False)
+                    run_requests(base_url, prime, args.workers, float('inf'))
+                for concurrency in levels:
+                    if args.warmup:
+                        run_requests(base_url, login_requests(path, users), concurrency, args.warmup)
+                    stats = run_requests(
+                        base_url, login_requests(path, users), concurrency, args.duration,
+                    )
+                    stats.update(view=view, server=kind, mode=mode, concurrency=concurrency,
+                                 cores=cores,
+                                 req_per_sec_per_core=round(stats['req_per_sec'] / cores, 1))
+                    results.append(stats)
+                    print(
+                        f'{view:<6} {mode:<6} c={concurrency:<4} '
+                        f'{stats["req_per_sec"]:>8} req/s  '
+                        f'{stats["req_per_sec_per_core"]:>8} req/s/core  '
+                        f'p50 {stats["p50_ms"]}ms  p95 {stats["p95_ms"]}ms  '
+                        f'errors {stats["errors"]}'
+                    )
+            finally:
+                stop_server(proc)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
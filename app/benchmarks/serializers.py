@@ -0,0 +1,116 @@
+'''
+Micro-benchmark of the recipe list serializers
+
+Renders the same recipes through RecipeSerializer (with the prefetches the
+view uses) and through recipe.fast.FastSerializer, in a throwaway test
+database, and reports the best time of each.
+
+    DJANGO_SETTINGS_MODULE=app.settings python -m benchmarks.serializers --recipes 500
+'''
+
+import argparse
+import json
+import os
+import timeit
+from decimal import Decimal
+
+
+def setup_data(recipes, tags_per_recipe):
+    from django.contrib.auth import get_user_model
+    from core.models import Ingredient, Recipe, Tag
+
+    user = get_user_model().objects.create_user(
+        email='bench@example.com', name='Bench', password='benchpass123'
+    )
+    tags = Tag.objects.bulk_create(
+        Tag(user=user, name=f'Tag {i}') for i in range(tags_per_recipe * 4)
+    )
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(user=user, name=f'Ingredient {i}') for i in range(tags_per_recipe * 4)
+    )
+    created = Recipe.objects.bulk_create(
+        Recipe(
+            user=user, title=f'Recipe {i}', time_minutes=i % 120,
+            price=Decimal(i % 10000) / 100, link=f'https://example.com/{i}',
+        )
+        for i in range(recipes)
+    )
+    tag_links, ingredient_links = [], []
+    for i, recipe in enumerate(created):
+        for j in range(tags_per_recipe):
+            tag_links.append(Recipe.tags.through(
+                recipe_id=recipe.id, tag_id=tags[(i + j) % len(tags)].id,
+            ))
+            ingredient_links.append(Recipe.ingredients.through(
+                recipe_id=recipe.id, ingredient_id=ingredients[(i + j) % len(ingredients)].id,
+            ))
+    Recipe.tags.through.objects.bulk_create(tag_links)
+    Recipe.ingredients.through.objects.bulk_create(ingredient_links)
+    return user
+
+
+def run(recipes, tags_per_recipe, repeat):
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.test import APIRequestFactory
+
+    from core.models import Recipe
+    from recipe.fast import FastSerializer
+    from recipe.serializers import RecipeSerializer
+
+    user = setup_data(recipes, tags_per_recipe)
+    queryset = Recipe.objects.filter(user=user).order_by('-id')
+    context = {'request': APIRequestFactory().get('/')}
+
+    def drf():
+        return RecipeSerializer(
+            queryset.prefetch_related('tags', 'ingredients'), many=True, context=context,
+        ).data
+
+    def fast():
+        serializer = FastSerializer(RecipeSerializer(context=context))
+        return serializer.to_representation(serializer.prepare(queryset))
+
+    renderer = JSONRenderer()
+    if renderer.render(drf()) != renderer.render(fast()):
+        raise SystemExit('Outputs differ')
+
+    results = {'recipes': recipes, 'tags_per_recipe': tags_per_recipe}
+    for name, func in (('drf', drf), ('fast', fast)):
+        best = min(timeit.repeat(func, number=1, repeat=repeat))
+        results[f'{name}_ms'] = round(best * 1000, 2)
+    results['speedup'] = round(results['drf_ms'] / results['fast_ms'], 2)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--recipes', type=int, default=500)
+    parser.add_argument('--tags-per-recipe', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+    import django
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    django.setup()
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        results = run(args.recipes, args.tags_per_recipe, args.repeat)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    print(
+        f'{results["recipes"]} recipes: DRF {results["drf_ms"]} ms, '
+        f'fast {results["fast_ms"]} ms ({results["speedup"]}x)'
+    )
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+'''
+Settings for the benchmark servers
+
+app.settings on a database of its own. BENCH_DATABASE=sqlite (the default)
+keeps it in BENCH_SQLITE_PATH; BENCH_DATABASE=postgres uses the DB_*
+variables with the existing database BENCH_DB_NAME (default: bench).
+'''
+
+import os
+import tempfile
+
+from app.settings import *  # noqa: F401,F403
+from app.settings import DATABASES
+
+DEBUG = False  # DEBUG keeps every query in memory
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+MEDIA_ROOT = os.environ.get(
+    'BENCH_MEDIA_ROOT', os.path.join(tempfile.gettempdir(), 'bench-media')
+)
+
+if os.environ.get('BENCH_DATABASE', 'sqlite') == 'postgres':
+    DATABASES = {
+        'default': {**DATABASES['default'], 'NAME': os.environ.get('BENCH_DB_NAME', 'bench')},
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get(
+                'BENCH_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'bench.sqlite3')
+            ),
+            'OPTIONS': {'timeout': 30},
+        },
+    }
+DB_REPLICAS = []
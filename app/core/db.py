@@ -0,0 +1,125 @@
+'''
+Database connection helpers and the read replica router
+'''
+
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from rest_framework.permissions import SAFE_METHODS
+
+# Database the current request reads from, set by ReplicaReadMixin
+_read_database = ContextVar('read_database', default=None)
+
+
+def connection_stats(alias):
+    '''Return this process's connection usage for a database alias.
+
+    Pools are per process, so every worker reports its own numbers.
+    '''
+    connection = connections[alias]
+    pool = getattr(connection, 'pool', None)  # only set for psycopg 3 pools
+    if pool is None:
+        return {
+            'vendor': connection.vendor,
+            'pooled': False,
+            'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+            'connected': connection.connection is not None,
+        }
+
+    # Counters are left out of get_stats() until they are non-zero
+    stats = pool.get_stats()
+    return {
+        'vendor': connection.vendor,
+        'pooled': True,
+        'min_size': stats['pool_min'],
+        'max_size': stats['pool_max'],
+        'size': stats['pool_size'],
+        'in_use': stats['pool_size'] - stats['pool_available'],
+        'idle': stats['pool_available'],
+        'waiting': stats['requests_waiting'],
+        # requests that gave up: timed out or turned away by max_waiting
+        'timeouts': stats.get('requests_errors', 0),
+        'requests': stats.get('requests_num', 0),
+        'wait_ms': stats.get('requests_wait_ms', 0),
+        'connections_lost': stats.get('connections_lost', 0),
+    }
+
+
+def read_database():
+    '''Return the replica the current request reads from, or None.'''
+    return _read_database.get()
+
+
+def _pin_key(user_id):
+    return f'db:pin:{user_id}'
+
+
+def pin_to_primary(user):
+    '''Read a user's requests from the primary for the next few seconds.
+
+    Called before a write, so the user's next reads can't reach a replica
+    that hasn't replayed it yet. The pin lives in the default cache, which
+    must be shared between workers for it to follow the user.
+    '''
+    if user.is_authenticated and settings.DB_REPLICAS:
+        cache.set(_pin_key(user.pk), True, timeout=settings.DB_REPLICA_PIN_SECONDS)
+
+
+def replica_for(user):
+    '''Return the replica to serve a user's reads from, or None for the primary.'''
+    if not settings.DB_REPLICAS:
+        return None
+    if user.is_authenticated and cache.get(_pin_key(user.pk)):
+        return None
+    return random.choice(settings.DB_REPLICAS)
+
+
+class ReplicaRouter:
+    '''Route reads made while serving a safe request to its replica.
+
+    Everything else, including all writes, goes to the primary.
+    '''
+
+    def db_for_read(self, model, **hints):
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {'default', *settings.DB_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    '''Serve GET/HEAD/OPTIONS requests of a view from a read replica.
+
+    The replica is chosen once the request is authenticated, so the token
+    lookup and a user's read-your-writes pin are always checked on the
+    primary. Any other method pins the user to the primary.
+    '''
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            database = replica_for(request.user)
+            if database:
+                self._read_database_token = _read_database.set(database)
+        else:
+            pin_to_primary(request.user)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_read_database_token', None)
+        if token is not None:
+            # Streamed content (the NDJSON export) is read after this; views
+            # streaming from the replica bind it with read_database()
+            _read_database.reset(token)
+            self._read_database_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
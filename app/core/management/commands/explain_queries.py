@@ -0,0 +1,147 @@
+'''
+Django command to EXPLAIN the querysets behind the recipe API endpoints
+
+'''
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory
+
+from rest_framework.request import Request
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import views
+
+# Plan lines that mean a table is read without an index
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)\b(?! USING| VIRTUAL TABLE)'),
+}
+
+
+class Command(BaseCommand):
+    '''Django command to report API query plans that use sequential scans.'''
+    help = (
+        'Run EXPLAIN on the queryset of each recipe, tag and ingredient '
+        'endpoint and report plans that still use sequential scans.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Email of the user to build the querysets for '
+                 '(default: the user with the most recipes).',
+        )
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Use EXPLAIN ANALYZE (Postgres only, runs the queries).',
+        )
+        parser.add_argument(
+            '--fail-on-seq-scan',
+            action='store_true',
+            help='Exit with an error if any plan uses a sequential scan.',
+        )
+
+    def handle(self, *args, **options):
+        ''' Entry endpoint for command. '''
+        pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f'EXPLAIN is not supported for {connection.vendor}.')
+
+        user = self._get_user(options['user'])
+        explain_options = {}
+        if options['analyze'] and connection.vendor == 'postgresql':
+            explain_options['analyze'] = True
+
+        self.stdout.write(f'Explaining API querysets for {user.email} ...')
+        seq_scans = 0
+        for name, queryset in self._endpoint_querysets(user):
+            plan = queryset.explain(**explain_options)
+            tables = sorted(set(pattern.findall(plan)))
+            if tables:
+                seq_scans += 1
+                self.stdout.write(self.style.WARNING(
+                    f'{name}: sequential scan on {", ".join(tables)}'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: OK'))
+
+            if options['verbosity'] > 1:
+                self.stdout.write(plan)
+
+        if seq_scans and options['fail_on_seq_scan']:
+            raise CommandError(f'{seq_scans} plan(s) use sequential scans.')
+
+    def _get_user(self, email):
+        '''Return the user the querysets are built for.'''
+        user_model = get_user_model()
+        if email:
+            try:
+                return user_model.objects.get(email=email)
+            except user_model.DoesNotExist:
+                raise CommandError(f'User {email} does not exist.')
+
+        busiest = Recipe.objects.values('user').annotate(
+            recipes=Count('id')
+        ).order_by('-recipes').first()
+        if busiest:
+            return user_model.objects.get(pk=busiest['user'])
+
+        user = user_model.objects.order_by('id').first()
+        if user is None:
+            raise CommandError('No users in the database.')
+        return user
+
+    def _get_queryset(self, viewset, user, action='list', params=None):
+        '''Return the queryset a viewset builds for a request.'''
+        request = Request(RequestFactory().get('/', params or {}))
+        request.user = user
+        view = viewset(request=request, action=action, format_kwarg=None, kwargs={})
+        return view.get_queryset()
+
+    def _endpoint_querysets(self, user):
+        '''Yield (name, queryset) for every query the endpoints run.'''
+        tag_ids = ','.join(
+            str(pk) for pk in Tag.objects.filter(user=user).values_list('id', flat=True)[:3]
+        ) or '0'
+        ingredient_ids = ','.join(
+            str(pk) for pk in Ingredient.objects.filter(user=user).values_list('id', flat=True)[:3]
+        ) or '0'
+
+        recipes = self._get_queryset(views.RecipeViewSet, user)
+        yield 'recipe-list', recipes
+        recipe_ids = list(recipes.values_list('id', flat=True)[:25])
+        yield 'recipe-list (tags prefetch)', Tag.objects.filter(recipe__in=recipe_ids)
+        yield 'recipe-list (ingredients prefetch)', Ingredient.objects.filter(
+            recipe__in=recipe_ids
+        )
+        yield 'recipe-list ?tags=', self._get_queryset(
+            views.RecipeViewSet, user, params={'tags': tag_ids}
+        )
+        yield 'recipe-list ?ingredients=', self._get_queryset(
+            views.RecipeViewSet, user, params={'ingredients': ingredient_ids}
+        )
+        title = Recipe.objects.filter(user=user).values_list('title', flat=True).first()
+        word = next(iter((title or '').split()), 'recipe')
+        yield 'recipe-list ?search=', self._get_queryset(
+            views.RecipeViewSet, user, params={'search': word}
+        )
+        yield 'recipe-detail', self._get_queryset(
+            views.RecipeViewSet, user, action='retrieve'
+        ).filter(pk=recipe_ids[0] if recipe_ids else 0)
+
+        for name, viewset in (
+            ('tag', views.TagViewSet),
+            ('ingredient', views.IngredientViewSet),
+        ):
+            yield f'{name}-list', self._get_queryset(viewset, user)
+            yield f'{name}-list ?assigned_only=1', self._get_queryset(
+                viewset, user, params={'assigned_only': 1}
+            )
+            yield f'{name}-list ?with_counts=1', self._get_queryset(
+                viewset, user, params={'with_counts': 1}
+            )
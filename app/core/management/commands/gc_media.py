@@ -0,0 +1,58 @@
+'''
+Django command to delete content-addressed media no recipe uses any more
+
+'''
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import StoredFile
+from recipe.images import all_variant_names
+
+
+class Command(BaseCommand):
+    '''Django command to delete unreferenced content-addressed files.'''
+    help = (
+        'Delete content-addressed recipe images, and their variants, that '
+        'are no longer referenced by any recipe.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only list the files that would be deleted.',
+        )
+
+    def handle(self, *args, **options):
+        ''' Entry endpoint for command. '''
+        names = list(
+            StoredFile.objects.filter(references=0).values_list('name', flat=True)
+        )
+        deleted = 0
+        for name in names:
+            if options['dry_run']:
+                self.stdout.write(name)
+                continue
+            if self._delete(name):
+                deleted += 1
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} unused files.'))
+
+    def _delete(self, name):
+        # StoredFile.objects.acquire() holds this row's lock until the
+        # upload that reuses the file commits; skip the file if it's taken.
+        with transaction.atomic():
+            stored = StoredFile.objects.select_for_update(skip_locked=True).filter(
+                name=name, references=0,
+            ).first()
+            if stored is None:
+                return False
+
+            for variants in all_variant_names(name).values():
+                for variant in variants.values():
+                    default_storage.delete(variant)
+            default_storage.delete(name)
+            stored.delete()
+        return True
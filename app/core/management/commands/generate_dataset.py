@@ -0,0 +1,344 @@
+'''
+Django command to generate large synthetic datasets for load tests
+
+Creates --users users, each with a pool of tags and ingredients, and
+--recipes recipes spread across them at random. Each recipe links to a
+random number of its owner's tags and ingredients, drawn with a Zipf
+skew so a few of each pool are on most recipes, like real data. The same
+--seed and options always generate the same rows.
+
+Rows are written straight to the tables in batches: with COPY on
+Postgres and executemany() elsewhere. The password is hashed once and
+shared by every user, primary keys are assigned up front so links don't
+need the new IDs read back, and no signals are sent. Don't run it while
+the API is writing to the same database.
+'''
+import io
+import itertools
+import json
+import random
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core.models import Recipe, Tag, Ingredient
+
+WORDS = (
+    'tomato', 'soup', 'chicken', 'curry', 'lemon', 'cake', 'garlic', 'bread',
+    'salad', 'spicy', 'roast', 'pasta', 'mushroom', 'risotto', 'apple', 'pie',
+    'beef', 'stew', 'rice', 'noodle', 'honey', 'ginger', 'pumpkin', 'pancake',
+)
+
+
+def parse_range(value):
+    '''Parse "5-30" (or "5") into (5, 30).'''
+    try:
+        low, _, high = value.partition('-')
+        low, high = int(low), int(high or low)
+    except ValueError:
+        raise CommandError(f'Invalid range {value!r}, expected e.g. 5-30.')
+    if not 0 <= low <= high:
+        raise CommandError(f'Invalid range {value!r}.')
+    return low, high
+
+
+def zipf_weights(size, skew):
+    '''Cumulative weights of ranks 0..size-1 under a Zipf distribution.'''
+    return list(itertools.accumulate(1 / (rank + 1) ** skew for rank in range(size)))
+
+
+def sample_skewed(rng, size, cum_weights, k):
+    '''Draw k distinct ranks of size, weighted by cum_weights.'''
+    picked = {}
+    # Oversampling makes a second draw rare; a steep skew rarely draws the
+    # tail, so top up uniformly rather than looping until it does
+    for _ in range(3):
+        picked.update(dict.fromkeys(rng.choices(range(size), cum_weights=cum_weights, k=k + k // 2)))
+        if len(picked) >= k:
+            return list(picked)[:k]
+    rest = [rank for rank in range(size) if rank not in picked]
+    return list(picked) + rng.sample(rest, k - len(picked))
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return (
+        str(value).replace('\\', '\\\\').replace('\t', '\\t')
+        .replace('\n', '\\n').replace('\r', '\\r')
+    )
+
+
+def secondary_indexes(connection, table):
+    '''Return [(name, CREATE INDEX statement)] of table's non-unique indexes.'''
+    if connection.vendor == 'postgresql':
+        sql = (
+            'SELECT indexname, indexdef FROM pg_indexes '
+            'WHERE schemaname = current_schema() AND tablename = %s'
+        )
+    elif connection.vendor == 'sqlite':
+        # Indexes of inline constraints have no sql
+        sql = (
+            "SELECT name, sql FROM sqlite_master "
+            "WHERE type = 'index' AND tbl_name = %s AND sql IS NOT NULL"
+        )
+    else:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        return [
+            (name, definition) for name, definition in cursor.fetchall()
+            if not definition.upper().startswith('CREATE UNIQUE')
+        ]
+
+
+@contextmanager
+def deferred_indexes(connection, tables):
+    '''Drop the non-unique indexes of tables for the block, then rebuild them.
+
+    Building an index once is much cheaper than updating it per row; the
+    unique ones stay to keep the data valid.
+    '''
+    indexes = [index for table in tables for index in secondary_indexes(connection, table)]
+    with connection.cursor() as cursor:
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for _, definition in indexes:
+                cursor.execute(definition)
+
+
+class TableWriter:
+    '''Inserts rows into a model's table: COPY on Postgres, else executemany().
+
+    Columns the generator doesn't set get their field's default.
+    '''
+
+    def __init__(self, connection, model, fields):
+        self.connection = connection
+        self.table = model._meta.db_table
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        generated = [model._meta.get_field(name) for name in fields]
+        constant = [
+            field for field in model._meta.concrete_fields
+            if field not in generated and not field.primary_key
+        ]
+        self.columns = [field.column for field in generated + constant]
+        self.constants = tuple(self._default(field, now) for field in constant)
+
+    @staticmethod
+    def _default(field, now):
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+            return now
+        value = field.get_default()
+        return json.dumps(value) if isinstance(value, (dict, list)) else value
+
+    def write(self, rows):
+        rows = [row + self.constants for row in rows]
+        if not rows:
+            return 0
+        quote = self.connection.ops.quote_name
+        table = quote(self.table)
+        columns = ', '.join(quote(column) for column in self.columns)
+        with self.connection.cursor() as cursor:
+            if self.connection.vendor == 'postgresql':
+                self._copy(cursor, f'COPY {table} ({columns}) FROM STDIN', rows)
+            else:
+                placeholders = ', '.join(['%s'] * len(self.columns))
+                cursor.executemany(
+                    f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', rows,
+                )
+        return len(rows)
+
+    @staticmethod
+    def _copy(cursor, sql, rows):
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+        if is_psycopg3:
+            with cursor.copy(sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+        else:
+            cursor.copy_expert(sql, io.StringIO(''.join(
+                '\t'.join(map(_copy_value, row)) + '\n' for row in rows
+            )))
+
+
+class Command(BaseCommand):
+    '''Django command to generate synthetic recipes.'''
+    help = (
+        'Generate a deterministic synthetic dataset of users, tags, '
+        'ingredients and recipes with bulk inserts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument(
+            '--recipes', type=int, default=10_000,
+            help='Total number of recipes, spread across the users (default: 10000).',
+        )
+        parser.add_argument('--tags-per-user', type=int, default=200)
+        parser.add_argument('--ingredients-per-user', type=int, default=400)
+        parser.add_argument(
+            '--tags-per-recipe', type=parse_range, default=(5, 30),
+            help='Range of tags per recipe, e.g. 5-30 (the default).',
+        )
+        parser.add_argument(
+            '--ingredients-per-recipe', type=parse_range, default=(5, 30),
+            help='Range of ingredients per recipe, e.g. 5-30 (the default).',
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.0,
+            help='Zipf exponent of tag and ingredient reuse; 0 picks uniformly (default: 1).',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--email', default='user{n}@example.com',
+            help='Email of user n (default: user{n}@example.com).',
+        )
+        parser.add_argument('--password', default='password123')
+        parser.add_argument(
+            '--batch-size', type=int, default=10_000,
+            help='Recipes written per transaction (default: 10000).',
+        )
+        parser.add_argument(
+            '--keep-indexes', action='store_true',
+            help="Update the recipe tables' indexes per row instead of rebuilding "
+                 'them at the end; faster when adding a few rows to a large database.',
+        )
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        ''' Entry endpoint for command. '''
+        users, recipes = options['users'], options['recipes']
+        if users < 1 or recipes < 0 or options['batch_size'] < 1:
+            raise CommandError('--users and --batch-size must be at least 1, --recipes at least 0.')
+        if users > 1 and '{n}' not in options['email']:
+            raise CommandError('--email must contain {n} when generating several users.')
+        for name in ('tags', 'ingredients'):
+            if options[f'{name}_per_recipe'][1] > options[f'{name}_per_user']:
+                raise CommandError(f'--{name}-per-recipe exceeds --{name}-per-user.')
+
+        self.connection = connections[options['database']]
+        self.verbosity = options['verbosity']
+        self.rows = 0
+        self.started = time.monotonic()
+        rng = random.Random(options['seed'])
+
+        emails = [options['email'].format(n=n) for n in range(users)]
+        User = get_user_model()
+        if User.objects.using(options['database']).filter(email__in=emails).exists():
+            raise CommandError('Some of the users already exist; pick another --email.')
+
+        user_ids = self._write_users(emails, options['password'])
+        tag_ids = self._write_pool(Tag, 'Tag', user_ids, options['tags_per_user'])
+        ingredient_ids = self._write_pool(
+            Ingredient, 'Ingredient', user_ids, options['ingredients_per_user'],
+        )
+        tables = [] if options['keep_indexes'] else [
+            model._meta.db_table
+            for model in (Recipe, Recipe.tags.through, Recipe.ingredients.through)
+        ]
+        with deferred_indexes(self.connection, tables):
+            self._write_recipes(rng, recipes, user_ids, tag_ids, ingredient_ids, options)
+        self._reset_sequences()
+
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {users} users and {recipes} recipes ({self.rows} rows) '
+            f'in {elapsed:.1f}s ({self._rate():.0f} rows/s).'
+        ))
+
+    def _rate(self):
+        return self.rows / max(time.monotonic() - self.started, 1e-9)
+
+    def _next_id(self, model):
+        return (model.objects.using(self.connection.alias).aggregate(Max('pk'))['pk__max'] or 0) + 1
+
+    def _write(self, writer, rows):
+        with transaction.atomic(using=self.connection.alias):
+            self.rows += writer.write(rows)
+
+    def _write_users(self, emails, password):
+        User = get_user_model()
+        writer = TableWriter(self.connection, User, ('id', 'email', 'name', 'password'))
+        first = self._next_id(User)
+        hashed = make_password(password)  # hashing dominates per-user inserts
+        self._write(writer, [
+            (first + n, email, f'User {n}', hashed) for n, email in enumerate(emails)
+        ])
+        return list(range(first, first + len(emails)))
+
+    def _write_pool(self, model, label, user_ids, size):
+        '''Create size tags or ingredients per user; return their IDs by user.'''
+        writer = TableWriter(self.connection, model, ('id', 'user', 'name'))
+        first = self._next_id(model)
+        self._write(writer, [
+            (first + index * size + n, user_id, f'{label} {n}')
+            for index, user_id in enumerate(user_ids) for n in range(size)
+        ])
+        return {
+            user_id: range(first + index * size, first + (index + 1) * size)
+            for index, user_id in enumerate(user_ids)
+        }
+
+    def _write_recipes(self, rng, count, user_ids, tag_ids, ingredient_ids, options):
+        recipes = TableWriter(self.connection, Recipe, (
+            'id', 'user', 'title', 'description', 'time_minutes', 'price', 'link',
+        ))
+        links = [
+            (TableWriter(self.connection, Recipe.tags.through, ('recipe', 'tag')),
+             tag_ids, options['tags_per_recipe'], zipf_weights(options['tags_per_user'], options['skew'])),
+            (TableWriter(self.connection, Recipe.ingredients.through, ('recipe', 'ingredient')),
+             ingredient_ids, options['ingredients_per_recipe'],
+             zipf_weights(options['ingredients_per_user'], options['skew'])),
+        ]
+        first = self._next_id(Recipe)
+        for start in range(0, count, options['batch_size']):
+            recipe_rows = []
+            link_rows = [[] for _ in links]
+            for pk in range(first + start, first + min(start + options['batch_size'], count)):
+                user_id = rng.choice(user_ids)
+                recipe_rows.append((
+                    pk, user_id,
+                    ' '.join(rng.sample(WORDS, 3)).capitalize(),
+                    ' '.join(rng.choices(WORDS, k=12)),
+                    rng.randint(5, 180),
+                    Decimal(rng.randint(100, 99_999)) / 100,
+                    f'https://example.com/recipes/{pk}',
+                ))
+                for rows, (_, pools, (low, high), cum_weights) in zip(link_rows, links):
+                    pool = pools[user_id]
+                    ranks = sample_skewed(rng, len(pool), cum_weights, rng.randint(low, high))
+                    rows.extend((pk, pool[rank]) for rank in ranks)
+
+            with transaction.atomic(using=self.connection.alias):
+                self.rows += recipes.write(recipe_rows)
+                for rows, (writer, *_) in zip(link_rows, links):
+                    self.rows += writer.write(rows)
+            if self.verbosity >= 1:
+                self.stdout.write(
+                    f'{start + len(recipe_rows)} recipes generated ({self._rate():.0f} rows/s)'
+                )
+
+    def _reset_sequences(self):
+        # Explicit IDs don't advance Postgres sequences (SQLite tracks them)
+        models = [get_user_model(), Tag, Ingredient, Recipe]
+        statements = self.connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with self.connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
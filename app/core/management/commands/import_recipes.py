@@ -0,0 +1,354 @@
+'''
+Django command to bulk import recipes from NDJSON or CSV files
+
+Each NDJSON line is a recipe object like the ones the API returns (e.g. a
+`recipes/export/` file), with `tags` and `ingredients` given as names or
+{"name": ...} objects. CSV files have a header row with the same columns
+and `|` separated tag and ingredient names. Rows may name their owner in
+a `user` column (an email); rows without one belong to --user.
+
+Rows are written in batches with bulk_create(), which sends no signals,
+so the command bumps the cache version of the users it imports for
+itself. With --workers, rows are split across processes by user, so each
+user's recipes are still created in input order.
+'''
+import csv
+import json
+import multiprocessing
+import sys
+import time
+import traceback
+import zlib
+from collections import namedtuple
+from queue import Empty
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.cache import bump_user_version
+
+RECIPE_FIELDS = ('title', 'description', 'time_minutes', 'price', 'link')
+CSV_LIST_SEPARATOR = '|'
+
+ImportRow = namedtuple('ImportRow', 'lineno email fields tags ingredients')
+
+
+def read_ndjson(f):
+    for lineno, line in enumerate(f, 1):
+        if line.strip():
+            yield lineno, line
+
+
+def decode_ndjson(line):
+    row = json.loads(line)
+    if not isinstance(row, dict):
+        raise ValueError('expected a JSON object')
+    return row
+
+
+def read_csv(f):
+    reader = csv.DictReader(f)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def decode_csv(row):
+    row = dict(row)
+    for name in ('tags', 'ingredients'):
+        row[name] = (row.get(name) or '').split(CSV_LIST_SEPARATOR)
+    return row
+
+
+FORMATS = {
+    'ndjson': (read_ndjson, decode_ndjson),
+    'csv': (read_csv, decode_csv),
+}
+
+
+def _clean(model, name, value):
+    try:
+        return model._meta.get_field(name).clean(value, None)
+    except ValidationError as e:
+        raise ValueError(f'{name}: {" ".join(e.messages)}')
+
+
+def _clean_names(model, items, label):
+    names = []
+    for item in items or ():
+        name = item.get('name') if isinstance(item, dict) else item
+        if isinstance(name, str):
+            name = name.strip()
+        if not name:  # e.g. the empty string CSV gives for no tags
+            continue
+        if not isinstance(name, str):
+            raise ValueError(f'{label}: invalid name {name!r}')
+        names.append(_clean(model, 'name', name))
+    return list(dict.fromkeys(names))
+
+
+def clean_row(lineno, row, default_email):
+    '''Validate a decoded row against the models and return an ImportRow.'''
+    email = row.get('user') or default_email
+    if not email:
+        raise ValueError('no user given for the row')
+    fields = {
+        name: _clean(Recipe, name, row.get(name, ''))
+        for name in RECIPE_FIELDS
+    }
+    return ImportRow(
+        lineno,
+        get_user_model().objects.normalize_email(email),
+        fields,
+        _clean_names(Tag, row.get('tags'), 'tags'),
+        _clean_names(Ingredient, row.get('ingredients'), 'ingredients'),
+    )
+
+
+def partition(email, workers):
+    '''Return the worker that imports a user's rows; stable across runs.'''
+    return zlib.crc32(email.encode()) % workers
+
+
+class BatchImporter:
+    '''Writes batches of cleaned rows with a fixed number of queries.'''
+
+    def __init__(self):
+        self.user_ids = {}
+
+    def _resolve_users(self, emails):
+        missing = emails - self.user_ids.keys()
+        if missing:
+            self.user_ids.update(
+                get_user_model().objects.filter(email__in=missing).values_list('email', 'id')
+            )
+
+    def _get_or_create(self, model, keys):
+        # Existing names conflict with the (user, name) constraint and are
+        # skipped, then everything is read back to get the IDs.
+        if not keys:
+            return {}
+        model.objects.bulk_create(
+            [model(user_id=user_id, name=name) for user_id, name in keys],
+            ignore_conflicts=True,
+        )
+        rows = model.objects.filter(
+            user_id__in={user_id for user_id, _ in keys},
+            name__in={name for _, name in keys},
+        ).values_list('user_id', 'name', 'id')
+        return {(user_id, name): pk for user_id, name, pk in rows}
+
+    def import_batch(self, rows):
+        '''Create the recipes of rows; return (created, [(lineno, error)]).'''
+        self._resolve_users({row.email for row in rows})
+        errors = [
+            (row.lineno, f'unknown user {row.email}')
+            for row in rows if row.email not in self.user_ids
+        ]
+        rows = [row for row in rows if row.email in self.user_ids]
+        if not rows:
+            return 0, errors
+
+        with transaction.atomic():
+            tag_ids = self._get_or_create(Tag, {
+                (self.user_ids[row.email], name) for row in rows for name in row.tags
+            })
+            ingredient_ids = self._get_or_create(Ingredient, {
+                (self.user_ids[row.email], name) for row in rows for name in row.ingredients
+            })
+            recipes = Recipe.objects.bulk_create([
+                Recipe(user_id=self.user_ids[row.email], **row.fields) for row in rows
+            ])
+            Recipe.tags.through.objects.bulk_create([
+                Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_ids[recipe.user_id, name])
+                for recipe, row in zip(recipes, rows) for name in row.tags
+            ])
+            Recipe.ingredients.through.objects.bulk_create([
+                Recipe.ingredients.through(
+                    recipe_id=recipe.id,
+                    ingredient_id=ingredient_ids[recipe.user_id, name],
+                )
+                for recipe, row in zip(recipes, rows) for name in row.ingredients
+            ])
+
+        for user_id in {recipe.user_id for recipe in recipes}:
+            bump_user_version(user_id)
+        return len(recipes), errors
+
+
+def _worker(batches, results):
+    '''Process entry point: import batches until the None sentinel.
+
+    After a failure the remaining batches are drained without importing
+    them, so later batches of the same users aren't created out of order
+    and the parent never blocks on a full queue.
+    '''
+    importer = BatchImporter()
+    failed = False
+    try:
+        for rows in iter(batches.get, None):
+            if failed:
+                continue
+            try:
+                results.put((*importer.import_batch(rows), None))
+            except Exception:
+                failed = True
+                results.put((0, [], traceback.format_exc()))
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    '''Django command to bulk import recipes.'''
+    help = (
+        'Import recipes with their tags and ingredients from an NDJSON or '
+        'CSV file, in batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='File to import, or - for standard input.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=sorted(FORMATS),
+            help='Input format (default: from the file extension, else ndjson).',
+        )
+        parser.add_argument(
+            '--user',
+            help='Email of the owner of rows without a user column.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Recipes written per transaction (default: 1000).',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Import with this many processes, partitioned by user '
+                 '(default: 1, in this process).',
+        )
+
+    def handle(self, *args, **options):
+        ''' Entry endpoint for command. '''
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--batch-size and --workers must be at least 1.')
+        fmt = options['format']
+        if fmt is None:
+            fmt = 'csv' if options['path'].lower().endswith('.csv') else 'ndjson'
+        self.verbosity = options['verbosity']
+        self.created = 0
+        self.skipped = 0
+        self.started = time.monotonic()
+
+        if options['path'] == '-':
+            self._import(sys.stdin, fmt, options)
+        else:
+            try:
+                f = open(options['path'], newline='', encoding='utf-8')
+            except OSError as e:
+                raise CommandError(e)
+            with f:
+                self._import(f, fmt, options)
+
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.created} recipes in {elapsed:.1f}s '
+            f'({self._rate():.0f} rows/s), skipped {self.skipped} rows.'
+        ))
+
+    def _rate(self):
+        return self.created / max(time.monotonic() - self.started, 1e-9)
+
+    def _rows(self, f, fmt, default_email):
+        read, decode = FORMATS[fmt]
+        for lineno, raw in read(f):
+            try:
+                yield clean_row(lineno, decode(raw), default_email)
+            except ValueError as e:
+                self._report(0, [(lineno, str(e))])
+
+    def _report(self, created, errors):
+        for lineno, error in errors:
+            self.stderr.write(f'line {lineno}: {error}')
+        self.skipped += len(errors)
+        if created:
+            self.created += created
+            if self.verbosity >= 1:
+                self.stdout.write(
+                    f'{self.created} recipes imported ({self._rate():.0f} rows/s)'
+                )
+
+    def _import(self, f, fmt, options):
+        batch_size = options['batch_size']
+        rows = self._rows(f, fmt, options['user'])
+        if options['workers'] == 1:
+            importer = BatchImporter()
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) == batch_size:
+                    self._report(*importer.import_batch(batch))
+                    batch = []
+            if batch:
+                self._report(*importer.import_batch(batch))
+        else:
+            self._import_parallel(rows, batch_size, options['workers'])
+
+    def _import_parallel(self, rows, batch_size, workers):
+        # Forked workers inherit the configured Django; they must not
+        # share this process's database connections.
+        context = multiprocessing.get_context('fork')
+        connections.close_all()
+        queues = [context.Queue(maxsize=2) for _ in range(workers)]
+        results = context.Queue()
+        processes = [
+            context.Process(target=_worker, args=(queue, results), daemon=True)
+            for queue in queues
+        ]
+        for process in processes:
+            process.start()
+
+        sent = received = 0
+
+        def collect(block):
+            nonlocal received
+            while received < sent:
+                try:
+                    created, errors, failure = results.get(block=block)
+                except Empty:
+                    return
+                received += 1
+                if failure:
+                    raise CommandError(f'Import failed in a worker:\n{failure}')
+                self._report(created, errors)
+
+        try:
+            batches = [[] for _ in range(workers)]
+            for row in rows:
+                worker = partition(row.email, workers)
+                batches[worker].append(row)
+                if len(batches[worker]) == batch_size:
+                    queues[worker].put(batches[worker])  # waits for a slow worker
+                    batches[worker] = []
+                    sent += 1
+                    collect(block=False)
+            for queue, batch in zip(queues, batches):
+                if batch:
+                    queue.put(batch)
+                    sent += 1
+            for queue in queues:
+                queue.put(None)
+            collect(block=True)
+            for process in processes:
+                process.join()
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
@@ -0,0 +1,282 @@
+'''
+Per-request performance instrumentation
+
+RequestMetricsMiddleware measures every request: wall time, the number
+and duration of database queries, time spent in serializers and the size
+of the response. Each request gets a Server-Timing header and a JSON log
+line on the `core.middleware` logger, tagged with the view and action
+that served it (e.g. `RecipeViewSet.list`), and its duration is added to
+a rolling histogram for that endpoint (see /api/internal/metrics/).
+'''
+
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Metrics of the request being served, shared with the threads that run
+# its sync code
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    '''Counters collected while serving one request.'''
+    __slots__ = ('started', 'endpoint', 'queries', 'db', 'timings')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.endpoint = 'unresolved'
+        self.queries = 0
+        self.db = 0.0
+        self.timings = defaultdict(float)
+
+
+def record_query(execute, sql, params, many, context):
+    '''Execute wrapper that counts and times the current request's queries.'''
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db += time.perf_counter() - started
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    '''connection_created handler adding record_query to every connection.
+
+    connection.execute_wrapper() only wraps the calling thread's
+    connection, and async views query from other threads, so the wrapper
+    stays installed and finds its request through a context variable.
+    '''
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@contextmanager
+def timing(name):
+    '''Add the time spent in the block to the current request's `name` timing.'''
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[name] += time.perf_counter() - started
+
+
+class TimedSerializerMixin:
+    '''Report the time a view spends rendering serializer output as `serialize`.'''
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        to_representation = serializer.to_representation
+
+        def timed(instance):
+            with timing('serialize'):
+                return to_representation(instance)
+
+        serializer.to_representation = timed
+        return serializer
+
+
+class RollingHistogram:
+    '''Durations of an endpoint's recent requests.
+
+    Keeps up to `samples` durations from the last `window` seconds; older
+    ones drop out of the snapshots.
+    '''
+    BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self, samples, window):
+        self.window = window
+        self._samples = deque(maxlen=samples)
+
+    def add(self, duration_ms):
+        self._samples.append((time.monotonic(), duration_ms))
+
+    def snapshot(self):
+        '''Return the count, percentiles and cumulative bucket counts.'''
+        cutoff = time.monotonic() - self.window
+        durations = sorted(ms for at, ms in list(self._samples) if at >= cutoff)
+        if not durations:
+            return {'count': 0}
+
+        def percentile(pct):
+            return round(durations[min(len(durations) - 1, int(len(durations) * pct / 100))], 2)
+
+        buckets, index = {}, 0
+        for bound in self.BUCKETS_MS:
+            while index < len(durations) and durations[index] <= bound:
+                index += 1
+            buckets[f'le_{bound}'] = index
+        buckets['le_inf'] = len(durations)
+        return {
+            'count': len(durations),
+            'p50': percentile(50),
+            'p95': percentile(95),
+            'p99': percentile(99),
+            'max': round(durations[-1], 2),
+            'buckets': buckets,
+        }
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def get_histogram(endpoint):
+    '''Return this process's histogram for an endpoint.'''
+    histogram = _histograms.get(endpoint)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(endpoint, RollingHistogram(
+                settings.REQUEST_METRICS['HISTOGRAM_SAMPLES'],
+                settings.REQUEST_METRICS['HISTOGRAM_WINDOW'],
+            ))
+    return histogram
+
+
+def histogram_snapshots():
+    '''Return a snapshot of every endpoint's histogram, by endpoint.'''
+    return {endpoint: _histograms[endpoint].snapshot() for endpoint in sorted(_histograms)}
+
+
+def endpoint_name(request, view_func):
+    '''Return "View.action" for DRF views, else the view's name.'''
+    view_class = getattr(view_func, 'cls', None)  # set by DRF's as_view()
+    if view_class is not None:
+        method = request.method.lower()
+        actions = getattr(view_func, 'actions', None) or {}
+        if method == 'head':
+            method = 'get'
+        return f'{view_class.__name__}.{actions.get(method, method)}'
+    view_class = getattr(view_func, 'view_class', None)
+    return (view_class or view_func).__name__
+
+
+class RequestMetricsMiddleware:
+    '''Measure each request and report it; see the module docstring.'''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.report(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.report(request, response, metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.endpoint = endpoint_name(request, view_func)
+
+    def report(self, request, response, metrics):
+        '''Add the Server-Timing header, log the request and record it.
+
+        A streamed body, and the queries it runs, come after the headers
+        are sent: Server-Timing covers the time to the first byte, and the
+        log line and histogram are written once the stream is closed.
+        '''
+        if settings.REQUEST_METRICS['SERVER_TIMING']:
+            self.add_server_timing(response, metrics)
+        if response.streaming:
+            measure = self._ameasure_stream if response.is_async else self._measure_stream
+            response.streaming_content = measure(
+                request, response, metrics, response.streaming_content,
+            )
+        else:
+            self.log(request, response, metrics, len(response.content))
+
+    def add_server_timing(self, response, metrics):
+        total_ms = (time.perf_counter() - metrics.started) * 1000
+        entries = [
+            f'total;dur={total_ms:.1f}',
+            f'db;dur={metrics.db * 1000:.1f};desc="{metrics.queries} queries"',
+        ] + [f'{name};dur={seconds * 1000:.1f}' for name, seconds in metrics.timings.items()]
+        if response.has_header('Server-Timing'):
+            entries.insert(0, response['Server-Timing'])
+        response['Server-Timing'] = ', '.join(entries)
+
+    def _measure_stream(self, request, response, metrics, chunks):
+        # Generators run in the context of whoever iterates them, so the
+        # request's metrics are made current around each chunk
+        chunks, size = iter(chunks), 0
+        try:
+            while True:
+                token = _current.set(metrics)
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    break
+                finally:
+                    _current.reset(token)
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.log(request, response, metrics, size)
+
+    async def _ameasure_stream(self, request, response, metrics, chunks):
+        chunks, size = aiter(chunks), 0
+        try:
+            while True:
+                token = _current.set(metrics)
+                try:
+                    chunk = await anext(chunks)
+                except StopAsyncIteration:
+                    break
+                finally:
+                    _current.reset(token)
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.log(request, response, metrics, size)
+
+    def log(self, request, response, metrics, size):
+        '''Log the request and add it to its endpoint's histogram.'''
+        total_ms = (time.perf_counter() - metrics.started) * 1000
+        logger.info(json.dumps({
+            'endpoint': metrics.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(total_ms, 2),
+            'db_queries': metrics.queries,
+            'db_ms': round(metrics.db * 1000, 2),
+            **{f'{name}_ms': round(seconds * 1000, 2) for name, seconds in metrics.timings.items()},
+            'response_bytes': size,
+        }))
+        get_histogram(metrics.endpoint).add(total_ms)
@@ -0,0 +1,41 @@
+# Composite indexes for the per-user recipe, tag and ingredient queries
+
+from django.db import migrations, models
+
+
+# The M2M through tables are created by Django, so their indexes can't be
+# declared on a model. Django only gives them a unique (recipe_id, x_id)
+# index for the forward lookup; the tags__id__in / ingredients__id__in
+# filters and the assigned_only check go the other way round.
+THROUGH_INDEXES = [
+    ('core_recipe_tags_tag_recipe_idx', 'core_recipe_tags', 'tag_id'),
+    ('core_recipe_ingredients_ingredient_recipe_idx', 'core_recipe_ingredients', 'ingredient_id'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_recipe_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', '-id'], name='core_recipe_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-name'], name='core_tag_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-name'], name='core_ingredient_user_name_idx'),
+        ),
+    ] + [
+        migrations.RunSQL(
+            sql=f'CREATE INDEX {name} ON {table} ({column}, recipe_id)',
+            reverse_sql=f'DROP INDEX {name}',
+        )
+        for name, table, column in THROUGH_INDEXES
+    ]
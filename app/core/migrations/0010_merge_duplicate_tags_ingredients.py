@@ -0,0 +1,47 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:05
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicates(apps, schema_editor):
+    '''Merge tags/ingredients that share (user, name) into the oldest row.'''
+    Recipe = apps.get_model('core', 'Recipe')
+
+    for model_name, relation in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, relation).through
+        fk = f'{model_name.lower()}_id'
+
+        duplicates = model.objects.values('user', 'name').annotate(
+            keep_id=Min('id'), rows=Count('id'),
+        ).filter(rows__gt=1)
+        for group in duplicates:
+            drop_ids = list(model.objects.filter(
+                user=group['user'], name=group['name'],
+            ).exclude(id=group['keep_id']).values_list('id', flat=True))
+
+            linked = through.objects.filter(**{fk: group['keep_id']}).values('recipe_id')
+            # Links the kept row already has would violate the through
+            # table's unique constraint; the rest are moved over.
+            through.objects.filter(
+                **{f'{fk}__in': drop_ids}, recipe_id__in=linked,
+            ).delete()
+            through.objects.filter(**{f'{fk}__in': drop_ids}).update(
+                **{fk: group['keep_id']}
+            )
+            model.objects.filter(id__in=drop_ids).delete()
+
+
+class Migration(migrations.Migration):
+    # On its own so the rows it changes are checked against their deferred
+    # foreign keys when it commits; PostgreSQL refuses to ALTER a table
+    # with such checks pending, as 0010_unique_tag_ingredient_name does.
+
+    dependencies = [
+        ('core', '0009_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.1.15 on 2026-10-18 15:30
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRES_FORWARD = (
+    '''
+    CREATE FUNCTION core_recipe_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    # Only recomputed when the searched columns are written
+    '''
+    CREATE TRIGGER core_recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description ON core_recipe
+    FOR EACH ROW EXECUTE FUNCTION core_recipe_search_vector_update()
+    ''',
+    'UPDATE core_recipe SET title = title',
+    'CREATE INDEX core_recipe_search_vector_idx ON core_recipe USING gin (search_vector)',
+)
+
+POSTGRES_BACKWARD = (
+    'DROP INDEX IF EXISTS core_recipe_search_vector_idx',
+    'DROP TRIGGER IF EXISTS core_recipe_search_vector_trigger ON core_recipe',
+    'DROP FUNCTION IF EXISTS core_recipe_search_vector_update()',
+)
+
+# The triggers that keep this table current are created by
+# recipe.search.install_sqlite_triggers after every migrate.
+SQLITE_FORWARD = (
+    '''
+    CREATE VIRTUAL TABLE core_recipe_fts USING fts5(
+        title, description,
+        content='core_recipe', content_rowid='id', tokenize='porter unicode61'
+    )
+    ''',
+    "INSERT INTO core_recipe_fts (core_recipe_fts) VALUES ('rebuild')",
+)
+
+SQLITE_BACKWARD = (
+    'DROP TRIGGER IF EXISTS core_recipe_fts_insert',
+    'DROP TRIGGER IF EXISTS core_recipe_fts_delete',
+    'DROP TRIGGER IF EXISTS core_recipe_fts_update',
+    'DROP TABLE IF EXISTS core_recipe_fts',
+)
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_storedfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            _run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
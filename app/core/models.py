@@ -10,16 +10,24 @@ from django.conf import settings
 from email.policy import default
 from enum import unique
 from unicodedata import name
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import (
     AbstractBaseUser, # Modify Django default usermodel
     PermissionsMixin, # Add permissions to usermodel
     BaseUserManager, 
 )
 
+from core.storage import content_addressed_name
+
 # Function to generate file path for new recipe image
 def recipe_image_file_path(instance, filename):
     ''' Generate file path for new recipe image.'''
+    if settings.RECIPE_IMAGE_CONTENT_ADDRESSED:
+        # instance.image still holds the upload at this point
+        return content_addressed_name(instance.image.file, filename)
+
     ext = os.path.splitext(filename)[1]  # extract the extension of the pathname
     filename = f'{uuid.uuid4()}{ext}'    # create new filename using the previous extension
     
@@ -91,7 +99,18 @@ class Recipe(models.Model): ## basic class provided by Django
     tags = models.ManyToManyField('Tag') 
     ingredients=models.ManyToManyField('Ingredient') 
     image = models.ImageField(null=True, upload_to=recipe_image_file_path) # pass the upload function, don't execute it
+    image_variants = models.JSONField(default=dict, blank=True) # {size: {format: name}}, filled by recipe/images.py
     # we can have many recipies with many tags each
+    updated_at = models.DateTimeField(auto_now=True) # also touched when tags/ingredients change (core/signals.py)
+    # Weighted tsvector of title and description, maintained by a database
+    # trigger on Postgres (migration 0013); unused on SQLite
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # RecipeViewSet: WHERE user_id = ? ORDER BY id DESC
+            models.Index(fields=['user', '-id'], name='core_recipe_user_id_idx'),
+        ]
     
     def __str__(self):  ## it displays the title when listing things in the django admin 
         return self.title
@@ -104,6 +123,13 @@ class Tag(models.Model):
             settings.AUTH_USER_MODEL,
             on_delete=models.CASCADE,
      )
+
+    class Meta:
+        constraints = [
+            # One tag per name and user; also serves TagViewSet's
+            # WHERE user_id = ? ORDER BY name DESC
+            models.UniqueConstraint(fields=['user', 'name'], name='core_tag_unique_user_name'),
+        ]
     
     def __str__(self):
         return self.name
@@ -115,5 +141,47 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+
+    class Meta:
+        constraints = [
+            # One ingredient per name and user; also serves IngredientViewSet's
+            # WHERE user_id = ? ORDER BY name DESC
+            models.UniqueConstraint(fields=['user', 'name'], name='core_ingredient_unique_user_name'),
+        ]
+
     def __str__(self): # string representation
-        return self.name
\ No newline at end of file
+        return self.name
+
+
+class StoredFileManager(models.Manager):
+    ''' Reference counting of content-addressed files.'''
+
+    def acquire(self, name):
+        ''' Add a reference to name, creating its row if needed.
+
+        Must run in the transaction that saves the reference: the row stays
+        locked until it commits, so `gc_media` can't delete the file meanwhile.
+        '''
+        with transaction.atomic():
+            if self.filter(name=name).update(references=F('references') + 1):
+                return
+            try:
+                with transaction.atomic():
+                    self.create(name=name, references=1)
+            except IntegrityError:  # created concurrently
+                self.filter(name=name).update(references=F('references') + 1)
+
+    def release(self, name):
+        ''' Drop a reference to name; the file stays until `gc_media` runs.'''
+        self.filter(name=name, references__gt=0).update(references=F('references') - 1)
+
+
+class StoredFile(models.Model):
+    ''' A content-addressed media file and the number of objects using it.'''
+    name = models.CharField(max_length=255, unique=True)
+    references = models.PositiveIntegerField(default=0)
+
+    objects = StoredFileManager()
+
+    def __str__(self):
+        return self.name
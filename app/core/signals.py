@@ -0,0 +1,61 @@
+'''
+Signal handlers that keep Recipe.updated_at and StoredFile references current
+'''
+
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Recipe, Tag, Ingredient, StoredFile
+from core.storage import is_content_addressed
+
+# Recipe field holding the M2M relation for each through model
+RELATION_FIELDS = {
+    Recipe.tags.through: 'tags',
+    Recipe.ingredients.through: 'ingredients',
+}
+
+
+def touch_recipes(**filters):
+    '''Set updated_at to now on the recipes matching filters.'''
+    return Recipe.objects.filter(**filters).update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def touch_on_link_change(sender, instance, action, reverse, pk_set, **kwargs):
+    '''Touch recipes whose tags or ingredients were added or removed.'''
+    if action in ('post_add', 'post_remove') and not pk_set:
+        return
+
+    if not reverse:  # recipe.tags.add(...)
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            instance.updated_at = timezone.now()
+            touch_recipes(pk=instance.pk)
+    elif action in ('post_add', 'post_remove'):  # tag.recipe_set.add(...)
+        touch_recipes(pk__in=pk_set)
+    elif action == 'pre_clear':  # the links are gone after the clear
+        touch_recipes(**{RELATION_FIELDS[sender]: instance})
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def touch_on_tag_change(sender, instance, created=False, **kwargs):
+    '''Touch recipes when a tag they show is renamed or deleted.'''
+    if not created:
+        touch_recipes(tags=instance)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def touch_on_ingredient_change(sender, instance, created=False, **kwargs):
+    '''Touch recipes when an ingredient they show is renamed or deleted.'''
+    if not created:
+        touch_recipes(ingredients=instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_image_on_delete(sender, instance, **kwargs):
+    '''Drop a deleted recipe's reference to its content-addressed image.'''
+    if is_content_addressed(instance.image.name):
+        StoredFile.objects.release(instance.image.name)
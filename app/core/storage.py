@@ -0,0 +1,69 @@
+'''
+Content-addressed storage for uploaded media
+
+With settings.RECIPE_IMAGE_CONTENT_ADDRESSED on, recipe images are named by
+the SHA-256 of their bytes, so identical uploads share one file and the
+second one is never written. core.models.StoredFile counts the recipes
+using each file; `manage.py gc_media` deletes the unreferenced ones.
+'''
+
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+CONTENT_ADDRESSED_DIR = os.path.join('uploads', 'recipe', 'sha256')
+
+
+def is_content_addressed(name):
+    '''Return True if a storage name was derived from the file contents.'''
+    return bool(name) and name.startswith(CONTENT_ADDRESSED_DIR + os.sep)
+
+
+def content_hash(file):
+    '''Return the SHA-256 hex digest of a file, reading it in chunks.
+
+    The digest is remembered on the file object so that naming and
+    reference counting hash each upload only once.
+    '''
+    digest = getattr(file, 'content_hash', None)
+    if digest is None:
+        sha = hashlib.sha256()
+        file.seek(0)
+        for chunk in file.chunks():
+            sha.update(chunk)
+        file.seek(0)
+        digest = file.content_hash = sha.hexdigest()
+    return digest
+
+
+def content_addressed_name(file, filename):
+    '''Return the content-addressed storage name for an uploaded file.'''
+    digest = content_hash(file)
+    ext = os.path.splitext(filename)[1].lower()
+    return os.path.join(CONTENT_ADDRESSED_DIR, digest[:2], f'{digest}{ext}')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    '''FileSystemStorage that writes content-addressed names at most once.
+
+    Other names are stored exactly as FileSystemStorage stores them.
+    '''
+
+    def get_available_name(self, name, max_length=None):
+        if is_content_addressed(name):
+            return name  # same name, same bytes
+        return super().get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        if not is_content_addressed(name):
+            return super()._save(name, content)
+        if self.exists(name):
+            return name
+
+        # Write under a private name and rename into place, so the final
+        # name only ever exists complete and concurrent writers can't clash
+        tmp_name = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(tmp_name), self.path(name))
+        return name
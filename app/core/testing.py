@@ -0,0 +1,110 @@
+'''
+Query budgets for API tests, and the project's test runner
+
+QueryBudgetMixin adds assertions that a block of code runs at most a
+given number of database queries, and that a request runs as many
+queries with 100 rows as with 1. The query_budget decorator gives every
+request a test makes through self.client a budget. Failures list the SQL
+that ran.
+
+The test runner declares TEST_REPLICA, a mirror of the default database,
+when settings declare no replicas, so replica routing can be tested
+without one.
+'''
+
+import copy
+import logging
+import os
+from contextlib import contextmanager
+from functools import wraps
+from unittest.mock import patch
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext
+
+TEST_REPLICA = 'replica1'
+
+
+def format_queries(queries):
+    '''Return captured queries as a numbered list of SQL.'''
+    return '\n'.join(f'{n}. {query["sql"]}' for n, query in enumerate(queries, 1))
+
+
+class QueryBudgetMixin:
+    '''TestCase mixin asserting query budgets.'''
+
+    @contextmanager
+    def assertMaxQueries(self, budget, using=DEFAULT_DB_ALIAS, msg=None):
+        '''Fail if the block runs more than budget queries.'''
+        with CaptureQueriesContext(connections[using]) as queries:
+            yield queries
+        if len(queries) > budget:
+            self.fail(
+                f'{msg or "Block"} ran {len(queries)} queries, over its budget of '
+                f'{budget}:\n{format_queries(queries.captured_queries)}'
+            )
+
+    def assertQueriesFlat(self, request, populate, sizes=(1, 100), using=DEFAULT_DB_ALIAS):
+        '''Fail if request() runs a different number of queries as populate() adds rows.
+
+        populate(count) must add count rows; it's called to bring the data
+        up to each size in turn before request() is measured. Returns the
+        results of request().
+        '''
+        results, runs, total = [], [], 0
+        for size in sizes:
+            populate(size - total)
+            total = size
+            with CaptureQueriesContext(connections[using]) as queries:
+                results.append(request())
+            runs.append((size, queries.captured_queries))
+
+        (first_size, first), *rest = runs
+        for size, queries in rest:
+            if len(queries) != len(first):
+                self.fail(
+                    f'Queries changed from {len(first)} with {first_size} rows to '
+                    f'{len(queries)} with {size} rows:\n{format_queries(queries)}'
+                )
+        return results
+
+
+def query_budget(budget, using=DEFAULT_DB_ALIAS):
+    '''Fail the decorated test if a request through self.client runs more than budget queries.
+
+    The test case must use QueryBudgetMixin.
+    '''
+    def decorator(test):
+        @wraps(test)
+        def wrapper(self, *args, **kwargs):
+            request = self.client.request
+
+            def budgeted(**environ):
+                msg = f'{environ.get("REQUEST_METHOD", "GET")} {environ.get("PATH_INFO")}'
+                with self.assertMaxQueries(budget, using=using, msg=msg):
+                    return request(**environ)
+
+            with patch.object(self.client, 'request', budgeted):
+                return test(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TestRunner(DiscoverRunner):
+    '''Keep the per-request log lines out of test output, and declare TEST_REPLICA.
+
+    Set REQUEST_LOG_LEVEL to see them; assertLogs() captures them anyway.
+    '''
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        if 'REQUEST_LOG_LEVEL' not in os.environ:
+            logging.getLogger('core.middleware').setLevel(logging.WARNING)
+        if TEST_REPLICA not in settings.DATABASES:
+            # connections.settings is settings.DATABASES with defaults filled in
+            default = copy.deepcopy(connections.settings[DEFAULT_DB_ALIAS])
+            connections.settings[TEST_REPLICA] = {
+                **default, 'TEST': {**default['TEST'], 'MIRROR': DEFAULT_DB_ALIAS},
+            }
@@ -1,11 +1,27 @@
 from asyncio import wait_for
+from decimal import Decimal
+import json
+import os
+import queue
+import tempfile
+from io import StringIO
 from multiprocessing.connection import wait
 from unittest.mock import patch
 from psycopg2 import OperationalError as Psycopg2Error
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.management.commands import generate_dataset, import_recipes
+from core.models import Recipe, Tag, Ingredient
+from recipe.cache import get_user_version
 
 @patch('core.management.commands.wait_for_db.Command.check') ## --> patched_check
 class Commandtest(SimpleTestCase):
@@ -33,3 +49,285 @@ class Commandtest(SimpleTestCase):
         patched_check.assert_called_with(databases=['default'])
         
         
+
+
+class ExplainQueriesCommandTests(TestCase):
+    '''Test the explain_queries command.'''
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=10, price=Decimal('2.50')
+        )
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Dinner'))
+        recipe.ingredients.add(Ingredient.objects.create(user=self.user, name='Salt'))
+
+    def test_explain_every_endpoint(self):
+        '''Test a plan is reported for each endpoint queryset.'''
+        out = StringIO()
+        call_command('explain_queries', stdout=out)
+
+        output = out.getvalue()
+        for name in ('recipe-list:', 'recipe-detail:', 'tag-list:',
+                     'ingredient-list ?assigned_only=1:'):
+            self.assertIn(name, output)
+
+    def test_unknown_user_error(self):
+        '''Test an unknown --user raises an error.'''
+        with self.assertRaises(CommandError):
+            call_command('explain_queries', user='nobody@example.com', stdout=StringIO())
+
+    @patch('django.db.models.query.QuerySet.explain')
+    def test_fail_on_seq_scan(self, patched_explain):
+        '''Test --fail-on-seq-scan errors when a plan scans a table.'''
+        patched_explain.return_value = (
+            'Seq Scan on core_recipe  (cost=0.00..1.01 rows=1 width=8)\n'
+            'SCAN core_recipe'
+        )
+
+        with self.assertRaises(CommandError):
+            call_command('explain_queries', fail_on_seq_scan=True, stdout=StringIO())
+
+
+class ImportRecipesCommandTests(TestCase):
+    '''Test the import_recipes command.'''
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.other = get_user_model().objects.create_user(
+            email='other@example.com', name='Other User', password='testpass123'
+        )
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(content)
+        return path
+
+    def _import(self, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command('import_recipes', path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_ndjson(self):
+        '''Test recipes, tags and ingredients are created in input order.'''
+        Tag.objects.create(user=self.user, name='Vegan')
+        rows = [
+            {'title': 'Soup', 'time_minutes': 10, 'price': '2.50',
+             'tags': ['Vegan', 'Dinner'], 'ingredients': [{'name': 'Leek'}]},
+            {'user': 'other@example.com', 'title': 'Stew', 'time_minutes': 60,
+             'price': '7.00', 'description': 'Slow', 'tags': ['Dinner']},
+            {'title': 'Salad', 'time_minutes': 5, 'price': '4.00', 'tags': ['Vegan']},
+        ]
+        path = self._write('recipes.ndjson', ''.join(json.dumps(row) + '\n' for row in rows))
+        version = get_user_version(self.user.id)
+
+        out, err = self._import(path, user='user@example.com', batch_size=2)
+
+        self.assertIn('Imported 3 recipes', out)
+        self.assertEqual(err, '')
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        self.assertEqual([r.title for r in recipes], ['Soup', 'Salad'])
+        self.assertEqual(
+            sorted(recipes[0].tags.values_list('name', flat=True)), ['Dinner', 'Vegan']
+        )
+        self.assertEqual(Tag.objects.filter(user=self.user, name='Vegan').count(), 1)
+        self.assertEqual(recipes[1].tags.get().name, 'Vegan')
+        self.assertEqual(recipes[0].ingredients.get().name, 'Leek')
+        stew = Recipe.objects.get(user=self.other)
+        self.assertEqual((stew.description, stew.price), ('Slow', Decimal('7.00')))
+        self.assertEqual(stew.tags.get().user, self.other)
+        self.assertNotEqual(get_user_version(self.user.id), version)
+
+    def test_import_csv(self):
+        '''Test CSV rows with | separated tags and ingredients.'''
+        path = self._write('recipes.csv', (
+            'user,title,time_minutes,price,link,tags,ingredients\r\n'
+            'user@example.com,Soup,10,2.50,,Vegan|Dinner,Leek\r\n'
+            'user@example.com,Toast,3,1.00,https://example.com,,\r\n'
+        ))
+
+        out, _ = self._import(path)
+
+        self.assertIn('Imported 2 recipes', out)
+        soup, toast = Recipe.objects.order_by('id')
+        self.assertEqual(soup.tags.count(), 2)
+        self.assertEqual(toast.link, 'https://example.com')
+        self.assertEqual(toast.tags.count(), 0)
+
+    def test_invalid_rows_skipped(self):
+        '''Test invalid rows are reported by line and the rest imported.'''
+        path = self._write('recipes.ndjson', '\n'.join([
+            json.dumps({'title': 'Good', 'time_minutes': 1, 'price': '1.00'}),
+            '{not json',
+            json.dumps({'title': 'Pricey', 'time_minutes': 1, 'price': '100000'}),
+            json.dumps({'user': 'nobody@example.com', 'title': 'Lost',
+                        'time_minutes': 1, 'price': '1.00'}),
+            json.dumps({'time_minutes': 1, 'price': '1.00'}),
+        ]))
+
+        out, err = self._import(path, user='user@example.com')
+
+        self.assertIn('Imported 1 recipes', out)
+        self.assertIn('skipped 4 rows', out)
+        for lineno in (2, 3, 4, 5):
+            self.assertIn(f'line {lineno}:', err)
+        self.assertEqual(list(Recipe.objects.values_list('title', flat=True)), ['Good'])
+
+    def test_queries_per_batch(self):
+        '''Test a batch takes the same number of queries whatever its size.'''
+        rows = [
+            import_recipes.ImportRow(
+                i, 'user@example.com',
+                {'title': f'Recipe {i}', 'description': '', 'time_minutes': i,
+                 'price': Decimal('1.00'), 'link': ''},
+                [f'Tag {i}', 'Shared'], [f'Ingredient {i}'],
+            )
+            for i in range(20)
+        ]
+        importer = import_recipes.BatchImporter()
+
+        # users, tags (insert + read back), ingredients (insert + read
+        # back), recipes, both through tables, in a savepoint
+        with self.assertNumQueries(10):
+            created, errors = importer.import_batch(rows)
+
+        self.assertEqual((created, errors), (20, []))
+        self.assertEqual(Tag.objects.get(name='Shared').recipe_set.count(), 20)
+
+    def test_export_round_trip(self):
+        '''Test a file from the export endpoint can be imported.'''
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=10, price=Decimal('2.50'),
+        )
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        client = APIClient()
+        client.force_authenticate(self.user)
+        res = client.get(reverse('recipe:recipe-export'))
+        path = self._write('export.ndjson', b''.join(res.streaming_content).decode())
+
+        self._import(path, user='other@example.com')
+
+        copy = Recipe.objects.get(user=self.other)
+        self.assertEqual((copy.title, copy.price), ('Soup', Decimal('2.50')))
+        self.assertEqual(copy.tags.get().user, self.other)
+
+    def test_partition_keeps_users_together(self):
+        '''Test each user's rows always go to the same worker.'''
+        emails = [f'user{i}@example.com' for i in range(50)]
+        first = [import_recipes.partition(email, 4) for email in emails]
+
+        self.assertEqual(first, [import_recipes.partition(email, 4) for email in emails])
+        self.assertEqual(set(first), {0, 1, 2, 3})
+
+    @patch('core.management.commands.import_recipes.connections')
+    def test_worker_stops_importing_after_failure(self, patched_connections):
+        '''Test a worker drains its queue after a failed batch.'''
+        row = import_recipes.ImportRow(
+            1, 'user@example.com',
+            {'title': 'Soup', 'description': '', 'time_minutes': 1,
+             'price': Decimal('1.00'), 'link': ''},
+            [], [],
+        )
+        batches, results = queue.Queue(), queue.Queue()
+        for batch in ([row], [row], [row], None):
+            batches.put(batch)
+
+        with patch.object(import_recipes.BatchImporter, 'import_batch',
+                          side_effect=[(1, []), RuntimeError('boom'), (1, [])]):
+            import_recipes._worker(batches, results)
+
+        self.assertEqual(results.get_nowait(), (1, [], None))
+        created, _, failure = results.get_nowait()
+        self.assertIn('boom', failure)
+        self.assertTrue(results.empty())
+        patched_connections.close_all.assert_called_once()
+
+
+class GenerateDatasetCommandTests(TestCase):
+    '''Test the generate_dataset command.'''
+
+    def _generate(self, **options):
+        options = {
+            'users': 2, 'recipes': 30, 'tags_per_user': 10, 'ingredients_per_user': 12,
+            'tags_per_recipe': (2, 4), 'ingredients_per_recipe': (3, 3), **options,
+        }
+        out = StringIO()
+        call_command('generate_dataset', stdout=out, **options)
+        return out.getvalue()
+
+    def _snapshot(self, users):
+        return [
+            (recipe.title, recipe.price, sorted(tag.name for tag in recipe.tags.all()))
+            for recipe in Recipe.objects.filter(user__in=users)
+            .order_by('id').prefetch_related('tags')
+        ]
+
+    def test_generate_dataset(self):
+        '''Test users, pools and recipes are created as configured.'''
+        out = self._generate(password='genpass123')
+
+        users = get_user_model().objects.filter(email__in=['user0@example.com', 'user1@example.com'])
+        self.assertEqual(len(users), 2)
+        self.assertTrue(all(user.check_password('genpass123') for user in users))
+        self.assertEqual(Tag.objects.count(), 20)
+        self.assertEqual(Ingredient.objects.count(), 24)
+        self.assertEqual(Recipe.objects.count(), 30)
+        for recipe in Recipe.objects.prefetch_related('tags', 'ingredients'):
+            self.assertTrue(2 <= len(recipe.tags.all()) <= 4)
+            self.assertEqual(len(recipe.ingredients.all()), 3)
+            self.assertEqual({tag.user_id for tag in recipe.tags.all()}, {recipe.user_id})
+        self.assertIn('Generated 2 users and 30 recipes', out)
+        # Rows created afterwards get fresh IDs
+        Recipe.objects.create(user=users[0], title='New', time_minutes=1, price=Decimal('1.00'))
+
+    def test_same_seed_same_data(self):
+        '''Test a seed always generates the same recipes.'''
+        self._generate(email='a{n}@example.com', seed=7)
+        self._generate(email='b{n}@example.com', seed=7)
+        self._generate(email='c{n}@example.com', seed=8)
+
+        first, second, other = (
+            self._snapshot(get_user_model().objects.filter(email__startswith=prefix))
+            for prefix in 'abc'
+        )
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+
+    def test_skewed_tag_reuse(self):
+        '''Test a skew makes the first tags of the pool the most used.'''
+        self._generate(users=1, recipes=200, tags_per_recipe=(1, 1), skew=2)
+
+        counts = {tag.name: tag.recipe_set.count() for tag in Tag.objects.all()}
+        self.assertGreater(counts['Tag 0'], counts['Tag 1'])
+        self.assertGreater(counts['Tag 1'], counts['Tag 9'])
+
+    def test_indexes_rebuilt(self):
+        '''Test the indexes dropped during the load exist afterwards.'''
+        table = Recipe.tags.through._meta.db_table
+        before = generate_dataset.secondary_indexes(connection, table)
+
+        self._generate()
+
+        self.assertTrue(before)
+        self.assertCountEqual(generate_dataset.secondary_indexes(connection, table), before)
+
+    def test_existing_users_error(self):
+        '''Test generating users that already exist fails.'''
+        self._generate()
+
+        with self.assertRaises(CommandError):
+            self._generate()
+
+    def test_invalid_options_error(self):
+        '''Test more tags per recipe than per user fails.'''
+        with self.assertRaises(CommandError):
+            self._generate(tags_per_recipe=(5, 20))
+        with self.assertRaises(CommandError):
+            self._generate(email='same@example.com')
@@ -0,0 +1,143 @@
+'''
+Tests for the read replica router.
+'''
+
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db import ReplicaRouter
+from core.models import Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+ME_URL = reverse('user:me')
+
+
+@override_settings(DB_REPLICAS=['replica1'])
+class ReplicaRoutingTests(TransactionTestCase):
+    '''Test which database API requests read from.
+
+    In tests the replica is a mirror of the default database on a
+    connection of its own, so the queries captured on that connection show
+    what was read from the replica. The rows must be committed for the
+    mirror to see them, hence TransactionTestCase.
+    '''
+    databases = {'default', 'replica1'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _create_recipe(self, title):
+        return Recipe.objects.create(
+            user=self.user, title=title, time_minutes=5, price=Decimal('1.00'),
+        )
+
+    def _replica_reads(self, request):
+        '''Return the response of request() and the queries it ran on the replica.'''
+        with CaptureQueriesContext(connections['replica1']) as replica:
+            res = request()
+        return res, len(replica)
+
+    def _titles(self):
+        '''Return the titles of the recipe list and the number of replica queries.'''
+        res, reads = self._replica_reads(lambda: self.client.get(RECIPES_URL))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recipe['title'] for recipe in res.data], reads
+
+    def test_safe_requests_read_replica(self):
+        '''Test list and detail requests are served by the replica.'''
+        recipe = self._create_recipe('Soup')
+
+        titles, reads = self._titles()
+        self.assertEqual(titles, ['Soup'])
+        self.assertGreater(reads, 0)
+
+        res, reads = self._replica_reads(
+            lambda: self.client.get(reverse('recipe:recipe-detail', args=[recipe.id]))
+        )
+        self.assertEqual(res.data['title'], 'Soup')
+        self.assertGreater(reads, 0)
+
+    def test_export_streams_from_replica(self):
+        '''Test the export reads its streamed recipes and tags from the replica.'''
+        recipe = self._create_recipe('Soup')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+        res = self.client.get(reverse('recipe:recipe-export'))
+        with CaptureQueriesContext(connections['default']) as primary:
+            body, reads = self._replica_reads(lambda: b''.join(res.streaming_content))
+        lines = [json.loads(line) for line in body.splitlines()]
+
+        self.assertEqual([tag['name'] for tag in lines[0]['tags']], ['Vegan'])
+        self.assertGreaterEqual(reads, 3)  # recipes, tags, ingredients
+        self.assertEqual(len(primary), 0)
+
+    def test_writes_go_to_primary_and_pin_reads(self):
+        '''Test a user's reads come from the primary right after a write.'''
+        res, reads = self._replica_reads(lambda: self.client.post(RECIPES_URL, {
+            'title': 'New', 'time_minutes': 5, 'price': '1.00',
+        }))
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(reads, 0)
+
+        self.assertEqual(self._titles(), (['New'], 0))
+
+    @override_settings(DB_REPLICA_PIN_SECONDS=0)
+    def test_reads_return_to_replica_after_pin(self):
+        '''Test the pin only lasts DB_REPLICA_PIN_SECONDS.'''
+        self.client.patch(ME_URL, {'name': 'Renamed'})
+
+        _titles, reads = self._titles()
+        self.assertGreater(reads, 0)
+
+    def test_pin_is_per_user(self):
+        '''Test another user's write doesn't pin this user.'''
+        other = get_user_model().objects.create_user(
+            email='other@example.com', name='Other', password='testpass123'
+        )
+        other_client = APIClient()
+        other_client.force_authenticate(other)
+        other_client.post(TAGS_URL, {'name': 'Vegan'})
+
+        _titles, reads = self._titles()
+        self.assertGreater(reads, 0)
+
+    def test_attribute_lists_read_replica(self):
+        '''Test tag lists are served by the replica.'''
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res, reads = self._replica_reads(lambda: self.client.get(TAGS_URL))
+
+        self.assertEqual([tag['name'] for tag in res.data], ['Vegan'])
+        self.assertGreater(reads, 0)
+
+    @override_settings(DB_REPLICAS=[])
+    def test_no_replicas(self):
+        '''Test everything is read from the primary without replicas.'''
+        self._create_recipe('Soup')
+
+        self.assertEqual(self._titles(), (['Soup'], 0))
+
+    def test_relations_across_databases(self):
+        '''Test objects read from a replica can be related to new ones.'''
+        router = ReplicaRouter()
+        replica_user = get_user_model().objects.using('replica1').get(pk=self.user.pk)
+
+        self.assertTrue(router.allow_relation(replica_user, Tag(user=self.user)))
+        self.assertEqual(router.db_for_write(Tag), 'default')
+        self.assertIsNone(router.db_for_read(Tag))
@@ -0,0 +1,176 @@
+'''
+Tests for the request metrics middleware.
+'''
+
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import middleware
+from core.models import Recipe
+from recipe.cache import get_cache
+
+RECIPES_URL = reverse('recipe:recipe-list')
+METRICS_URL = reverse('core:metrics')
+
+
+def server_timing(response):
+    '''Return the Server-Timing header as {name: (duration, description)}.'''
+    entries = {}
+    for entry in response['Server-Timing'].split(', '):
+        name, *params = entry.split(';')
+        params = dict(param.split('=', 1) for param in params)
+        entries[name] = (float(params['dur']), params.get('desc', '').strip('"'))
+    return entries
+
+
+class RequestMetricsMiddlewareTests(TestCase):
+    '''Test the metrics reported for API requests.'''
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for i in range(3):
+            Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=5, price=Decimal('1.00'),
+            )
+
+    def test_server_timing(self):
+        '''Test the header reports total, database and serializer time.'''
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL)
+
+        timings = server_timing(res)
+        self.assertEqual(set(timings), {'total', 'db', 'serialize'})
+        self.assertEqual(timings['db'][1], f'{len(queries)} queries')
+        self.assertGreaterEqual(timings['total'][0], timings['db'][0])
+
+    def test_log_line(self):
+        '''Test each request is logged as JSON tagged with view and action.'''
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            res = self.client.get(RECIPES_URL)
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['endpoint'], 'RecipeViewSet.list')
+        self.assertEqual((line['method'], line['status']), ('GET', 200))
+        self.assertEqual(line['response_bytes'], len(res.content))
+        self.assertGreater(line['db_queries'], 0)
+        self.assertIn('serialize_ms', line)
+
+    def test_action_names(self):
+        '''Test custom actions, other methods and unknown URLs are told apart.'''
+        recipe = Recipe.objects.first()
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            self.client.get(reverse('recipe:recipe-detail', args=[recipe.id]))
+            self.client.delete(reverse('recipe:recipe-detail', args=[recipe.id]))
+            b''.join(self.client.get(reverse('recipe:recipe-export')).streaming_content)
+            self.client.get('/api/nowhere/')
+
+        self.assertEqual(
+            [json.loads(record.getMessage())['endpoint'] for record in logs.records],
+            ['RecipeViewSet.retrieve', 'RecipeViewSet.destroy', 'RecipeViewSet.export',
+             'unresolved'],
+        )
+
+    def test_streamed_queries_logged(self):
+        '''Test the queries run while streaming are logged once the stream ends.'''
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            res = self.client.get(reverse('recipe:recipe-export'))
+            self.assertEqual(logs.records, [])  # nothing until the body is read
+            with CaptureQueriesContext(connection) as streamed:
+                body = b''.join(res.streaming_content)
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['endpoint'], 'RecipeViewSet.export')
+        self.assertEqual(line['response_bytes'], len(body))
+        self.assertGreaterEqual(line['db_queries'], len(streamed))
+        self.assertGreater(len(streamed), 0)
+
+    def test_histograms(self):
+        '''Test durations are added to the endpoint's histogram.'''
+        before = middleware.get_histogram('TagViewSet.list').snapshot()['count']
+
+        for _ in range(2):
+            self.client.get(reverse('recipe:tag-list'))
+
+        snapshot = middleware.get_histogram('TagViewSet.list').snapshot()
+        self.assertEqual(snapshot['count'], before + 2)
+        self.assertEqual(snapshot['buckets']['le_inf'], snapshot['count'])
+
+    @override_settings(REQUEST_METRICS={
+        'SERVER_TIMING': False, 'HISTOGRAM_SAMPLES': 10, 'HISTOGRAM_WINDOW': 60,
+    })
+    def test_server_timing_disabled(self):
+        '''Test the header can be turned off.'''
+        res = self.client.get(RECIPES_URL)
+
+        self.assertFalse(res.has_header('Server-Timing'))
+
+    async def test_async_view_queries_counted(self):
+        '''Test queries run in sync_to_async threads are counted.'''
+        token = await Token.objects.acreate(user=self.user)
+
+        res = await AsyncClient().get(
+            reverse('recipe-async:recipe-list'),
+            headers={'Authorization': f'Token {token.key}'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertGreater(int(server_timing(res)['db'][1].split()[0]), 0)
+
+    def test_metrics_endpoint(self):
+        '''Test staff can read the histograms and other users can't.'''
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertGreater(res.data['endpoints']['RecipeViewSet.list']['count'], 0)
+
+
+class RollingHistogramTests(TestCase):
+    '''Test the rolling histogram.'''
+
+    def test_snapshot(self):
+        '''Test percentiles and cumulative buckets.'''
+        histogram = middleware.RollingHistogram(samples=100, window=60)
+        for ms in range(1, 101):
+            histogram.add(ms)
+
+        snapshot = histogram.snapshot()
+
+        self.assertEqual(snapshot['count'], 100)
+        self.assertEqual((snapshot['p50'], snapshot['p99'], snapshot['max']), (51, 100, 100))
+        self.assertEqual(snapshot['buckets']['le_5'], 5)
+        self.assertEqual(snapshot['buckets']['le_100'], 100)
+        self.assertEqual(snapshot['buckets']['le_inf'], 100)
+
+    def test_old_samples_dropped(self):
+        '''Test samples leave the histogram after the window or the sample limit.'''
+        histogram = middleware.RollingHistogram(samples=3, window=60)
+        with patch('core.middleware.time.monotonic', return_value=1000):
+            for ms in (1, 2, 3, 4):
+                histogram.add(ms)
+            self.assertEqual(histogram.snapshot()['max'], 4)
+            self.assertEqual(histogram.snapshot()['count'], 3)
+
+        with patch('core.middleware.time.monotonic', return_value=1061):
+            self.assertEqual(histogram.snapshot(), {'count': 0})
@@ -0,0 +1,65 @@
+'''
+Tests for data migrations
+'''
+
+from decimal import Decimal
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MergeDuplicatesMigrationTests(TransactionTestCase):
+    '''Test tags and ingredients sharing a name are merged before they're made unique.'''
+    before = [('core', '0009_recipe_updated_at')]
+    after = [('core', '0010_unique_tag_ingredient_name')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_duplicates_merged(self):
+        '''Test recipes keep every tag and ingredient once their duplicates are merged.'''
+        apps = self.migrate(self.before)
+        User = apps.get_model('core', 'User')
+        Recipe = apps.get_model('core', 'Recipe')
+        Tag = apps.get_model('core', 'Tag')
+        Ingredient = apps.get_model('core', 'Ingredient')
+
+        user = User.objects.create(email='user@example.com', name='Test User')
+        other = User.objects.create(email='other@example.com', name='Other')
+        soup, salad = (
+            Recipe.objects.create(user=user, title=title, time_minutes=5, price=Decimal('1.00'))
+            for title in ('Soup', 'Salad')
+        )
+        vegan, vegan_again, quick = (
+            Tag.objects.create(user=user, name=name) for name in ('Vegan', 'Vegan', 'Quick')
+        )
+        others_vegan = Tag.objects.create(user=other, name='Vegan')
+        soup.tags.add(vegan, vegan_again, quick)
+        salad.tags.add(vegan_again)
+        salt, salt_again = (Ingredient.objects.create(user=user, name='Salt') for _ in range(2))
+        soup.ingredients.add(salt_again)
+
+        apps = self.migrate(self.after)
+        Recipe = apps.get_model('core', 'Recipe')
+        Tag = apps.get_model('core', 'Tag')
+        Ingredient = apps.get_model('core', 'Ingredient')
+
+        self.assertEqual(
+            sorted(Tag.objects.values_list('id', flat=True)),
+            sorted([vegan.id, quick.id, others_vegan.id]),
+        )
+        self.assertEqual(list(Ingredient.objects.values_list('id', flat=True)), [salt.id])
+        soup = Recipe.objects.get(id=soup.id)
+        self.assertEqual(
+            sorted(soup.tags.values_list('id', flat=True)), sorted([vegan.id, quick.id]),
+        )
+        self.assertEqual(list(Recipe.objects.get(id=salad.id).tags.values_list('id', flat=True)),
+                         [vegan.id])
+        self.assertEqual(list(soup.ingredients.values_list('id', flat=True)), [salt.id])
@@ -0,0 +1,94 @@
+'''
+Tests for content-addressed media storage.
+'''
+
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core.models import StoredFile
+from core.storage import (
+    ContentAddressedStorage,
+    content_addressed_name,
+    is_content_addressed,
+)
+
+
+class ContentAddressedStorageTests(TestCase):
+    '''Test storing files by content hash.'''
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def test_name_from_contents(self):
+        '''Test identical contents give identical names.'''
+        name = content_addressed_name(ContentFile(b'abc'), 'Photo.JPG')
+
+        self.assertEqual(name, content_addressed_name(ContentFile(b'abc'), 'other.jpg'))
+        self.assertNotEqual(name, content_addressed_name(ContentFile(b'abd'), 'photo.jpg'))
+        self.assertTrue(is_content_addressed(name))
+        self.assertTrue(name.endswith('.jpg'))
+
+    def test_existing_file_not_rewritten(self):
+        '''Test saving a content-addressed name twice writes once.'''
+        name = content_addressed_name(ContentFile(b'abc'), 'photo.jpg')
+        self.assertEqual(self.storage.save(name, ContentFile(b'abc')), name)
+
+        with patch('django.core.files.storage.FileSystemStorage._save') as save:
+            self.assertEqual(self.storage.save(name, ContentFile(b'abc')), name)
+
+        save.assert_not_called()
+        self.assertEqual(os.listdir(os.path.dirname(self.storage.path(name))), [os.path.basename(name)])
+
+    def test_other_names_unchanged(self):
+        '''Test other names still get a free name like FileSystemStorage.'''
+        first = self.storage.save('uploads/recipe/photo.jpg', ContentFile(b'a'))
+        second = self.storage.save('uploads/recipe/photo.jpg', ContentFile(b'b'))
+
+        self.assertNotEqual(first, second)
+
+
+class StoredFileTests(TestCase):
+    '''Test reference counting and garbage collection.'''
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.name = content_addressed_name(ContentFile(b'abc'), 'photo.jpg')
+
+    def test_acquire_and_release(self):
+        '''Test references are counted and never go negative.'''
+        StoredFile.objects.acquire(self.name)
+        StoredFile.objects.acquire(self.name)
+        StoredFile.objects.release(self.name)
+
+        self.assertEqual(StoredFile.objects.get(name=self.name).references, 1)
+
+        StoredFile.objects.release(self.name)
+        StoredFile.objects.release(self.name)
+        self.assertEqual(StoredFile.objects.get(name=self.name).references, 0)
+
+    def test_gc_deletes_unreferenced(self):
+        '''Test gc_media deletes unused files and keeps used ones.'''
+        used = content_addressed_name(ContentFile(b'used'), 'photo.jpg')
+        for name, data in ((self.name, b'abc'), (used, b'used')):
+            default_storage.save(name, ContentFile(data))
+            StoredFile.objects.acquire(name)
+        StoredFile.objects.release(self.name)
+
+        call_command('gc_media', stdout=open(os.devnull, 'w'))
+
+        self.assertFalse(default_storage.exists(self.name))
+        self.assertFalse(StoredFile.objects.filter(name=self.name).exists())
+        self.assertTrue(default_storage.exists(used))
@@ -0,0 +1,65 @@
+'''
+Tests for the query budget test helpers.
+'''
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Tag
+from core.testing import QueryBudgetMixin, query_budget
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    '''Test query budgets fail with the offending SQL.'''
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_within_budget(self):
+        '''Test a block within its budget passes.'''
+        with self.assertMaxQueries(1) as queries:
+            list(Tag.objects.all())
+        self.assertEqual(len(queries), 1)
+
+    def test_over_budget_lists_queries(self):
+        '''Test a block over its budget fails listing its SQL.'''
+        with self.assertRaises(AssertionError) as cm:
+            with self.assertMaxQueries(1):
+                Tag.objects.create(user=self.user, name='Vegan')
+                list(Tag.objects.all())
+
+        self.assertIn('ran 2 queries, over its budget of 1', str(cm.exception))
+        self.assertIn('1. INSERT INTO "core_tag"', str(cm.exception))
+        self.assertIn('2. SELECT', str(cm.exception))
+
+    def test_decorator_budgets_each_request(self):
+        '''Test the decorator fails a request over its budget.'''
+        @query_budget(0)
+        def test(self):
+            self.client.get(reverse('recipe:tag-list'))
+
+        with self.assertRaises(AssertionError) as cm:
+            test(self)
+        self.assertIn('GET /api/recipe/tags/ ran 1 queries', str(cm.exception))
+
+    def test_queries_growing_with_rows(self):
+        '''Test a query per row is caught.'''
+        def add_tags(count):
+            start = Tag.objects.count()
+            Tag.objects.bulk_create(
+                Tag(user=self.user, name=f'Tag {n}') for n in range(start, start + count)
+            )
+
+        def request():
+            return [tag.user.email for tag in Tag.objects.all()]
+
+        with self.assertRaises(AssertionError) as cm:
+            self.assertQueriesFlat(request, add_tags, sizes=(1, 3))
+        self.assertIn('Queries changed from 2 with 1 rows to 4 with 3 rows', str(cm.exception))
@@ -0,0 +1,74 @@
+'''
+Tests for the internal API.
+'''
+
+import os
+from unittest.mock import MagicMock, patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db import connection_stats
+
+DB_POOL_URL = reverse('core:db-pool')
+
+
+class DatabasePoolViewTests(TestCase):
+    '''Test the connection pool statistics endpoint.'''
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_auth_required(self):
+        '''Test anonymous requests are rejected.'''
+        res = self.client.get(DB_POOL_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_staff_required(self):
+        '''Test regular users are rejected.'''
+        user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.client.force_authenticate(user)
+
+        res = self.client.get(DB_POOL_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_unpooled_stats(self):
+        '''Test staff see the worker's connections per database.'''
+        admin = get_user_model().objects.create_superuser(
+            email='admin@example.com', name='Admin', password='testpass123'
+        )
+        self.client.force_authenticate(admin)
+
+        res = self.client.get(DB_POOL_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['pid'], os.getpid())
+        self.assertFalse(res.data['databases']['default']['pooled'])
+        self.assertTrue(res.data['databases']['default']['connected'])
+
+    @patch('core.db.connections')
+    def test_pooled_stats(self, patched_connections):
+        '''Test pool usage is derived from the psycopg pool statistics.'''
+        connection = MagicMock(vendor='postgresql')
+        connection.pool.get_stats.return_value = {
+            'pool_min': 2, 'pool_max': 8, 'pool_size': 5, 'pool_available': 1,
+            'requests_waiting': 3, 'requests_num': 40, 'requests_errors': 2,
+        }
+        patched_connections.__getitem__.return_value = connection
+
+        stats = connection_stats('default')
+
+        self.assertTrue(stats['pooled'])
+        self.assertEqual(
+            (stats['size'], stats['in_use'], stats['idle'], stats['waiting']), (5, 4, 1, 3)
+        )
+        self.assertEqual((stats['timeouts'], stats['requests']), (2, 40))
+        self.assertEqual(stats['connections_lost'], 0)
@@ -0,0 +1,13 @@
+'''
+URL mappings for the internal API
+'''
+
+from django.urls import path
+from core import views
+
+app_name = 'core'
+
+urlpatterns = [
+    path('db-pool/', views.DatabasePoolView.as_view(), name='db-pool'),
+    path('metrics/', views.RequestMetricsView.as_view(), name='metrics'),
+]
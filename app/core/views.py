@@ -0,0 +1,39 @@
+'''
+Internal views for operating the service
+'''
+
+import os
+
+from django.db import connections
+from drf_spectacular.utils import extend_schema
+
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.db import connection_stats
+from core.middleware import histogram_snapshots
+from user.authentication import CachedTokenAuthentication
+
+
+@extend_schema(exclude=True)
+class DatabasePoolView(APIView):
+    '''Report the database connection usage of the worker serving the request.'''
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'pid': os.getpid(),
+            'databases': {alias: connection_stats(alias) for alias in connections},
+        })
+
+
+@extend_schema(exclude=True)
+class RequestMetricsView(APIView):
+    '''Report the request duration histograms of the worker serving the request.'''
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({'pid': os.getpid(), 'endpoints': histogram_snapshots()})
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RecipeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipe'
+
+    def ready(self):
+        from recipe import signals  # noqa: F401 connect cache invalidation
+        from recipe.search import install_sqlite_triggers
+
+        # Sent for apps with models only; core_recipe belongs to core
+        post_migrate.connect(install_sqlite_triggers, sender=self.apps.get_app_config('core'))
@@ -0,0 +1,99 @@
+'''
+Async views for the hot read paths of the recipe APIs
+
+Served natively by app/asgi.py, without a thread per request. Querysets,
+filters, pagination and serializers are borrowed from the DRF viewsets in
+recipe/views.py so both paths return the same data.
+'''
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from rest_framework import exceptions
+from rest_framework.request import Request
+
+from recipe import views
+from recipe.export import NDJSON_CONTENT_TYPE, aexport_lines, content_disposition
+from user.async_views import async_api_view, authenticate, json_response
+
+
+def get_viewset(viewset_class, request, user, action):
+    '''Return a viewset instance set up for request, without dispatching it.'''
+    drf_request = Request(request)
+    drf_request.user = user
+    return viewset_class(
+        request=drf_request,
+        action=action,
+        format_kwarg=None,
+        args=(),
+        kwargs={},
+    )
+
+
+async def list_response(view):
+    '''Run a viewset's list logic with async queryset evaluation.'''
+    queryset = view.filter_queryset(view.get_queryset())
+    paginator = view.paginator
+    if paginator is not None and paginator.is_requested(view.request):
+        page = await sync_to_async(paginator.paginate_queryset)(
+            queryset, view.request, view
+        )
+        serializer = view.get_serializer(page, many=True)
+        return json_response(paginator.get_paginated_response(serializer.data).data)
+
+    objects = [obj async for obj in queryset]
+    return json_response(view.get_serializer(objects, many=True).data)
+
+
+@async_api_view
+async def recipe_list(request):
+    '''List the authenticated user's recipes.'''
+    user = await authenticate(request)
+    return await list_response(get_viewset(views.RecipeViewSet, request, user, 'list'))
+
+
+@async_api_view
+async def recipe_detail(request, pk):
+    '''Return one of the authenticated user's recipes.'''
+    user = await authenticate(request)
+    view = get_viewset(views.RecipeViewSet, request, user, 'retrieve')
+    recipe = await view.get_queryset().prefetch_related(
+        'tags', 'ingredients'
+    ).filter(pk=pk).afirst()
+    if recipe is None:
+        raise exceptions.NotFound('No Recipe matches the given query.')
+
+    return json_response(view.get_serializer(recipe).data)
+
+
+@async_api_view
+async def recipe_export(request):
+    '''Stream the authenticated user's recipes as NDJSON.
+
+    Under ASGI a sync StreamingHttpResponse is read into memory before it
+    is sent; this one is produced by an async iterator instead.
+    '''
+    user = await authenticate(request)
+    view = get_viewset(views.RecipeViewSet, request, user, 'export')
+    recipes = view.get_queryset().aiterator(chunk_size=settings.RECIPE_EXPORT_CHUNK_SIZE)
+    response = StreamingHttpResponse(
+        aexport_lines(recipes, view.get_serializer),
+        content_type=NDJSON_CONTENT_TYPE,
+    )
+    response['Content-Disposition'] = content_disposition(user)
+    return response
+
+
+@async_api_view
+async def tag_list(request):
+    '''List the authenticated user's tags.'''
+    user = await authenticate(request)
+    return await list_response(get_viewset(views.TagViewSet, request, user, 'list'))
+
+
+@async_api_view
+async def ingredient_list(request):
+    '''List the authenticated user's ingredients.'''
+    user = await authenticate(request)
+    return await list_response(get_viewset(views.IngredientViewSet, request, user, 'list'))
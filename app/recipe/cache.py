@@ -0,0 +1,103 @@
+'''
+Per-user response cache for the recipe list APIs
+'''
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.response import Response
+
+
+def get_cache():
+    '''Return the cache backend used for recipe API responses.'''
+    return caches[settings.RECIPE_CACHE_ALIAS]
+
+
+def _version_key(user_id):
+    return f'recipe:version:{user_id}'
+
+
+def get_user_version(user_id):
+    '''Return the current cache version for a user's recipe data.'''
+    cache = get_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed with the clock rather than 1 so a counter that was evicted
+        # never comes back with a value an old entry was stored under.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_user_version(user_id):
+    '''Invalidate every cached response for a user.'''
+    cache = get_cache()
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:  # the counter was never set or has been evicted
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def normalize_ids(value):
+    '''Return a canonical form of a comma separated list of IDs.'''
+    return ','.join(str(i) for i in sorted({int(i) for i in value.split(',')}))
+
+
+def normalize_names(value):
+    '''Return a canonical form of a comma separated list of names.'''
+    return ','.join(sorted({name for name in value.split(',') if name}))
+
+
+class CachedListMixin:
+    '''Cache list responses per user, version and normalized query params.
+
+    Entries are never deleted: a write bumps the user's version (see
+    recipe/signals.py) so every key built afterwards is new and old entries
+    simply expire. Writes through QuerySet.update() or bulk_create() don't
+    send signals and must call bump_user_version() themselves.
+    '''
+    # Query parameters that change the list response, and how to
+    # normalize them so equivalent requests share one entry.
+    cache_query_params = {}
+
+    def get_list_cache_key(self, request):
+        '''Return the cache key for a list request, or None to skip caching.'''
+        params = []
+        for name, normalize in sorted(self.cache_query_params.items()):
+            value = request.query_params.get(name)
+            if value is None:
+                continue
+            if value == '':  # meaningful for some params, e.g. ?expand=
+                params.append(f'{name}=')
+                continue
+            try:
+                params.append(f'{name}={normalize(value) if normalize else value}')
+            except ValueError:  # let the view report the bad parameter
+                return None
+
+        # Responses hold absolute URLs (images, pagination links), built
+        # from the host and scheme the request came in on
+        origin = f'{request.scheme}://{request.get_host()}'
+        digest = hashlib.md5(f'{origin}?{"&".join(params)}'.encode()).hexdigest()
+        version = get_user_version(request.user.pk)
+        return f'recipe:list:{self.basename}:{request.user.pk}:{version}:{digest}'
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_list_cache_key(request)
+        if key is None:
+            return super().list(request, *args, **kwargs)
+
+        cache = get_cache()
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RECIPE_CACHE_TIMEOUT)
+        return response
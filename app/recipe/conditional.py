@@ -0,0 +1,129 @@
+'''
+Conditional GET (ETag / Last-Modified) support for the recipe APIs
+'''
+
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control
+from django.utils.http import (
+    http_date,
+    parse_etags,
+    parse_http_date_safe,
+    quote_etag,
+)
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from recipe.cache import get_cache
+
+
+def make_etag(*parts):
+    '''Return a strong ETag built from the given parts.'''
+    digest = hashlib.sha1(':'.join(str(part) for part in parts).encode())
+    return quote_etag(digest.hexdigest())
+
+
+class ConditionalGetMixin:
+    '''Answer list and retrieve requests with 304 when nothing changed.
+
+    The validators come from Recipe.updated_at, which also moves when tags
+    or ingredients are linked, renamed or removed, so they can be checked
+    with one small query before any serialization happens.
+    '''
+    updated_field = 'updated_at'
+
+    def get_list_validators(self, request):
+        '''Return (etag, None) for the list response.
+
+        Lists get no Last-Modified: Max(updated_at) doesn't move when a
+        recipe is deleted, so If-Modified-Since alone would keep serving
+        the deleted row. The ETag includes the row count as well.
+        '''
+        def compute():
+            queryset = self.filter_queryset(self.get_queryset())
+            stats = queryset.aggregate(
+                count=Count('id'),
+                last_modified=Max(self.updated_field),
+            )
+            last_modified = stats['last_modified']
+            etag = make_etag(
+                request.user.pk,
+                request.get_full_path(),
+                stats['count'],
+                last_modified.isoformat() if last_modified else '',
+            )
+            return etag, None
+
+        # The per-user cache version changes on every write that can
+        # change the list, so the aggregate can be cached alongside it.
+        cache_key = self.get_list_cache_key(request) if hasattr(
+            self, 'get_list_cache_key'
+        ) else None
+        if cache_key is None:
+            return compute()
+
+        cache_key += ':validators'
+        validators = get_cache().get(cache_key)
+        if validators is None:
+            validators = compute()
+            get_cache().set(cache_key, validators)
+        return validators
+
+    def get_object_validators(self, request, instance):
+        '''Return (etag, last_modified) for a single object response.'''
+        last_modified = getattr(instance, self.updated_field)
+        etag = make_etag(
+            request.user.pk,
+            request.get_full_path(),
+            instance.pk,
+            last_modified.isoformat(),
+        )
+        return etag, last_modified
+
+    def _not_modified(self, request, etag, last_modified):
+        '''Return True if the client's cached copy is still current.'''
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            client_etags = [tag.removeprefix('W/') for tag in parse_etags(if_none_match)]
+            return '*' in client_etags or etag in client_etags
+
+        if_modified_since = parse_http_date_safe(
+            request.headers.get('If-Modified-Since', '')
+        )
+        return bool(
+            if_modified_since and last_modified and
+            int(last_modified.timestamp()) <= if_modified_since
+        )
+
+    def _conditional_response(self, request, etag, last_modified, get_response):
+        '''Return 304 or the full response, with validators set.'''
+        if self._not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = get_response()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        # Per-user data: browsers/proxies may keep it but must revalidate
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = self.get_list_validators(request)
+        return self._conditional_response(
+            request, etag, last_modified,
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified = self.get_object_validators(request, instance)
+        return self._conditional_response(
+            request, etag, last_modified,
+            lambda: Response(self.get_serializer(instance).data),
+        )
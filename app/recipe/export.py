@@ -0,0 +1,29 @@
+'''
+Streaming NDJSON export of a user's recipes
+'''
+
+from rest_framework.renderers import JSONRenderer
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+
+def _line(renderer, data):
+    return renderer.render(data) + b'\n'
+
+
+def export_lines(recipes, get_serializer):
+    '''Yield one NDJSON line per recipe of an iterator.'''
+    renderer = JSONRenderer()
+    for recipe in recipes:
+        yield _line(renderer, get_serializer(recipe).data)
+
+
+async def aexport_lines(recipes, get_serializer):
+    '''Async export_lines(), for async iterators such as QuerySet.aiterator().'''
+    renderer = JSONRenderer()
+    async for recipe in recipes:
+        yield _line(renderer, get_serializer(recipe).data)
+
+
+def content_disposition(user):
+    return f'attachment; filename="recipes-{user.pk}.ndjson"'
@@ -0,0 +1,186 @@
+'''
+Fast path for rendering read-only recipe, tag and ingredient lists
+
+DRF calls every field's get_attribute() and to_representation() for every
+object. For list responses, FastSerializer instead compiles the fields of
+the serializer a view would use into a plan once per request, then builds
+the output dicts straight from values() rows, with one values() query per
+nested relation. The output is the same as the serializer's; serializers
+with fields the plan can't reproduce fall back to DRF.
+'''
+
+from django.conf import settings
+
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from core.middleware import timing
+
+# Fields whose to_representation() returns database values unchanged
+PASSTHROUGH_FIELDS = (
+    serializers.IntegerField,
+    serializers.CharField,
+    serializers.BooleanField,
+)
+
+
+class UnsupportedField(Exception):
+    '''Raised when a serializer field has no fast equivalent.'''
+
+
+class _Row(dict):
+    '''values() row that SerializerMethodFields can read as an object.'''
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def _decimal(field):
+    plain = (
+        field.decimal_places is not None
+        and getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        and not field.localize
+        and not getattr(field, 'normalize_output', False)  # DRF 3.15+
+    )
+
+    def convert(value):
+        # Database values already have the field's decimal places
+        if plain and value is not None and value.as_tuple().exponent == -field.decimal_places:
+            return f'{value:f}'
+        return field.to_representation(value)
+    return convert
+
+
+def _method(field):
+    method = getattr(field.parent, field.method_name)
+    return lambda row: method(_Row(row))
+
+
+class FastSerializer:
+    '''Compiled, read-only equivalent of a (narrowed) ModelSerializer.'''
+
+    def __init__(self, serializer):
+        self.model = serializer.Meta.model
+        self.field_columns = getattr(serializer, 'field_columns', {})
+        self.pk = self.model._meta.pk.name
+        self.columns = [self.pk]
+        self.plan = []        # (name, column, converter or None)
+        self.relations = []   # (name, related query, child columns)
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                self._add_relation(name, field, field.child)
+            elif isinstance(field, ManyRelatedField):
+                if not isinstance(field.child_relation, PrimaryKeyRelatedField):
+                    raise UnsupportedField(name)
+                self._add_relation(name, field, None)
+            elif field.source != name and not isinstance(field, serializers.SerializerMethodField):
+                raise UnsupportedField(name)
+            elif isinstance(field, serializers.DecimalField):
+                self._add_column(name, _decimal(field))
+            elif isinstance(field, getattr(serializers, 'BigIntegerField', ())):  # DRF 3.16+
+                coerce = getattr(field, 'coerce_to_string', api_settings.COERCE_BIGINT_TO_STRING)
+                self._add_column(name, field.to_representation if coerce else None)
+            elif isinstance(field, serializers.SerializerMethodField):
+                self.columns.extend(self.field_columns.get(name, ()))
+                self.plan.append((name, None, _method(field)))
+            elif type(field) in PASSTHROUGH_FIELDS:
+                self._add_column(name, None)
+            else:
+                raise UnsupportedField(name)
+
+        self.columns = list(dict.fromkeys(self.columns))
+
+    def _add_column(self, name, converter):
+        self.columns.append(name)
+        self.plan.append((name, name, converter))
+
+    def _add_relation(self, name, field, child):
+        if field.source != name:
+            raise UnsupportedField(name)
+        model_field = self.model._meta.get_field(name)
+        child_columns = ['id']
+        if child is not None:
+            child_plan = FastSerializer(child)
+            if child_plan.relations or any(convert for _, _, convert in child_plan.plan):
+                raise UnsupportedField(name)
+            child_columns = [column for _, column, _ in child_plan.plan]
+        self.relations.append((name, model_field, child_columns))
+        self.plan.append((name, None, None))
+
+    def prepare(self, queryset):
+        '''Return queryset as values() rows with the columns the plan reads.'''
+        return queryset.prefetch_related(None).values(*self.columns)
+
+    def _fetch_related(self, model_field, child_columns, pks):
+        # Nested items are ordered by id, like the prefetches of
+        # RecipeViewSet; the database's own order differs between backends
+        related = model_field.related_model
+        lookup = model_field.related_query_name()
+        grouped = {pk: [] for pk in pks}
+        rows = related.objects.filter(**{f'{lookup}__in': pks}).values_list(
+            lookup, *child_columns,
+        ).order_by('id')
+        if child_columns == ['id']:
+            for pk, related_id in rows:
+                grouped[pk].append(related_id)
+        else:
+            for pk, *values in rows:
+                grouped[pk].append(dict(zip(child_columns, values)))
+        return grouped
+
+    def to_representation(self, rows):
+        '''Return the serializer output for an iterable of values() rows.'''
+        rows = list(rows)
+        related = {}
+        if self.relations and rows:
+            pks = [row[self.pk] for row in rows]
+            for name, model_field, child_columns in self.relations:
+                related[name] = self._fetch_related(model_field, child_columns, pks)
+
+        plan, pk = self.plan, self.pk
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, convert in plan:
+                if column is None:
+                    item[name] = convert(row) if convert else related[name][row[pk]]
+                else:
+                    value = row[column]
+                    item[name] = convert(value) if convert else value
+            data.append(item)
+        return data
+
+
+class FastListMixin:
+    '''Render list responses through FastSerializer when possible.'''
+
+    def get_fast_serializer(self):
+        '''Return a FastSerializer for the list serializer, or None.'''
+        if not settings.RECIPE_FAST_SERIALIZERS:
+            return None
+        try:
+            return FastSerializer(self.get_serializer())
+        except UnsupportedField:
+            return None
+
+    def list(self, request, *args, **kwargs):
+        fast = self.get_fast_serializer()
+        if fast is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = fast.prepare(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        with timing('serialize'):  # includes fetching the rows
+            data = fast.to_representation(queryset if page is None else page)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
@@ -0,0 +1,202 @@
+'''
+Resized variants of uploaded recipe images
+
+Uploads only store the original; the variants in
+settings.RECIPE_IMAGE_VARIANTS are generated by a small thread pool once the
+upload has committed, so upload latency doesn't depend on the image size.
+Pillow releases the GIL while decoding, resizing and encoding.
+'''
+
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from core.models import Recipe
+from core.storage import is_content_addressed
+from recipe.cache import bump_user_version
+
+logger = logging.getLogger(__name__)
+
+# Pillow format name and file extension for each configured format
+FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+    'png': ('PNG', 'png'),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _settings():
+    return settings.RECIPE_IMAGE_VARIANTS
+
+
+def get_executor():
+    '''Return the shared pool that generates variants.'''
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_settings()['WORKERS'],
+                thread_name_prefix='recipe-images',
+            )
+        return _executor
+
+
+def variant_name(image_name, size, fmt):
+    '''Return the storage name of a variant of image_name.'''
+    directory, filename = os.path.split(image_name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'variants', f'{stem}-{size}.{FORMATS[fmt][1]}')
+
+
+def _encode(img, fmt):
+    pil_format = FORMATS[fmt][0]
+    if pil_format == 'JPEG' and img.mode != 'RGB':
+        img = img.convert('RGB')
+    buffer = io.BytesIO()
+    img.save(buffer, pil_format, quality=_settings()['QUALITY'], optimize=True)
+    return buffer.getvalue()
+
+
+def render_variants(image_file):
+    '''Return {size: {format: bytes}} for an open image file.'''
+    sizes = sorted(_settings()['SIZES'], reverse=True)
+    with Image.open(image_file) as img:
+        # Let the JPEG decoder scale down by up to 8x while decoding
+        img.draft('RGB', (sizes[0], sizes[0]))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+
+        rendered = {}
+        # Each size is resized from the previous (larger) one, not the original
+        for size in sizes:
+            img = img.copy()
+            img.thumbnail((size, size), Image.LANCZOS)
+            rendered[str(size)] = {
+                fmt: _encode(img, fmt) for fmt in _settings()['FORMATS']
+            }
+    return rendered
+
+
+def delete_variants(variants):
+    '''Delete the files of an image_variants mapping.'''
+    for names in variants.values():
+        for name in names.values():
+            default_storage.delete(name)
+
+
+def all_variant_names(image_name):
+    '''Return {size: {format: name}} for every configured variant.'''
+    return {
+        str(size): {fmt: variant_name(image_name, size, fmt) for fmt in _settings()['FORMATS']}
+        for size in _settings()['SIZES']
+    }
+
+
+def existing_variants(image_name):
+    '''Return the variants of a content-addressed image if all are stored.
+
+    Identical images share their variants, so they are only rendered once.
+    '''
+    if not is_content_addressed(image_name):
+        return None
+    variants = all_variant_names(image_name)
+    for names in variants.values():
+        if not all(default_storage.exists(name) for name in names.values()):
+            return None
+    return variants
+
+
+def store_variants(image_name):
+    '''Render and save the variants of an image; return their names.'''
+    with default_storage.open(image_name) as image_file:
+        rendered = render_variants(image_file)
+
+    variants = {}
+    for size, encoded in rendered.items():
+        variants[size] = {}
+        for fmt, data in encoded.items():
+            variants[size][fmt] = default_storage.save(
+                variant_name(image_name, size, fmt), ContentFile(data)
+            )
+    return variants
+
+
+def generate_variants(recipe_id, image_name):
+    '''Render, store and record the variants of a recipe's image.
+
+    Does nothing if the recipe was deleted or got another image meanwhile.
+    '''
+    current = Recipe.objects.filter(pk=recipe_id, image=image_name)
+    try:
+        if not current.exists():
+            return None
+        variants = existing_variants(image_name)
+        if variants is None:
+            variants = store_variants(image_name)
+
+        # update() doesn't send post_save, so touch the recipe and drop the
+        # cached lists here.
+        updated = current.update(
+            image_variants=variants, updated_at=timezone.now(),
+        )
+        if not updated:  # replaced while rendering
+            if not is_content_addressed(image_name):
+                delete_variants(variants)
+            return None
+
+        user_id = Recipe.objects.values_list('user_id', flat=True).get(pk=recipe_id)
+        bump_user_version(user_id)
+        return variants
+    except Exception:
+        logger.exception('Generating variants of %s failed', image_name)
+        return None
+
+
+def _generate_in_worker(recipe_id, image_name):
+    try:
+        generate_variants(recipe_id, image_name)
+    finally:
+        # Worker threads outlive requests; don't leave their connections open
+        connections.close_all()
+
+
+def schedule_variants(recipe):
+    '''Generate the variants of recipe.image once the transaction commits.'''
+    recipe_id, image_name = recipe.pk, recipe.image.name
+
+    def submit():
+        if _settings()['SYNC']:
+            generate_variants(recipe_id, image_name)
+        else:
+            get_executor().submit(_generate_in_worker, recipe_id, image_name)
+
+    transaction.on_commit(submit)
+
+
+def variant_urls(recipe, request=None):
+    '''Return {size: {format: url}} for a recipe's generated variants.'''
+    urls = {}
+    for size, names in (recipe.image_variants or {}).items():
+        urls[size] = {}
+        for fmt, name in names.items():
+            url = default_storage.url(name)
+            urls[size][fmt] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+def thumbnail_urls(recipe, request=None):
+    '''Return {format: url} of a recipe's list-sized variant, or None.'''
+    return variant_urls(recipe, request).get(str(_settings()['LIST_SIZE']))
@@ -0,0 +1,43 @@
+'''
+Pagination for the recipe APIs
+'''
+
+from django.conf import settings
+
+from rest_framework.pagination import CursorPagination
+
+
+class RecipeCursorPagination(CursorPagination):
+    '''Opt-in keyset pagination for recipes.
+
+    The cursor encodes the last recipe id that was returned, so every page
+    is a `WHERE id < cursor ORDER BY id DESC LIMIT n` query and deep pages
+    cost the same as the first one. Clients that send neither `cursor` nor
+    `page_size` still get the full, unpaginated list.
+    '''
+    ordering = '-id'  # matches RecipeViewSet.get_queryset()
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def __init__(self):
+        self.page_size = settings.RECIPE_PAGE_SIZE
+        self.max_page_size = settings.RECIPE_MAX_PAGE_SIZE
+
+    def is_requested(self, request):
+        '''Return True when the client opted in to pagination.'''
+        return (
+            self.cursor_query_param in request.query_params or
+            self.page_size_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response_schema(self, schema):
+        '''Document both the plain list and the paginated envelope.'''
+        return {
+            'oneOf': [schema, super().get_paginated_response_schema(schema)],
+        }
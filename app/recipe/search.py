@@ -0,0 +1,86 @@
+'''
+Full-text search over recipe titles and descriptions
+
+On Postgres, core_recipe.search_vector is kept current by a trigger (see
+core/migrations/0013_recipe_search_vector.py) and searched through a GIN
+index. On SQLite, used for tests, an FTS5 table mirrors the two columns.
+Title matches rank above description matches on both.
+'''
+
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+
+# Must match the configuration used by the Postgres trigger
+SEARCH_CONFIG = 'english'
+
+# Keeps core_recipe_fts in sync with core_recipe. Created after every
+# migrate rather than in the migration, because SQLite migrations that
+# rebuild core_recipe drop its triggers.
+SQLITE_TRIGGERS = (
+    '''
+    CREATE TRIGGER IF NOT EXISTS core_recipe_fts_insert AFTER INSERT ON core_recipe BEGIN
+        INSERT INTO core_recipe_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS core_recipe_fts_delete AFTER DELETE ON core_recipe BEGIN
+        INSERT INTO core_recipe_fts (core_recipe_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS core_recipe_fts_update
+    AFTER UPDATE OF title, description ON core_recipe BEGIN
+        INSERT INTO core_recipe_fts (core_recipe_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO core_recipe_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    ''',
+)
+
+
+def install_sqlite_triggers(using='default', **kwargs):
+    '''post_migrate handler that (re)creates the SQLite FTS triggers.'''
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for sql in SQLITE_TRIGGERS:
+            cursor.execute(sql)
+
+
+def _fts5_query(terms):
+    # Quote every word so user input can't use FTS5 query syntax; the
+    # words are ANDed like Postgres websearch queries.
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', terms))
+
+
+def search_recipes(queryset, terms):
+    '''Filter queryset to recipes matching terms, best matches first.'''
+    if connections[queryset.db].vendor == 'postgresql':
+        query = SearchQuery(terms, config=SEARCH_CONFIG, search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query),
+        ).order_by('-rank', '-id')
+
+    match = _fts5_query(terms)
+    if not match:
+        return queryset.none()
+    return queryset.filter(
+        id__in=RawSQL(
+            'SELECT rowid FROM core_recipe_fts WHERE core_recipe_fts MATCH %s', (match,),
+        ),
+    ).annotate(
+        # bm25() is lower for better matches; weigh titles 4x
+        rank=RawSQL(
+            'SELECT -bm25(core_recipe_fts, 4.0, 1.0) FROM core_recipe_fts '
+            'WHERE core_recipe_fts MATCH %s AND rowid = core_recipe.id',
+            (match,),
+        ),
+    ).order_by('-rank', '-id')
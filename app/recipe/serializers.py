@@ -2,12 +2,19 @@
 Serializers for recipe APIs
 '''
 
+from django.conf import settings
+from django.db import transaction
+
 from rest_framework import serializers
 from core.models import (
     Recipe,
     Tag,
-    Ingredient
+    Ingredient,
+    StoredFile,
 )
+from core.storage import content_addressed_name, is_content_addressed
+from recipe import images
+from recipe.uploads import check_dimensions
 
 class IngredientSerializer(serializers.ModelSerializer):
     '''Serializer for ingredients.'''
@@ -25,47 +32,119 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['id'] 
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class IngredientCountSerializer(IngredientSerializer):
+    '''Serializer for ingredients with the number of recipes using them.'''
+    recipe_count = serializers.IntegerField(read_only=True)
+
+    class Meta(IngredientSerializer.Meta):
+        fields = IngredientSerializer.Meta.fields + ['recipe_count']
+
+
+class TagCountSerializer(TagSerializer):
+    '''Serializer for tags with the number of recipes using them.'''
+    recipe_count = serializers.IntegerField(read_only=True)
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ['recipe_count']
+
+
+class DynamicFieldsMixin:
+    '''Let callers narrow a serializer with `fields` and `expand` kwargs.
+
+    `fields` lists the fields to keep (None keeps all). Relations in
+    `expandable_fields` that aren't listed in `expand` are rendered as
+    lists of IDs (None expands all).
+    '''
+    expandable_fields = ()
+    # Model columns a field reads, where not just the field's own
+    field_columns = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        if expand is not None:
+            for name in self.expandable_fields:
+                if name in self.fields and name not in expand:
+                    self.fields[name] = serializers.PrimaryKeyRelatedField(
+                        many=True, read_only=True,
+                    )
+
+
+class RecipeSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for recipes."""
+    expandable_fields = ('tags', 'ingredients')
+    field_columns = {
+        'tags': (),
+        'ingredients': (),
+        'thumbnail': ('image_variants',),
+    }
     tags = TagSerializer(many=True, required=False) #nested serializer / READ-ONLY
     ingredients = IngredientSerializer(many=True, required=False)
+    thumbnail = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = [
             'id', 'title', 'time_minutes', 'price', 'link', 'tags',
-            'ingredients',
+            'ingredients', 'thumbnail',
         ]
         read_only_fields = ['id'] # read only id field
+
+    def get_thumbnail(self, obj) -> dict | None:
+        '''Return the list-sized variant URLs, once they are generated.'''
+        return images.thumbnail_urls(obj, self.context.get('request'))
         
-    def _get_or_create_tags(self, tags, recipe):
-        """Handle getting or creating tags as needed."""
+    def _get_or_create(self, model, items):
+        """Return `model` objects for the given names, creating missing ones.
+
+        Uses a fixed number of queries however many names are given: one
+        lookup, and for new names one bulk insert plus one lookup for their
+        ids. Rows inserted concurrently by another request are skipped by
+        the (user, name) unique constraint and picked up by the lookup.
+        """
         auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create( 
-                user=auth_user, #prevent duplicates
-                **tag, 
+        names = list(dict.fromkeys(item['name'] for item in items))
+        if not names:
+            return []
+
+        objs = {
+            obj.name: obj
+            for obj in model.objects.filter(user=auth_user, name__in=names)
+        }
+        missing = [name for name in names if name not in objs]
+        if missing:
+            # bulk_create sends no post_save; adding the links below does
+            # send m2m_changed, which invalidates the cached lists.
+            model.objects.bulk_create(
+                [model(user=auth_user, name=name) for name in missing],
+                ignore_conflicts=True,
             )
-            recipe.tags.add(tag_obj)
-                   
+            objs.update(
+                (obj.name, obj)
+                for obj in model.objects.filter(user=auth_user, name__in=missing)
+            )
+
+        return [objs[name] for name in names]
+
+    def _get_or_create_tags(self, tags, recipe):
+        """Handle getting or creating tags as needed."""
+        recipe.tags.add(*self._get_or_create(Tag, tags))
+
     def _get_or_create_ingredients(self, ingredients, recipe):
         '''Handle getting or creating ingredients as needed.'''
-        auth_user= self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, create =Ingredient.objects.get_or_create( # create is a boolean
-                user=auth_user,
-                **ingredient,
-            )
-            recipe.ingredients.add(ingredient_obj)
-          
+        recipe.ingredients.add(*self._get_or_create(Ingredient, ingredients))
+
     def create(self,validated_data): # rewrite the create method so as to add the tags 
         '''Create a recipe.'''       # key correctly   
         tags = validated_data.pop('tags', []) 
         ingredients = validated_data.pop('ingredients', [])
-                                             
-        recipe = Recipe.objects.create(**validated_data)
-        self._get_or_create_tags(tags, recipe)
-        self._get_or_create_ingredients(ingredients, recipe)
+
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            self._get_or_create_tags(tags, recipe)
+            self._get_or_create_ingredients(ingredients, recipe)
         
         return recipe
     
@@ -73,34 +152,79 @@ class RecipeSerializer(serializers.ModelSerializer):
         """Update recipe."""
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
-        if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
-        if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
+        with transaction.atomic():
+            # set() only deletes the links that were dropped and inserts the
+            # new ones; unchanged links are not written and send no signals.
+            if tags is not None:
+                instance.tags.set(self._get_or_create(Tag, tags))
+            if ingredients is not None:
+                instance.ingredients.set(self._get_or_create(Ingredient, ingredients))
 
-        instance.save()
+            changed_fields = [
+                attr for attr, value in validated_data.items()
+                if getattr(instance, attr) != value
+            ]
+            for attr in changed_fields:
+                setattr(instance, attr, validated_data[attr])
+
+            if changed_fields:
+                instance.save(update_fields=changed_fields + ['updated_at'])
         return instance
        
         
 class RecipeDetailSerializer(RecipeSerializer):
     '''Serializer for recipe detail view.'''
+    image = serializers.ImageField(read_only=True)
+    image_variants = serializers.SerializerMethodField()
     
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description', ] 
+        fields = RecipeSerializer.Meta.fields + ['description', 'image', 'image_variants'] 
         # Only add the detail view of the recipe
+
+    def get_image_variants(self, obj) -> dict:
+        '''Return {size: {format: url}} for the resized copies of the image.'''
+        return images.variant_urls(obj, self.context.get('request'))
         
         
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to recipes. 
         Create unique api to handle image upload."""
 
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ['id','image' ]
+        fields = ['id','image', 'image_variants' ]
         read_only_fields = ['id']
         extra_kwards = {'image': {'required': 'True'}} # make image required
+
+    def get_image_variants(self, obj) -> dict:
+        '''Return the variant URLs; empty until the background job is done.'''
+        return images.variant_urls(obj, self.context.get('request'))
+
+    def validate_image(self, value):
+        '''Check the dimensions of images whose header wasn't seen early.'''
+        image = getattr(value, 'image', None)  # set by ImageField validation
+        if image is not None:
+            check_dimensions(*image.size)
+        return value
+
+    def update(self, instance, validated_data):
+        '''Store the original and queue its resized variants.'''
+        old_image, old_variants = instance.image.name, instance.image_variants
+        validated_data['image_variants'] = {}
+        image = validated_data.get('image')
+
+        with transaction.atomic():
+            if image and settings.RECIPE_IMAGE_CONTENT_ADDRESSED:
+                StoredFile.objects.acquire(content_addressed_name(image, image.name))
+            instance = super().update(instance, validated_data)
+            if is_content_addressed(old_image):
+                # May be shared; gc_media deletes it and its variants
+                StoredFile.objects.release(old_image)
+
+        if not is_content_addressed(old_image):
+            transaction.on_commit(lambda: images.delete_variants(old_variants))
+        images.schedule_variants(instance)
+        return instance
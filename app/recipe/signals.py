@@ -0,0 +1,53 @@
+'''
+Signal handlers that invalidate the recipe API cache
+'''
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.cache import bump_user_version
+
+
+def invalidate_user(user_id):
+    '''Bump the user's cache version now and again once the write commits.
+
+    The second bump drops anything a concurrent request cached from data
+    read between the first bump and the commit.
+    '''
+    bump_user_version(user_id)
+    transaction.on_commit(lambda: bump_user_version(user_id))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_on_change(sender, instance, **kwargs):
+    '''Invalidate the owner's cache when a recipe, tag or ingredient changes.'''
+    invalidate_user(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_on_link_change(sender, instance, action, pk_set, **kwargs):
+    '''Invalidate the owner's cache when recipe tags/ingredients change.'''
+    if not action.startswith('post_'):
+        return
+    if action != 'post_clear' and not pk_set:  # nothing was added or removed
+        return
+    # instance is the recipe, or the tag/ingredient for reverse changes;
+    # both belong to the same user.
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_on_user_change(sender, instance, created=True, **kwargs):
+    '''Start new and deleted users from a fresh cache version.'''
+    if created:
+        invalidate_user(instance.pk)
@@ -0,0 +1,134 @@
+'''
+Tests for the async recipe API views.
+'''
+
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient, TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from user.authentication import token_cache
+
+ASYNC_RECIPES_URL = reverse('recipe-async:recipe-list')
+ASYNC_TAGS_URL = reverse('recipe-async:tag-list')
+ASYNC_INGREDIENTS_URL = reverse('recipe-async:ingredient-list')
+
+
+def async_detail_url(recipe_id):
+    '''Create and return an async recipe detail URL.'''
+    return reverse('recipe-async:recipe-detail', args=[recipe_id])
+
+
+class AsyncRecipeViewTests(TestCase):
+    '''Test the async read endpoints match the DRF endpoints.'''
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        token = Token.objects.create(user=self.user)
+        self.headers = {'Authorization': f'Token {token.key}'}
+        self.async_client = AsyncClient()
+        self.sync_client = APIClient()
+        self.sync_client.force_authenticate(self.user)
+
+        self.tag = tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Tofu')
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=10, price=Decimal('4.50'),
+            )
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+        self.recipe = recipe
+
+    async def _get(self, url, data=None):
+        '''GET an async endpoint with the user's token.'''
+        return await self.async_client.get(url, data, headers=self.headers)
+
+    async def _get_sync(self, url, data=None):
+        '''GET the equivalent DRF endpoint.'''
+        return await sync_to_async(self.sync_client.get)(url, data)
+
+    async def test_auth_required(self):
+        '''Test requests without a token are rejected.'''
+        res = await AsyncClient().get(ASYNC_RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res['WWW-Authenticate'], 'Token')
+
+    async def test_invalid_token_rejected(self):
+        '''Test an unknown token is rejected.'''
+        res = await AsyncClient().get(
+            ASYNC_RECIPES_URL, headers={'Authorization': 'Token invalid'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_recipe_list_matches_sync(self):
+        '''Test the async recipe list returns the same JSON.'''
+        other = await Tag.objects.acreate(user=self.user, name='Quick')
+        await self.recipe.tags.aadd(other)
+        params = {'tags': f'{self.tag.id},{other.id}'}
+
+        res = await self._get(ASYNC_RECIPES_URL, params)
+
+        expected = await self._get_sync(reverse('recipe:recipe-list'), params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.json()), 3)
+        self.assertJSONEqual(res.content, expected.content.decode())
+
+    async def test_recipe_list_paginated(self):
+        '''Test the async list supports cursor pagination.'''
+        res = await self._get(ASYNC_RECIPES_URL, {'page_size': 2})
+
+        data = res.json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNotNone(data['next'])
+
+    async def test_recipe_detail_matches_sync(self):
+        '''Test the async recipe detail returns the same JSON.'''
+        res = await self._get(async_detail_url(self.recipe.id))
+
+        expected = await self._get_sync(reverse('recipe:recipe-detail', args=[self.recipe.id]))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertJSONEqual(res.content, expected.content.decode())
+
+    async def test_other_users_recipe_not_found(self):
+        '''Test recipes of other users are not returned.'''
+        other = await get_user_model().objects.acreate(email='other@example.com', name='Other')
+        recipe = await Recipe.objects.acreate(
+            user=other, title='Secret', time_minutes=1, price=Decimal('1.00'),
+        )
+
+        res = await self._get(async_detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_tag_and_ingredient_lists_match_sync(self):
+        '''Test the async tag and ingredient lists return the same JSON.'''
+        for async_url, sync_url in (
+            (ASYNC_TAGS_URL, reverse('recipe:tag-list')),
+            (ASYNC_INGREDIENTS_URL, reverse('recipe:ingredient-list')),
+        ):
+            res = await self._get(async_url, {'assigned_only': 1})
+            expected = await self._get_sync(sync_url, {'assigned_only': 1})
+            self.assertJSONEqual(res.content, expected.content.decode())
+
+    async def test_only_get_allowed(self):
+        '''Test the async endpoints are read-only.'''
+        res = await self.async_client.post(ASYNC_RECIPES_URL, {}, headers=self.headers)
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
@@ -0,0 +1,180 @@
+'''
+Tests for the recipe API response cache.
+'''
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from recipe.cache import get_cache
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    '''Create and return a user.'''
+    return get_user_model().objects.create_user(email=email, name='Test User', password=password)
+
+
+def create_recipe(user, **params):
+    '''Create and return a sample recipe.'''
+    defaults = {
+        'title': 'Sample Title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ListCacheTests(TestCase):
+    '''Test caching of the list endpoints.'''
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_list_served_from_cache(self):
+        '''Test a repeated list request runs no queries.'''
+        create_recipe(user=self.user)
+        res1 = self.client.get(RECIPES_URL)
+
+        with self.assertNumQueries(0):
+            res2 = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res2.status_code, status.HTTP_200_OK)
+        self.assertEqual(res1.data, res2.data)
+
+    def test_equivalent_params_share_entry(self):
+        '''Test reordered filter IDs use the same cache entry.'''
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Quick')
+        self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        with self.assertNumQueries(0):
+            self.client.get(RECIPES_URL, {'tags': f'{tag2.id},{tag1.id}'})
+
+    def test_different_params_not_shared(self):
+        '''Test different filters are cached separately.'''
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag)
+        create_recipe(user=self.user, title='Other')
+
+        res_all = self.client.get(RECIPES_URL)
+        res_filtered = self.client.get(RECIPES_URL, {'tags': str(tag.id)})
+
+        self.assertEqual(len(res_all.data), 2)
+        self.assertEqual(len(res_filtered.data), 1)
+
+    @override_settings(ALLOWED_HOSTS=['internal.example.com', 'api.example.com'])
+    def test_cache_per_host(self):
+        '''Test lists are cached per host, as their links are absolute.'''
+        create_recipe(user=self.user)
+        create_recipe(user=self.user, title='Other')
+        self.client.get(RECIPES_URL, {'page_size': 1}, HTTP_HOST='internal.example.com')
+
+        res = self.client.get(RECIPES_URL, {'page_size': 1}, HTTP_HOST='api.example.com')
+
+        self.assertTrue(res.data['next'].startswith('http://api.example.com/'))
+
+    def test_cache_per_user(self):
+        '''Test users never see each other's cached lists.'''
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        other = create_user(email='other@example.com')
+        self.client.force_authenticate(other)
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data, [])
+
+    def test_invalidated_on_recipe_create_and_delete(self):
+        '''Test creating and deleting recipes invalidates the list.'''
+        self.client.get(RECIPES_URL)
+
+        recipe = create_recipe(user=self.user)
+        self.assertEqual(len(self.client.get(RECIPES_URL).data), 1)
+
+        recipe.delete()
+        self.assertEqual(len(self.client.get(RECIPES_URL).data), 0)
+
+    def test_invalidated_on_tag_link_change(self):
+        '''Test adding and removing a tag invalidates the recipe list.'''
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(RECIPES_URL)
+
+        recipe.tags.add(tag)
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data[0]['tags'], [{'id': tag.id, 'name': 'Vegan'}])
+
+        tag.recipe_set.remove(recipe)
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data[0]['tags'], [])
+
+    def test_invalidated_on_ingredient_rename(self):
+        '''Test renaming an ingredient invalidates recipe and ingredient lists.'''
+        recipe = create_recipe(user=self.user)
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        recipe.ingredients.add(ingredient)
+        self.client.get(RECIPES_URL)
+        self.client.get(INGREDIENTS_URL)
+
+        ingredient.name = 'Sea salt'
+        ingredient.save()
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data[0]['ingredients'][0]['name'], 'Sea salt')
+        res = self.client.get(INGREDIENTS_URL)
+        self.assertEqual(res.data[0]['name'], 'Sea salt')
+
+    def test_assigned_only_cached_separately(self):
+        '''Test assigned_only responses are cached under their own key.'''
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Unused')
+        create_recipe(user=self.user).tags.add(tag)
+
+        self.assertEqual(len(self.client.get(TAGS_URL).data), 2)
+        self.assertEqual(len(self.client.get(TAGS_URL, {'assigned_only': 1}).data), 1)
+
+    def test_invalidated_on_api_update(self):
+        '''Test writes through the API invalidate the cached list.'''
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(TAGS_URL)
+
+        self.client.patch(reverse('recipe:tag-detail', args=[tag.id]), {'name': 'Vegetarian'})
+
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.data[0]['name'], 'Vegetarian')
+
+    def test_invalidated_on_admin_change(self):
+        '''Test changes made in the Django admin invalidate the list.'''
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(TAGS_URL)
+
+        admin = get_user_model().objects.create_superuser(
+            'admin@example.com', 'Admin User', 'testpass123'
+        )
+        admin_client = Client()
+        admin_client.force_login(admin)
+        url = reverse('admin:core_tag_change', args=[tag.id])
+        res = admin_client.post(url, {'name': 'Vegetarian', 'user': self.user.id})
+        self.assertEqual(res.status_code, status.HTTP_302_FOUND)
+
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.data[0]['name'], 'Vegetarian')
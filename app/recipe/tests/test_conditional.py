@@ -0,0 +1,181 @@
+'''
+Tests for conditional GET on the recipe API.
+'''
+
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+)
+from recipe.cache import get_cache
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    '''Create and return a recipe detail URL.'''
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    '''Create and return a sample recipe.'''
+    defaults = {
+        'title': 'Sample Title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ConditionalGetTests(TestCase):
+    '''Test ETag and Last-Modified handling.'''
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+
+    def test_list_sets_validators(self):
+        '''Test the list response carries an ETag but no Last-Modified.'''
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['ETag'].startswith('"'))
+        self.assertNotIn('Last-Modified', res)
+        self.assertIn('no-cache', res['Cache-Control'])
+
+    def test_list_not_modified(self):
+        '''Test a matching If-None-Match returns 304 without queries.'''
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(res.content, b'')
+
+    def test_list_etag_depends_on_params(self):
+        '''Test filtered lists have their own ETag.'''
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        res = self.client.get(RECIPES_URL, {'tags': '1'}, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_list_etag_changes_on_write(self):
+        '''Test adding a recipe changes the list ETag.'''
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        create_recipe(user=self.user, title='New')
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(len(res.data), 2)
+
+    def test_detail_not_modified_without_serializing(self):
+        '''Test a 304 detail response skips the serializer.'''
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        with patch('recipe.serializers.RecipeDetailSerializer.to_representation') as to_repr:
+            with self.assertNumQueries(1):
+                res = self.client.get(url, HTTP_IF_NONE_MATCH=f'"other", {etag}')
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        to_repr.assert_not_called()
+
+    def test_detail_etag_changes_on_tag_link(self):
+        '''Test linking a tag changes the recipe ETag.'''
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 1)
+
+    def test_if_modified_since(self):
+        '''Test If-Modified-Since is honoured when no ETag is sent.'''
+        url = detail_url(self.recipe.id)
+        last_modified = self.client.get(url)['Last-Modified']
+
+        res = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        res = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(0))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_list_if_modified_since_after_delete(self):
+        '''Test If-Modified-Since doesn't hide a deleted recipe from the list.'''
+        create_recipe(user=self.user, title='Other')
+        self.client.get(RECIPES_URL)
+
+        self.recipe.delete()
+        res = self.client.get(RECIPES_URL, HTTP_IF_MODIFIED_SINCE=http_date())
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+
+    def test_missing_recipe_not_found(self):
+        '''Test conditional headers don't hide a 404.'''
+        res = self.client.get(detail_url(self.recipe.id + 100), HTTP_IF_NONE_MATCH='*')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RecipeUpdatedAtTests(TestCase):
+    '''Test Recipe.updated_at follows tag and ingredient changes.'''
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.recipe = create_recipe(user=self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recipe.tags.add(self.tag)
+
+    def _updated_at(self):
+        return Recipe.objects.values_list('updated_at', flat=True).get(pk=self.recipe.pk)
+
+    def test_touched_on_reverse_remove(self):
+        '''Test removing the recipe from the tag side touches it.'''
+        before = self._updated_at()
+
+        self.tag.recipe_set.remove(self.recipe)
+
+        self.assertGreater(self._updated_at(), before)
+
+    def test_touched_on_tag_rename(self):
+        '''Test renaming a linked tag touches the recipe.'''
+        before = self._updated_at()
+
+        self.tag.name = 'Plant based'
+        self.tag.save()
+
+        self.assertGreater(self._updated_at(), before)
+
+    def test_touched_on_tag_delete(self):
+        '''Test deleting a linked tag touches the recipe.'''
+        before = self._updated_at()
+
+        self.tag.delete()
+
+        self.assertGreater(self._updated_at(), before)
@@ -0,0 +1,98 @@
+'''
+Tests for the NDJSON recipe export.
+'''
+
+import json
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+EXPORT_URL = reverse('recipe:recipe-export')
+ASYNC_EXPORT_URL = reverse('recipe-async:recipe-export')
+
+
+def read_lines(response):
+    '''Return the decoded NDJSON lines of a streaming response.'''
+    content = b''.join(response.streaming_content)
+    return [json.loads(line) for line in content.splitlines()]
+
+
+@override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+class RecipeExportTests(TestCase):
+    '''Test streaming a user's recipes.'''
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for i in range(5):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=i,
+                price=Decimal('1.00'), description=f'Step {i}',
+            )
+            recipe.tags.create(user=self.user, name=f'Tag {i}')
+            recipe.ingredients.create(user=self.user, name=f'Ingredient {i}')
+
+    def test_auth_required(self):
+        '''Test the export needs authentication.'''
+        res = APIClient().get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_export_streams_every_recipe(self):
+        '''Test one line per recipe, with its tags and ingredients.'''
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        self.assertIn('attachment', res['Content-Disposition'])
+        lines = read_lines(res)
+        self.assertEqual([line['title'] for line in lines], [f'Recipe {i}' for i in range(4, -1, -1)])
+        self.assertEqual(lines[0]['tags'][0]['name'], 'Tag 4')
+        self.assertEqual(lines[0]['ingredients'][0]['name'], 'Ingredient 4')
+        self.assertEqual(lines[0]['description'], 'Step 4')
+
+    def test_relations_prefetched_per_chunk(self):
+        '''Test tags and ingredients are loaded once per chunk, not per recipe.'''
+        res = self.client.get(EXPORT_URL)
+
+        # recipes, then tags + ingredients for each of the 3 chunks of 2
+        with self.assertNumQueries(7):
+            read_lines(res)
+
+    def test_other_users_excluded(self):
+        '''Test only the user's recipes are exported.'''
+        other = get_user_model().objects.create_user(
+            email='other@example.com', name='Other', password='testpass123'
+        )
+        Recipe.objects.create(user=other, title='Hidden', time_minutes=1, price=Decimal('1.00'))
+
+        titles = [line['title'] for line in read_lines(self.client.get(EXPORT_URL))]
+
+        self.assertNotIn('Hidden', titles)
+        self.assertEqual(len(titles), 5)
+
+    async def test_async_export(self):
+        '''Test the async export streams the same lines.'''
+        token = await Token.objects.acreate(user=self.user)
+        expected = await sync_to_async(lambda: read_lines(self.client.get(EXPORT_URL)))()
+
+        res = await AsyncClient().get(
+            ASYNC_EXPORT_URL, headers={'Authorization': f'Token {token.key}'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        content = b''.join([chunk async for chunk in res.streaming_content])
+        self.assertEqual([json.loads(line) for line in content.splitlines()], expected)
@@ -0,0 +1,184 @@
+'''
+Tests that the fast list serializers match the DRF serializers.
+'''
+
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import serializers as drf_serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core.models import Ingredient, Recipe, Tag
+from recipe import serializers
+from recipe.cache import get_cache
+from recipe.fast import FastSerializer, UnsupportedField
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+def render(data):
+    return JSONRenderer().render(data)
+
+
+class FastSerializerEquivalenceTests(TestCase):
+    '''Test FastSerializer output is byte-identical to the serializers.'''
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.request = APIRequestFactory().get('/')
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}') for i in range(3)]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Salt', 'Crème fraîche', '"Quoted"')
+        ]
+        for i, (price, link) in enumerate((
+            (Decimal('5.25'), ''),
+            (Decimal('0'), 'https://example.com/a?b=1&c=2'),
+            (Decimal('999.99'), 'ünïcode'),
+            (Decimal('10.5'), ''),
+        )):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Recipe {i} "x"', time_minutes=i,
+                price=price, link=link, description='Line\nbreak',
+            )
+            recipe.tags.add(*tags[:i])
+            recipe.ingredients.add(*ingredients[i % 3:])
+        Recipe.objects.filter(title__startswith='Recipe 1').update(image_variants={
+            '128': {'webp': 'uploads/recipe/variants/a-128.webp'},
+        })
+
+    def _assert_equivalent(self, serializer_class, queryset, **kwargs):
+        context = {'request': self.request}
+        expected = serializer_class(
+            queryset.prefetch_related(*serializer_class.expandable_fields
+                                      if hasattr(serializer_class, 'expandable_fields') else ()),
+            many=True, context=context, **kwargs,
+        ).data
+        fast = FastSerializer(serializer_class(context=context, **kwargs))
+        actual = fast.to_representation(fast.prepare(queryset))
+
+        self.assertEqual(render(actual), render(expected))
+
+    def test_recipe_list(self):
+        '''Test the default recipe list output.'''
+        self._assert_equivalent(serializers.RecipeSerializer, Recipe.objects.order_by('-id'))
+
+    def test_recipe_fieldsets(self):
+        '''Test narrowed and unexpanded recipe output.'''
+        queryset = Recipe.objects.order_by('-id')
+        for kwargs in (
+            {'fields': ['id', 'title']},
+            {'fields': ['price', 'thumbnail']},
+            {'expand': []},
+            {'expand': ['ingredients']},
+            {'fields': ['tags'], 'expand': ['tags']},
+        ):
+            with self.subTest(**kwargs):
+                self._assert_equivalent(serializers.RecipeSerializer, queryset, **kwargs)
+
+    def test_tags_and_ingredients(self):
+        '''Test the tag and ingredient list output.'''
+        self._assert_equivalent(serializers.TagSerializer, Tag.objects.order_by('-name'))
+        self._assert_equivalent(
+            serializers.IngredientSerializer, Ingredient.objects.order_by('-name')
+        )
+
+    def test_older_drf_fields(self):
+        '''Test fields without the attributes newer DRF releases add are handled.'''
+        serializer = serializers.RecipeSerializer(
+            context={'request': self.request}, fields=['id', 'title', 'price'],
+        )
+        del serializer.fields['price'].normalize_output  # before DRF 3.15
+        serializer.fields['id'] = drf_serializers.IntegerField(read_only=True)
+        with patch.dict(vars(drf_serializers)):
+            del vars(drf_serializers)['BigIntegerField']  # before DRF 3.16
+            fast = FastSerializer(serializer)
+
+        rows = fast.to_representation(fast.prepare(Recipe.objects.order_by('-id')))
+        self.assertEqual([row['price'] for row in rows], ['10.50', '999.99', '0.00', '5.25'])
+
+    def test_unsupported_field(self):
+        '''Test serializers with fields the plan can't reproduce are refused.'''
+        class CustomSerializer(serializers.RecipeSerializer):
+            title_upper = drf_serializers.CharField(source='title.upper')
+
+            class Meta(serializers.RecipeSerializer.Meta):
+                fields = ['id', 'title_upper']
+
+        with self.assertRaises(UnsupportedField):
+            FastSerializer(CustomSerializer())
+
+
+class FastListApiTests(TestCase):
+    '''Test list responses are the same with and without the fast path.'''
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Leek')
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Leek soup {i}', time_minutes=5,
+                price=Decimal('1.50'),
+            )
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+    def _get_both(self, url, params=None):
+        responses = []
+        for fast in (True, False):
+            get_cache().clear()
+            with override_settings(RECIPE_FAST_SERIALIZERS=fast):
+                res = self.client.get(url, params)
+            self.assertEqual(res.status_code, 200)
+            responses.append(res.content)
+        return responses
+
+    def test_same_responses(self):
+        '''Test plain, filtered, paginated and searched lists match.'''
+        for url, params in (
+            (RECIPES_URL, None),
+            (RECIPES_URL, {'page_size': 2}),
+            (RECIPES_URL, {'search': 'soup', 'fields': 'id,title'}),
+            (RECIPES_URL, {'expand': ''}),
+            (TAGS_URL, {'assigned_only': 1}),
+            (INGREDIENTS_URL, None),
+        ):
+            with self.subTest(url=url, params=params):
+                fast, slow = self._get_both(url, params)
+                self.assertEqual(fast, slow)
+
+    def test_same_nested_order(self):
+        '''Test nested items are in the same order however they were linked.'''
+        recipe = Recipe.objects.create(
+            user=self.user, title='Stew', time_minutes=5, price=Decimal('1.50'),
+        )
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}') for i in range(3)]
+        recipe.tags.add(*reversed(tags))
+
+        fast, slow = self._get_both(RECIPES_URL)
+
+        self.assertEqual(fast, slow)
+        stew = next(item for item in json.loads(fast) if item['id'] == recipe.id)
+        self.assertEqual([tag['id'] for tag in stew['tags']], [tag.id for tag in tags])
+
+    def test_fast_list_queries(self):
+        '''Test the fast path needs no more queries than the prefetching one.'''
+        get_cache().clear()
+        # ETag aggregate, recipes, tags, ingredients
+        with self.assertNumQueries(4):
+            self.client.get(RECIPES_URL)
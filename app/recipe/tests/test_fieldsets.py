@@ -0,0 +1,113 @@
+'''
+Tests for ?fields= and ?expand= on the recipe API.
+'''
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe.cache import get_cache
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    '''Create and return a recipe detail URL.'''
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class RecipeFieldsetTests(TestCase):
+    '''Test narrowing recipe responses.'''
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=10,
+            price=Decimal('2.50'), description='Hot',
+        )
+        self.tag = self.recipe.tags.create(user=self.user, name='Vegan')
+        self.ingredient = self.recipe.ingredients.create(user=self.user, name='Leek')
+
+    def _get(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res, [query['sql'] for query in queries]
+
+    def test_titles_only_is_one_narrow_query(self):
+        '''Test ?fields=id,title selects two columns and skips the relations.'''
+        res, queries = self._get(RECIPES_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.data, [{'id': self.recipe.id, 'title': 'Soup'}])
+        # The first query is the ETag aggregate
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('"price"', queries[1])
+        self.assertNotIn('"description"', queries[1])
+
+    def test_relations_as_ids(self):
+        '''Test an empty ?expand= returns tags and ingredients as IDs.'''
+        res, queries = self._get(RECIPES_URL, {'expand': ''})
+
+        self.assertEqual(res.data[0]['tags'], [self.tag.id])
+        self.assertEqual(res.data[0]['ingredients'], [self.ingredient.id])
+        tag_query = next(sql for sql in queries if 'FROM "core_tag"' in sql)
+        self.assertNotIn('"core_tag"."name"', tag_query)
+
+    def test_expand_one_relation(self):
+        '''Test only the relations named in ?expand= are nested.'''
+        res, queries = self._get(RECIPES_URL, {'fields': 'id,tags', 'expand': 'tags'})
+
+        self.assertEqual(res.data, [{
+            'id': self.recipe.id,
+            'tags': [{'id': self.tag.id, 'name': 'Vegan'}],
+        }])
+        self.assertFalse(any('core_ingredient' in sql for sql in queries))
+
+    def test_expand_param_in_cache_key(self):
+        '''Test lists with and without an empty ?expand= are cached apart.'''
+        self.client.get(RECIPES_URL)
+        res = self.client.get(RECIPES_URL, {'expand': ''})
+
+        self.assertEqual(res.data[0]['tags'], [self.tag.id])
+
+    def test_unknown_field(self):
+        '''Test unknown field names are rejected.'''
+        res = self.client.get(RECIPES_URL, {'fields': 'id,secret'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('secret', str(res.data['fields']))
+
+    def test_detail_fields(self):
+        '''Test the detail endpoint honours ?fields= and its ETag.'''
+        url = detail_url(self.recipe.id)
+        res, queries = self._get(url, {'fields': 'description'})
+
+        self.assertEqual(res.data, {'description': 'Hot'})
+        self.assertEqual(len(queries), 1)
+
+        res = self.client.get(url, {'fields': 'description'}, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_writes_ignore_fieldset(self):
+        '''Test ?fields= doesn't change what a create returns.'''
+        res = self.client.post(
+            f'{RECIPES_URL}?fields=id',
+            {'title': 'Stew', 'time_minutes': 5, 'price': '1.00'},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertIn('title', res.data)
@@ -0,0 +1,233 @@
+'''
+Tests for recipe image variants.
+'''
+
+import io
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, StoredFile
+from recipe import images
+from recipe.cache import get_cache, get_user_version
+
+VARIANTS = {
+    'SIZES': (64, 16),
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': 80,
+    'LIST_SIZE': 16,
+    'WORKERS': 1,
+    'SYNC': True,
+}
+
+
+def image_upload_url(recipe_id):
+    '''Create and return an image upload URL.'''
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def make_image(size=(200, 100), fmt='JPEG', mode='RGB'):
+    '''Return an in-memory upload of a blank image.'''
+    buffer = io.BytesIO()
+    Image.new(mode, size).save(buffer, format=fmt)
+    return SimpleUploadedFile(f'photo.{fmt.lower()}', buffer.getvalue())
+
+
+class RenderVariantsTests(TestCase):
+    '''Test resizing and encoding.'''
+
+    @override_settings(RECIPE_IMAGE_VARIANTS=VARIANTS)
+    def test_sizes_and_formats(self):
+        '''Test every size is rendered in every format, keeping the aspect.'''
+        rendered = images.render_variants(make_image((200, 100)))
+
+        self.assertEqual(set(rendered), {'64', '16'})
+        for size, encoded in rendered.items():
+            self.assertEqual(set(encoded), {'webp', 'jpeg'})
+            with Image.open(io.BytesIO(encoded['webp'])) as img:
+                self.assertEqual(img.format, 'WEBP')
+                self.assertEqual(img.size, (int(size), int(size) // 2))
+
+    @override_settings(RECIPE_IMAGE_VARIANTS=VARIANTS)
+    def test_small_image_not_upscaled(self):
+        '''Test images smaller than a variant keep their size.'''
+        rendered = images.render_variants(make_image((10, 10)))
+
+        with Image.open(io.BytesIO(rendered['64']['jpeg'])) as img:
+            self.assertEqual(img.size, (10, 10))
+
+    @override_settings(RECIPE_IMAGE_VARIANTS=VARIANTS)
+    def test_palette_png(self):
+        '''Test non-RGB sources are converted for JPEG output.'''
+        rendered = images.render_variants(make_image(fmt='PNG', mode='P'))
+
+        with Image.open(io.BytesIO(rendered['16']['jpeg'])) as img:
+            self.assertEqual(img.mode, 'RGB')
+
+
+@override_settings(RECIPE_IMAGE_VARIANTS=VARIANTS)
+class ImageVariantsApiTests(TestCase):
+    '''Test variants generated for uploaded images.'''
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+        get_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Sample', time_minutes=5, price=Decimal('1.50'),
+        )
+
+    def _upload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                image_upload_url(self.recipe.id),
+                {'image': make_image()},
+                format='multipart',
+            )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        return res
+
+    def test_upload_generates_variants(self):
+        '''Test variants are stored and recorded after the upload commits.'''
+        version = get_user_version(self.user.id)
+
+        self._upload()
+
+        self.assertEqual(set(self.recipe.image_variants), {'64', '16'})
+        for names in self.recipe.image_variants.values():
+            for name in names.values():
+                self.assertTrue(os.path.exists(os.path.join(self.media_root, name)))
+        self.assertNotEqual(get_user_version(self.user.id), version)
+
+    def test_variant_urls_exposed(self):
+        '''Test list and detail responses link the variants.'''
+        self._upload()
+
+        res = self.client.get(reverse('recipe:recipe-list'))
+        thumbnail = res.data[0]['thumbnail']
+        self.assertTrue(thumbnail['webp'].startswith('http://testserver/'))
+        self.assertTrue(thumbnail['webp'].endswith('-16.webp'))
+
+        res = self.client.get(reverse('recipe:recipe-detail', args=[self.recipe.id]))
+        self.assertEqual(set(res.data['image_variants']), {'64', '16'})
+        self.assertIn(self.recipe.image.name, res.data['image'])
+
+    def test_no_thumbnail_before_generation(self):
+        '''Test recipes without variants have no thumbnail.'''
+        res = self.client.get(reverse('recipe:recipe-list'))
+
+        self.assertIsNone(res.data[0]['thumbnail'])
+
+    def test_new_upload_replaces_variants(self):
+        '''Test uploading again deletes the previous variants.'''
+        self._upload()
+        old_names = [
+            name for names in self.recipe.image_variants.values()
+            for name in names.values()
+        ]
+
+        self._upload()
+
+        for name in old_names:
+            self.assertFalse(os.path.exists(os.path.join(self.media_root, name)))
+        self.assertEqual(set(self.recipe.image_variants), {'64', '16'})
+
+    def test_stale_job_discarded(self):
+        '''Test a job for an image that was replaced leaves nothing behind.'''
+        self._upload()
+        variants = self.recipe.image_variants
+
+        self.assertIsNone(images.generate_variants(self.recipe.id, 'uploads/recipe/old.jpg'))
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, variants)
+
+    @override_settings(RECIPE_IMAGE_VARIANTS={**VARIANTS, 'SYNC': False})
+    def test_upload_does_not_wait_for_variants(self):
+        '''Test the upload only queues the variants.'''
+        with patch('recipe.images.get_executor') as get_executor:
+            res = self._upload()
+
+        get_executor.return_value.submit.assert_called_once_with(
+            images._generate_in_worker, self.recipe.id, self.recipe.image.name,
+        )
+        self.assertEqual(res.data['image_variants'], {})
+
+
+@override_settings(RECIPE_IMAGE_VARIANTS=VARIANTS, RECIPE_IMAGE_CONTENT_ADDRESSED=True)
+class ContentAddressedImageTests(TestCase):
+    '''Test uploads stored by content hash.'''
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipes = [
+            Recipe.objects.create(
+                user=self.user, title=f'Sample {i}', time_minutes=5, price=Decimal('1.50'),
+            )
+            for i in range(2)
+        ]
+
+    def _upload(self, recipe, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                image_upload_url(recipe.id), {'image': upload}, format='multipart',
+            )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+
+    def test_identical_uploads_share_file(self):
+        '''Test the same image uploaded twice is stored and rendered once.'''
+        self._upload(self.recipes[0], make_image())
+        with patch('recipe.images.render_variants') as render:
+            self._upload(self.recipes[1], make_image())
+
+        render.assert_not_called()
+        first, second = self.recipes
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image_variants, second.image_variants)
+        self.assertEqual(StoredFile.objects.get(name=first.image.name).references, 2)
+        self.assertEqual(len(os.listdir(os.path.dirname(first.image.path))), 2)  # image + variants/
+
+    def test_replaced_and_deleted_images_released(self):
+        '''Test references are dropped on re-upload and recipe deletion.'''
+        self._upload(self.recipes[0], make_image())
+        name = self.recipes[0].image.name
+
+        self._upload(self.recipes[0], make_image((30, 30)))
+        self.assertEqual(StoredFile.objects.get(name=name).references, 0)
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, name)))
+
+        self.recipes[0].delete()
+        new_name = self.recipes[0].image.name
+        self.assertEqual(StoredFile.objects.get(name=new_name).references, 0)
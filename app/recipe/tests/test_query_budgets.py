@@ -0,0 +1,262 @@
+'''
+Query budgets of the recipe, tag and ingredient APIs.
+
+Each endpoint gets a fixed number of queries that must not grow with the
+number of rows a user has.
+'''
+
+import io
+import itertools
+import shutil
+import tempfile
+from decimal import Decimal
+
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.testing import QueryBudgetMixin, query_budget
+from recipe.cache import bump_user_version
+
+RECIPES_URL = reverse('recipe:recipe-list')
+EXPORT_URL = reverse('recipe:recipe-export')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+def detail_url(name, pk):
+    return reverse(f'recipe:{name}-detail', args=[pk])
+
+
+class BudgetTestCase(QueryBudgetMixin, TestCase):
+    '''Authenticated client and a helper adding recipes with tags and ingredients.'''
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.counter = itertools.count()
+
+    def add_recipes(self, count):
+        '''Add count recipes, each with two tags and two ingredients of its own.'''
+        numbers = [next(self.counter) for _ in range(count)]
+        recipes = Recipe.objects.bulk_create(
+            Recipe(user=self.user, title=f'Soup {n}', time_minutes=10, price=Decimal('5.00'))
+            for n in numbers
+        )
+        for model, through, field in (
+            (Tag, Recipe.tags.through, 'tag_id'),
+            (Ingredient, Recipe.ingredients.through, 'ingredient_id'),
+        ):
+            items = model.objects.bulk_create(
+                model(user=self.user, name=f'{model.__name__} {n}.{i}')
+                for n in numbers for i in range(2)
+            )
+            through.objects.bulk_create(
+                through(recipe_id=recipe.id, **{field: item.id})
+                for index, recipe in enumerate(recipes)
+                for item in items[index * 2:index * 2 + 2]
+            )
+        bump_user_version(self.user.id)  # bulk_create sends no signals
+        return recipes
+
+    def first_recipe(self):
+        return Recipe.objects.filter(user=self.user).order_by('id').first()
+
+
+class RecipeQueryBudgetTests(BudgetTestCase):
+    '''Test the query budgets of RecipeViewSet.'''
+
+    def _payload(self):
+        '''Return a recipe with new tags and ingredients.'''
+        n = next(self.counter)
+        return {
+            'title': f'Budget soup {n}', 'time_minutes': 20, 'price': '4.50',
+            'tags': [{'name': f'Vegan {n}'}, {'name': f'Quick {n}'}],
+            'ingredients': [{'name': f'Salt {n}'}],
+        }
+
+    @query_budget(4)
+    def test_list(self):
+        '''Test listing recipes.'''
+        responses = self.assertQueriesFlat(lambda: self.client.get(RECIPES_URL), self.add_recipes)
+        self.assertEqual(len(responses[-1].data), 100)
+
+    @query_budget(4)
+    def test_list_filtered(self):
+        '''Test listing recipes by tag and ingredient.'''
+        def request():
+            return self.client.get(RECIPES_URL, {
+                'tags': ','.join(map(str, Tag.objects.values_list('id', flat=True)[:3])),
+                'ingredients': ','.join(map(str, Ingredient.objects.values_list('id', flat=True)[:3])),
+            })
+        self.assertQueriesFlat(request, self.add_recipes)
+
+    @query_budget(4)
+    def test_list_paginated(self):
+        '''Test a page of the paginated recipe list.'''
+        responses = self.assertQueriesFlat(
+            lambda: self.client.get(RECIPES_URL, {'page_size': 10}), self.add_recipes,
+        )
+        self.assertEqual(len(responses[-1].data['results']), 10)
+
+    @query_budget(3)
+    def test_retrieve(self):
+        '''Test retrieving a recipe.'''
+        self.assertQueriesFlat(
+            lambda: self.client.get(detail_url('recipe', self.first_recipe().id)),
+            self.add_recipes,
+        )
+
+    @query_budget(17)
+    def test_create(self):
+        '''Test creating a recipe with tags and ingredients.'''
+        # Per tag and ingredient batch: get-or-create (3), link (2) and
+        # the updated_at touch of the m2m signal
+        responses = self.assertQueriesFlat(
+            lambda: self.client.post(RECIPES_URL, self._payload(), format='json'),
+            self.add_recipes,
+        )
+        self.assertEqual(responses[-1].status_code, status.HTTP_201_CREATED)
+
+    @query_budget(24)
+    def test_update(self):
+        '''Test replacing a recipe with its tags and ingredients.'''
+        # As create, plus unlinking (2) and a touch per batch removed
+        responses = self.assertQueriesFlat(
+            lambda: self.client.put(
+                detail_url('recipe', self.first_recipe().id), self._payload(), format='json',
+            ),
+            self.add_recipes,
+        )
+        self.assertEqual(responses[-1].status_code, status.HTTP_200_OK)
+
+    @query_budget(6)
+    def test_partial_update(self):
+        '''Test updating a field of a recipe.'''
+        counter = itertools.count()
+        responses = self.assertQueriesFlat(
+            lambda: self.client.patch(
+                detail_url('recipe', self.first_recipe().id),
+                {'time_minutes': next(counter) + 1}, format='json',
+            ),
+            self.add_recipes,
+        )
+        self.assertEqual(responses[-1].status_code, status.HTTP_200_OK)
+
+    @query_budget(4)
+    def test_destroy(self):
+        '''Test deleting a recipe.'''
+        recipes = iter(self.add_recipes(2))
+        responses = self.assertQueriesFlat(
+            lambda: self.client.delete(detail_url('recipe', next(recipes).id)),
+            self.add_recipes,
+        )
+        self.assertEqual(responses[-1].status_code, status.HTTP_204_NO_CONTENT)
+
+    @query_budget(4)
+    def test_upload_image(self):
+        '''Test uploading a recipe image, variants included.'''
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        variants = {**settings.RECIPE_IMAGE_VARIANTS, 'SIZES': (16,), 'LIST_SIZE': 16, 'SYNC': True}
+
+        def request():
+            image = io.BytesIO()
+            Image.new('RGB', (10, 10)).save(image, format='JPEG')
+            image.seek(0)
+            image.name = 'image.jpg'
+            return self.client.post(
+                reverse('recipe:recipe-upload-image', args=[self.first_recipe().id]),
+                {'image': image}, format='multipart',
+            )
+        with override_settings(MEDIA_ROOT=media_root, RECIPE_IMAGE_VARIANTS=variants):
+            responses = self.assertQueriesFlat(request, self.add_recipes)
+        self.assertEqual(responses[-1].status_code, status.HTTP_200_OK)
+
+    def test_export(self):
+        '''Test exporting recipes, which runs its queries while streaming.'''
+        def request():
+            with self.assertMaxQueries(3, msg='Export'):
+                return b''.join(self.client.get(EXPORT_URL).streaming_content)
+        content = self.assertQueriesFlat(request, self.add_recipes)[-1]
+        self.assertEqual(len(content.splitlines()), 100)
+
+
+class TagQueryBudgetTests(BudgetTestCase):
+    '''Test the query budgets of TagViewSet.'''
+    url = TAGS_URL
+    model = Tag
+    name = 'tag'
+
+    def first_item(self):
+        return self.model.objects.filter(user=self.user).order_by('id').first()
+
+    @query_budget(1)
+    def test_list(self):
+        '''Test listing.'''
+        self.assertQueriesFlat(lambda: self.client.get(self.url), self.add_recipes)
+
+    @query_budget(1)
+    def test_list_assigned_only(self):
+        '''Test listing only items assigned to recipes.'''
+        self.assertQueriesFlat(
+            lambda: self.client.get(self.url, {'assigned_only': 1}), self.add_recipes,
+        )
+
+    @query_budget(1)
+    def test_list_with_counts(self):
+        '''Test listing with recipe counts.'''
+        self.assertQueriesFlat(
+            lambda: self.client.get(self.url, {'with_counts': 1}), self.add_recipes,
+        )
+
+    @query_budget(6)
+    def test_update(self):
+        '''Test renaming.'''
+        # The save runs in a savepoint (2) so a name clash can be reported
+        counter = itertools.count()
+        self.assertQueriesFlat(
+            lambda: self.client.put(
+                detail_url(self.name, self.first_item().id), {'name': f'Renamed {next(counter)}'},
+            ),
+            self.add_recipes,
+        )
+
+    @query_budget(6)
+    def test_partial_update(self):
+        '''Test partially updating.'''
+        counter = itertools.count()
+        self.assertQueriesFlat(
+            lambda: self.client.patch(
+                detail_url(self.name, self.first_item().id), {'name': f'Renamed {next(counter)}'},
+            ),
+            self.add_recipes,
+        )
+
+    @query_budget(4)
+    def test_destroy(self):
+        '''Test deleting.'''
+        items = iter(self.model.objects.bulk_create(
+            self.model(user=self.user, name=f'Delete {i}') for i in range(2)
+        ))
+        responses = self.assertQueriesFlat(
+            lambda: self.client.delete(detail_url(self.name, next(items).id)), self.add_recipes,
+        )
+        self.assertEqual(responses[-1].status_code, status.HTTP_204_NO_CONTENT)
+
+
+class IngredientQueryBudgetTests(TagQueryBudgetTests):
+    '''Test the query budgets of IngredientViewSet.'''
+    url = INGREDIENTS_URL
+    model = Ingredient
+    name = 'ingredient'
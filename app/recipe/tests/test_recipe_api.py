@@ -9,9 +9,12 @@ import os
 from PIL import Image
 
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from drf_spectacular.generators import SchemaGenerator
 
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -22,6 +25,7 @@ from core.models import (
     Ingredient,
 )
 
+from recipe.cache import get_user_version
 from recipe.serializers import (
     RecipeSerializer, 
     RecipeDetailSerializer,
@@ -502,4 +506,276 @@ class ImageUploadTests(TestCase):
         
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
         
-        
\ No newline at end of file
+        
+
+class RecipeQueryCountTests(TestCase):
+    '''Test the number of queries used by the recipe APIs.'''
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', name='Test User', password='testpass123')
+        self.client.force_authenticate(self.user)
+
+    def _create_recipes(self, count):
+        '''Create recipes that each have tags and ingredients.'''
+        for i in range(count):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(
+                Tag.objects.create(user=self.user, name=f'Tag {recipe.id}'),
+                Tag.objects.create(user=self.user, name=f'Other tag {recipe.id}'),
+            )
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f'Ingredient {recipe.id}'),
+            )
+
+    def test_list_query_count_constant(self):
+        '''Test listing recipes uses the same queries for 1 or many recipes.'''
+        # ETag aggregate, recipes, tags, ingredients
+        self._create_recipes(1)
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data), 1)
+
+        self._create_recipes(20)
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data), 21)
+
+    def test_filtered_list_query_count_constant(self):
+        '''Test filtering by tags does not add queries per recipe.'''
+        self._create_recipes(10)
+        tag_ids = ','.join(str(tag.id) for tag in Tag.objects.all())
+
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL, {'tags': tag_ids})
+        self.assertEqual(len(res.data), 10)
+
+    def test_retrieve_query_count(self):
+        '''Test retrieving a recipe loads tags and ingredients once.'''
+        self._create_recipes(1)
+        recipe = Recipe.objects.get(user=self.user)
+
+        with self.assertNumQueries(3):
+            res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(len(res.data['tags']), 2)
+        self.assertEqual(len(res.data['ingredients']), 1)
+
+    def test_create_query_count(self):
+        '''Test creating a recipe without nested items.'''
+        payload = {
+            'title': 'Sample recipe',
+            'time_minutes': 30,
+            'price': Decimal('5.99'),
+        }
+        # savepoint, insert, release, tags, ingredients
+        with self.assertNumQueries(5):
+            res = self.client.post(RECIPES_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_partial_update_query_count(self):
+        '''Test updating a recipe renders the response with a fixed cost.'''
+        self._create_recipes(1)
+        recipe = Recipe.objects.get(user=self.user)
+
+        # select, savepoint, update, release, tags, ingredients
+        with self.assertNumQueries(6):
+            res = self.client.patch(detail_url(recipe.id), {'title': 'New title'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 2)
+
+
+class RecipePaginationTests(TestCase):
+    '''Test the opt-in cursor pagination of the recipe list.'''
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', name='Test User', password='testpass123')
+        self.client.force_authenticate(self.user)
+
+    def test_list_unpaginated_by_default(self):
+        '''Test the list is a plain array when pagination is not requested.'''
+        create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(res.data, list)
+
+    def test_paginate_with_cursor(self):
+        '''Test walking every page returns each recipe once, newest first.'''
+        recipes = [create_recipe(user=self.user, title=f'R{i}') for i in range(5)]
+        expected_ids = [recipe.id for recipe in reversed(recipes)]
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.data['previous'])
+
+        seen_ids = [r['id'] for r in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            seen_ids += [r['id'] for r in res.data['results']]
+
+        self.assertEqual(seen_ids, expected_ids)
+
+    def test_page_size_capped(self):
+        '''Test page_size cannot exceed the configured maximum.'''
+        for i in range(3):
+            create_recipe(user=self.user, title=f'R{i}')
+
+        with self.settings(RECIPE_MAX_PAGE_SIZE=2):
+            res = self.client.get(RECIPES_URL, {'page_size': 50})
+
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_invalid_cursor(self):
+        '''Test an invalid cursor returns 404.'''
+        res = self.client.get(RECIPES_URL, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_query_count_constant(self):
+        '''Test a deep page costs the same number of queries as page 1.'''
+        for i in range(6):
+            recipe = create_recipe(user=self.user, title=f'R{i}')
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f'T{i}'))
+
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL, {'page_size': 2})
+        next_url = self.client.get(res.data['next']).data['next']
+        with self.assertNumQueries(4):
+            res = self.client.get(next_url)
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_schema_documents_cursor_parameters(self):
+        '''Test the OpenAPI schema lists the pagination parameters.'''
+        schema = SchemaGenerator().get_schema(request=None, public=True)
+
+        operation = schema['paths']['/api/recipe/recipes/']['get']
+        names = [param['name'] for param in operation['parameters']]
+        self.assertIn('cursor', names)
+        self.assertIn('page_size', names)
+
+
+class RecipeNestedCreateTests(TestCase):
+    '''Test creating tags and ingredients through the recipe API.'''
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', name='Test User', password='testpass123')
+        self.client.force_authenticate(self.user)
+
+    def _payload(self, size):
+        return {
+            'title': 'Big recipe',
+            'time_minutes': 30,
+            'price': Decimal('5.99'),
+            'tags': [{'name': f'Tag {i}'} for i in range(size)],
+            'ingredients': [{'name': f'Ingredient {i}'} for i in range(size)],
+        }
+
+    def test_create_query_count_independent_of_payload(self):
+        '''Test creating 1 or 30 tags/ingredients uses the same queries.'''
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(RECIPES_URL, self._payload(1), format='json')
+        Tag.objects.all().delete()
+        Ingredient.objects.all().delete()
+
+        with CaptureQueriesContext(connection) as large:
+            res = self.client.post(RECIPES_URL, self._payload(30), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data['tags']), 30)
+        self.assertEqual(len(res.data['ingredients']), 30)
+        self.assertEqual(len(large), len(small))
+
+    def test_create_mixes_existing_and_new_names(self):
+        '''Test existing tags are reused and only missing ones created.'''
+        existing = Tag.objects.create(user=self.user, name='Tag 1')
+
+        res = self.client.post(RECIPES_URL, self._payload(3), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+        self.assertIn(existing, Recipe.objects.get(id=res.data['id']).tags.all())
+
+    def test_duplicate_names_in_payload(self):
+        '''Test repeated names in one payload create a single tag.'''
+        payload = self._payload(0)
+        payload['tags'] = [{'name': 'Vegan'}, {'name': 'Vegan'}]
+
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=self.user, name='Vegan').count(), 1)
+        self.assertEqual(len(res.data['tags']), 1)
+
+    def test_tag_names_unique_per_user(self):
+        '''Test the database rejects duplicate tag names for a user.'''
+        Tag.objects.create(user=self.user, name='Vegan')
+        other = create_user(email='other@example.com', name='Other', password='testpass123')
+        Tag.objects.create(user=other, name='Vegan')
+
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Tag.objects.create(user=self.user, name='Vegan')
+
+
+class RecipeDiffUpdateTests(TestCase):
+    '''Test updates only write the tags/ingredients links that changed.'''
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', name='Test User', password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        self.recipe.tags.add(
+            Tag.objects.create(user=self.user, name='Breakfast'),
+            Tag.objects.create(user=self.user, name='Quick'),
+        )
+        self.recipe.ingredients.add(Ingredient.objects.create(user=self.user, name='Eggs'))
+
+    def _patch(self, payload):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(detail_url(self.recipe.id), payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [
+            q['sql'] for q in queries
+            if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ]
+
+    def test_unchanged_update_writes_nothing(self):
+        '''Test re-sending the same data runs no writes or invalidation.'''
+        version = get_user_version(self.user.id)
+        updated_at = Recipe.objects.get(id=self.recipe.id).updated_at
+
+        writes = self._patch({
+            'title': self.recipe.title,
+            'tags': [{'name': 'Quick'}, {'name': 'Breakfast'}],
+            'ingredients': [{'name': 'Eggs'}],
+        })
+
+        self.assertEqual(writes, [])
+        self.assertEqual(get_user_version(self.user.id), version)
+        self.assertEqual(Recipe.objects.get(id=self.recipe.id).updated_at, updated_at)
+
+    def test_only_changed_links_written(self):
+        '''Test swapping one tag deletes one link and inserts one.'''
+        writes = self._patch({'tags': [{'name': 'Breakfast'}, {'name': 'Vegan'}]})
+
+        link_writes = [sql for sql in writes if 'core_recipe_tags' in sql]
+        self.assertEqual(len(link_writes), 2)
+        self.assertTrue(link_writes[0].startswith('DELETE'))
+        self.assertTrue(link_writes[1].startswith('INSERT'))
+        self.assertEqual(
+            sorted(self.recipe.tags.values_list('name', flat=True)),
+            ['Breakfast', 'Vegan'],
+        )
+
+    def test_changed_update_invalidates(self):
+        '''Test a real change bumps the cache version.'''
+        version = get_user_version(self.user.id)
+
+        self._patch({'ingredients': []})
+
+        self.assertNotEqual(get_user_version(self.user.id), version)
+        self.assertEqual(self.recipe.ingredients.count(), 0)
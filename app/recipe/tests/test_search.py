@@ -0,0 +1,107 @@
+'''
+Tests for recipe full-text search.
+'''
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe.cache import get_cache
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def create_recipe(user, **params):
+    '''Create and return a sample recipe.'''
+    defaults = {
+        'title': 'Sample Title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeSearchTests(TestCase):
+    '''Test the ?search= parameter of the recipe list.'''
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _search(self, terms, **params):
+        res = self.client.get(RECIPES_URL, {'search': terms, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recipe['title'] for recipe in res.data]
+
+    def test_title_matches_rank_first(self):
+        '''Test recipes with the word in the title come before description matches.'''
+        create_recipe(self.user, title='Pasta bake', description='With tomato sauce')
+        create_recipe(self.user, title='Tomato soup', description='A classic')
+        create_recipe(self.user, title='Pancakes', description='Sweet')
+
+        self.assertEqual(self._search('tomato'), ['Tomato soup', 'Pasta bake'])
+
+    def test_all_words_and_stems_match(self):
+        '''Test every word must match, in any inflection.'''
+        create_recipe(self.user, title='Roasted carrots', description='With honey')
+        create_recipe(self.user, title='Roast potatoes')
+
+        self.assertEqual(self._search('roasting honey'), ['Roasted carrots'])
+
+    def test_query_syntax_is_ignored(self):
+        '''Test operators in the input are treated as words.'''
+        create_recipe(self.user, title='Fish AND chips')
+
+        self.assertEqual(self._search('"fish" OR * NEAR('), [])
+        self.assertEqual(self._search('fish*'), ['Fish AND chips'])
+        self.assertEqual(self._search('!!'), [])
+
+    def test_other_users_excluded(self):
+        '''Test only the user's own recipes are searched.'''
+        other = get_user_model().objects.create_user(
+            email='other@example.com', name='Other', password='testpass123'
+        )
+        create_recipe(other, title='Chocolate cake')
+
+        self.assertEqual(self._search('chocolate'), [])
+
+    def test_index_follows_updates(self):
+        '''Test renamed and deleted recipes are found under their new title only.'''
+        recipe = create_recipe(self.user, title='Chocolate cake')
+        gone = create_recipe(self.user, title='Chocolate cookies')
+
+        recipe.title = 'Vanilla cake'
+        recipe.save()
+        gone.delete()
+
+        self.assertEqual(self._search('chocolate'), [])
+        self.assertEqual(self._search('vanilla'), ['Vanilla cake'])
+
+    def test_search_not_paginated(self):
+        '''Test a search returns a plain list even when a page size is sent.'''
+        create_recipe(self.user, title='Soup one')
+        create_recipe(self.user, title='Soup two')
+
+        res = self.client.get(RECIPES_URL, {'search': 'soup', 'page_size': 1})
+
+        self.assertIsInstance(res.data, list)
+        self.assertEqual(len(res.data), 2)
+
+    def test_search_with_tag_filter(self):
+        '''Test search combines with the tag filter.'''
+        tagged = create_recipe(self.user, title='Green curry')
+        create_recipe(self.user, title='Red curry')
+        tag = tagged.tags.create(user=self.user, name='Spicy')
+
+        self.assertEqual(self._search('curry', tags=str(tag.id)), ['Green curry'])
@@ -2,6 +2,9 @@
 Tests for the tahs API.
 '''
 
+from decimal import Decimal
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import TestCase
@@ -9,7 +12,8 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Tag
+from core.models import Recipe, Tag
+from recipe.cache import get_cache
 from recipe.serializers import TagSerializer
 
 TAGS_URL = reverse('recipe:tag-list')
@@ -102,4 +106,85 @@ class PrivateTagsApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         tags = Tag.objects.filter(user=self.user)
-        self.assertFalse(tags.exists())
\ No newline at end of file
+        self.assertFalse(tags.exists())
+
+    def test_update_tag_duplicate_name_error(self):
+        '''Test renaming a tag to an existing name returns an error.'''
+        Tag.objects.create(user=self.user, name='Dessert')
+        tag = Tag.objects.create(user=self.user, name='After dinner')
+
+        res = self.client.patch(detail_url(tag.id), {'name': 'Dessert'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'After dinner')
+
+    def test_update_tag_duplicate_name_race(self):
+        '''Test a rename losing a race for the name returns an error, not a 500.'''
+        Tag.objects.create(user=self.user, name='Dessert')
+        tag = Tag.objects.create(user=self.user, name='After dinner')
+
+        # The other rename commits between the duplicate check and the save
+        with patch('django.db.models.query.QuerySet.exists', return_value=False):
+            res = self.client.patch(detail_url(tag.id), {'name': 'Dessert'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', res.data)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'After dinner')
+
+    def _create_recipes(self, count):
+        return [
+            Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=5, price=Decimal('1.00'),
+            )
+            for i in range(count)
+        ]
+
+    def test_filter_tags_assigned_unique(self):
+        '''Test assigned_only lists each used tag once.'''
+        used = Tag.objects.create(user=self.user, name='Breakfast')
+        Tag.objects.create(user=self.user, name='Unused')
+        for recipe in self._create_recipes(3):
+            recipe.tags.add(used)
+
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(res.data, [{'id': used.id, 'name': 'Breakfast'}])
+
+    def test_tags_with_counts(self):
+        '''Test with_counts adds the number of recipes per tag.'''
+        breakfast = Tag.objects.create(user=self.user, name='Breakfast')
+        lunch = Tag.objects.create(user=self.user, name='Lunch')
+        Tag.objects.create(user=self.user, name='Unused')
+        recipes = self._create_recipes(3)
+        for recipe in recipes:
+            recipe.tags.add(breakfast)
+        recipes[0].tags.add(lunch)
+
+        res = self.client.get(TAGS_URL, {'with_counts': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(tag['name'], tag['recipe_count']) for tag in res.data],
+            [('Unused', 0), ('Lunch', 1), ('Breakfast', 3)],
+        )
+
+        res = self.client.get(TAGS_URL, {'with_counts': 1, 'assigned_only': 1})
+
+        self.assertEqual(
+            [(tag['name'], tag['recipe_count']) for tag in res.data],
+            [('Lunch', 1), ('Breakfast', 3)],
+        )
+
+    def test_tags_with_counts_single_query(self):
+        '''Test the counts come from the list query itself.'''
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}') for i in range(5)]
+        for recipe in self._create_recipes(5):
+            recipe.tags.add(*tags)
+        get_cache().clear()
+
+        with self.assertNumQueries(1):
+            res = self.client.get(TAGS_URL, {'with_counts': 1})
+
+        self.assertEqual({tag['recipe_count'] for tag in res.data}, {5})
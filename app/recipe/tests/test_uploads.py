@@ -0,0 +1,144 @@
+'''
+Tests for bounded recipe image uploads.
+'''
+
+import io
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe.uploads import BoundedImageUploadHandler, ImageUploadTooLarge
+
+UPLOAD_LIMITS = {
+    'MAX_BYTES': 20000,
+    'MAX_PIXELS': 100 * 100,
+    'CHUNK_SIZE': 1024,
+}
+
+
+def image_upload_url(recipe_id):
+    '''Create and return an image upload URL.'''
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def image_bytes(size, fmt='PNG', noise=False):
+    '''Return an encoded image.'''
+    img = Image.effect_noise(size, 100).convert('RGB') if noise else Image.new('RGB', size)
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+@override_settings(RECIPE_IMAGE_UPLOAD=UPLOAD_LIMITS)
+class BoundedImageUploadHandlerTests(TestCase):
+    '''Test the streaming upload handler.'''
+
+    def _handler(self):
+        handler = BoundedImageUploadHandler()
+        handler.new_file('image', 'photo.png', 'image/png', None)
+        return handler
+
+    def test_content_length_checked_first(self):
+        '''Test oversized requests are refused before reading the body.'''
+        handler = BoundedImageUploadHandler()
+
+        with self.assertRaises(ImageUploadTooLarge):
+            handler.handle_raw_input(None, {}, 10**9, b'boundary')
+
+    def test_dimensions_checked_from_header(self):
+        '''Test the first chunk is enough to reject a huge image.'''
+        handler = self._handler()
+        data = image_bytes((1000, 1000))
+
+        with self.assertRaises(ImageUploadTooLarge):
+            handler.receive_data_chunk(data[:1024], 0)
+
+    def test_byte_limit(self):
+        '''Test the file is cut off once it passes MAX_BYTES.'''
+        handler = self._handler()
+        data = image_bytes((90, 90), noise=True)
+        self.assertGreater(len(data), UPLOAD_LIMITS['MAX_BYTES'])
+
+        with self.assertRaises(ImageUploadTooLarge):
+            for start in range(0, len(data), 1024):
+                handler.receive_data_chunk(data[start:start + 1024], start)
+        self.assertLessEqual(handler.received, UPLOAD_LIMITS['MAX_BYTES'] + 1024)
+
+    def test_streams_to_temporary_file(self):
+        '''Test accepted files are written to disk, not kept in memory.'''
+        handler = self._handler()
+        data = image_bytes((50, 50))
+
+        for start in range(0, len(data), 1024):
+            handler.receive_data_chunk(data[start:start + 1024], start)
+        uploaded = handler.file_complete(len(data))
+
+        self.assertIsInstance(uploaded, TemporaryUploadedFile)
+        self.assertEqual(uploaded.read(), data)
+
+
+@override_settings(RECIPE_IMAGE_UPLOAD=UPLOAD_LIMITS)
+class ImageUploadLimitsApiTests(TestCase):
+    '''Test upload limits through the upload-image endpoint.'''
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Sample', time_minutes=5, price=Decimal('1.50'),
+        )
+
+    def _upload(self, data, name='photo.png'):
+        return self.client.post(
+            image_upload_url(self.recipe.id),
+            {'image': SimpleUploadedFile(name, data)},
+            format='multipart',
+        )
+
+    def test_upload_within_limits(self):
+        '''Test a small image is accepted.'''
+        res = self._upload(image_bytes((50, 50)))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_too_many_bytes(self):
+        '''Test a file over MAX_BYTES is rejected with 413.'''
+        res = self._upload(image_bytes((90, 90), noise=True))
+
+        self.assertEqual(res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_too_many_pixels(self):
+        '''Test an image over MAX_PIXELS is rejected with 413.'''
+        res = self._upload(image_bytes((200, 200)))
+
+        self.assertEqual(res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertIn('200x200', res.data['detail'])
+
+    def test_too_many_pixels_without_early_header(self):
+        '''Test the serializer checks images whose header wasn't read early.'''
+        with patch('recipe.uploads.read_dimensions', return_value=None):
+            res = self._upload(image_bytes((200, 200)))
+
+        self.assertEqual(res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
@@ -0,0 +1,110 @@
+'''
+Streaming, size-bounded parsing of recipe image uploads
+'''
+
+import io
+import struct
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image
+
+from rest_framework import exceptions, status
+from rest_framework.parsers import MultiPartParser
+
+# Multipart boundaries, part headers and small form fields on top of the file
+MULTIPART_OVERHEAD = 64 * 2**10
+
+# Image headers are nearly always in the first few KB, but JPEGs can carry
+# large EXIF/ICC blocks before the frame header.
+MAX_HEADER_BYTES = 256 * 2**10
+
+
+def _settings():
+    return settings.RECIPE_IMAGE_UPLOAD
+
+
+class ImageUploadTooLarge(exceptions.APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Image too large.'
+    default_code = 'image_too_large'
+
+
+def check_dimensions(width, height):
+    '''Raise ImageUploadTooLarge if an image has too many pixels.'''
+    max_pixels = _settings()['MAX_PIXELS']
+    if width * height > max_pixels:
+        raise ImageUploadTooLarge(
+            f'Image is {width}x{height}; at most {max_pixels} pixels are allowed.'
+        )
+
+
+def read_dimensions(head):
+    '''Return (width, height) from the first bytes of an image, or None.
+
+    Image.open() only parses the header; no pixel data is decoded.
+    '''
+    try:
+        with Image.open(io.BytesIO(head)) as img:
+            return img.size
+    except Image.DecompressionBombError as exc:
+        raise ImageUploadTooLarge(str(exc))
+    except (OSError, SyntaxError, ValueError, struct.error):  # incomplete or not an image
+        return None
+
+
+class BoundedImageUploadHandler(TemporaryFileUploadHandler):
+    '''Stream uploads to a temporary file, rejecting oversized images early.
+
+    The request is refused before its body is read if Content-Length is
+    already over the limit, each file is cut off as soon as it passes
+    MAX_BYTES, and the dimensions are checked as soon as the image header
+    has arrived. Memory use doesn't depend on the upload size.
+    '''
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > _settings()['MAX_BYTES'] + MULTIPART_OVERHEAD:
+            raise ImageUploadTooLarge()
+        return super().handle_raw_input(input_data, META, content_length, boundary, encoding)
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.head = b''
+        self.dimensions_checked = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        try:
+            if self.received > _settings()['MAX_BYTES']:
+                raise ImageUploadTooLarge(
+                    f'Image is larger than {_settings()["MAX_BYTES"]} bytes.'
+                )
+            if not self.dimensions_checked:
+                self._check_head(raw_data)
+        except ImageUploadTooLarge:
+            self.upload_interrupted()
+            raise
+        return super().receive_data_chunk(raw_data, start)
+
+    def _check_head(self, raw_data):
+        self.head += raw_data[:MAX_HEADER_BYTES - len(self.head)]
+        dimensions = read_dimensions(self.head)
+        if dimensions is not None:
+            check_dimensions(*dimensions)
+        # Give up on headers that don't parse early; the serializer checks
+        # the complete file.
+        if dimensions is not None or len(self.head) >= MAX_HEADER_BYTES:
+            self.dimensions_checked = True
+            self.head = b''
+
+
+class ImageUploadParser(MultiPartParser):
+    '''Multipart parser that only uses BoundedImageUploadHandler.'''
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        handler = BoundedImageUploadHandler(request._request)
+        handler.chunk_size = _settings()['CHUNK_SIZE']
+        request._request.upload_handlers = [handler]
+        return super().parse(stream, media_type, parser_context)
@@ -9,6 +9,11 @@ from drf_spectacular.utils import (
     OpenApiTypes,
 )
 
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, OuterRef, Prefetch
+from django.http import StreamingHttpResponse
+
 from rest_framework import (
     viewsets,
     mixins,
@@ -16,10 +21,12 @@ from rest_framework import (
 )
 
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
+from core.db import ReplicaReadMixin, read_database
+from core.middleware import TimedSerializerMixin
 from core.models import (
     Recipe,
     Tag,
@@ -27,8 +34,33 @@ from core.models import (
 )
 
 from recipe import serializers
+from user.authentication import CachedTokenAuthentication
+from recipe.cache import CachedListMixin, normalize_ids, normalize_names
+from recipe.conditional import ConditionalGetMixin
+from recipe.export import NDJSON_CONTENT_TYPE, content_disposition, export_lines
+from recipe.fast import FastListMixin
+from recipe.pagination import RecipeCursorPagination
+from recipe.search import search_recipes
+from recipe.uploads import ImageUploadParser
+
+FIELDSET_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='Comma separated list of fields to return (default: all).',
+    ),
+    OpenApiParameter(
+        'expand',
+        OpenApiTypes.STR,
+        description='Comma separated list of relations (tags, ingredients) to '
+                    'return as objects; the others are returned as lists of '
+                    'IDs. All are expanded by default.',
+    ),
+]
+
 
 @extend_schema_view(
+    retrieve=extend_schema(parameters=FIELDSET_PARAMETERS),
     list=extend_schema(
         parameters=[
             OpenApiParameter(
@@ -41,6 +73,13 @@ from recipe import serializers
                 OpenApiTypes.STR,
                 description='Comma separated list of ingredient IDs to filter',
             ),
+            *FIELDSET_PARAMETERS,
+            OpenApiParameter(
+                'search',
+                OpenApiTypes.STR,
+                description='Words to search for in titles and descriptions. '
+                            'Results are ordered by relevance and not paginated.',
+            ),
         ]
     )
 )
@@ -57,13 +96,31 @@ from recipe import serializers
     )
 )
 
-class RecipeViewSet(viewsets.ModelViewSet): # ModelViewSet works directly with models
+class RecipeViewSet(ReplicaReadMixin, TimedSerializerMixin, ConditionalGetMixin, CachedListMixin, FastListMixin, viewsets.ModelViewSet): # ModelViewSet works directly with models
     '''View for manage recipe APIs.'''
     serializer_class = serializers.RecipeDetailSerializer
-    queryset = Recipe.objects.all() # Specify the queryset/models to be used
+    queryset = Recipe.objects.defer('search_vector') # Specify the queryset/models to be used; the tsvector is only needed in SQL
     
-    authentication_classes = [TokenAuthentication] # In order to use any of the endpoints provided by this viewset
+    authentication_classes = [CachedTokenAuthentication] # In order to use any of the endpoints provided by this viewset
     permission_classes = [IsAuthenticated] # you need to use tokenAuth and you need to be authenticated
+    pagination_class = RecipeCursorPagination # only used when ?cursor= or ?page_size= is sent
+    cache_query_params = {
+        'tags': normalize_ids,
+        'ingredients': normalize_ids,
+        'cursor': None,
+        'page_size': int,
+        'search': lambda value: ' '.join(value.lower().split()),
+        'fields': normalize_names,
+        'expand': normalize_names,
+    }
+
+    # Actions that read many recipes and render their nested tags/ingredients.
+    # A single recipe costs the same without a prefetch, and retrieve can
+    # answer 304 before the relations are loaded at all.
+    nested_actions = ('list', 'export')
+
+    # Actions whose response can be narrowed with ?fields= and ?expand=
+    fieldset_actions = ('list', 'retrieve')
     
     # Make super the the recipes are filtered by the authenticated user
     # To do this, overwrite the get_queryset()
@@ -73,6 +130,78 @@ class RecipeViewSet(viewsets.ModelViewSet): # ModelViewSet works directly with m
         return [int(str_id) for str_id in qs.split(',')]
     
   
+    def get_search_terms(self):
+        '''Return the ?search= terms of a list request, or None.'''
+        if self.action != 'list':
+            return None
+        return self.request.query_params.get('search', '').strip() or None
+
+    @property
+    def paginator(self):
+        '''Don't paginate search results; the cursor can't keep their ranking.'''
+        if self.get_search_terms():
+            return None
+        return super().paginator
+
+    def _parse_names(self, param, choices):
+        value = self.request.query_params.get(param)
+        if value is None:
+            return None
+        names = [name for name in dict.fromkeys(value.split(',')) if name]
+        unknown = [name for name in names if name not in choices]
+        if unknown:
+            raise ValidationError({param: [
+                f'Unknown field(s): {", ".join(unknown)}. '
+                f'Choose from: {", ".join(choices)}.'
+            ]})
+        return names
+
+    def get_fieldset(self):
+        '''Return the (fields, expand) lists requested, None meaning all.'''
+        if not hasattr(self, '_fieldset'):
+            fields = expand = None
+            if self.action in self.fieldset_actions:
+                serializer_class = self.get_serializer_class()
+                fields = self._parse_names('fields', list(serializer_class().fields)) or None
+                expand = self._parse_names('expand', serializer_class.expandable_fields)
+            self._fieldset = (fields, expand)
+        return self._fieldset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in self.fieldset_actions:
+            fields, expand = self.get_fieldset()
+            kwargs.setdefault('fields', fields)
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
+
+    def _apply_fieldset(self, queryset):
+        '''Load only the columns and relations the requested fields use.'''
+        fields, expand = self.get_fieldset()
+        if fields is not None:
+            columns = {'id'}
+            if self.action == 'retrieve':
+                columns.add(self.updated_field)  # for the ETag
+            field_columns = self.get_serializer_class().field_columns
+            for name in fields:
+                columns.update(field_columns.get(name, (name,)))
+            queryset = queryset.only(*columns)
+
+        if self.action in self.nested_actions:
+            for name, model in (('tags', Tag), ('ingredients', Ingredient)):
+                if fields is not None and name not in fields:
+                    continue
+                # Ordered by id, as recipe/fast.py renders them
+                if expand is not None and name not in expand:
+                    # Rendered as IDs
+                    queryset = queryset.prefetch_related(
+                        Prefetch(name, queryset=model.objects.only('id').order_by('id'))
+                    )
+                else:
+                    queryset = queryset.prefetch_related(
+                        Prefetch(name, queryset=model.objects.order_by('id'))
+                    )
+        return queryset
+
     def get_queryset(self): 
         """Retrieve recipes for authenticated user. Ovrewrite to filter by tags/ingredients."""
         tags = self.request.query_params.get('tags')
@@ -85,9 +214,20 @@ class RecipeViewSet(viewsets.ModelViewSet): # ModelViewSet works directly with m
             ingredient_ids = self._params_to_ints(ingredients)
             queryset = queryset.filter(ingredients__id__in=ingredient_ids)
 
-        return queryset.filter(
+        queryset = queryset.filter(
             user=self.request.user
         ).order_by('-id').distinct()
+
+        # Nested tags/ingredients are loaded in one query each for the whole
+        # page instead of two queries per recipe (N+1), and only if they
+        # are rendered at all.
+        queryset = self._apply_fieldset(queryset)
+
+        search = self.get_search_terms()
+        if search:
+            queryset = search_recipes(queryset, search)[:settings.RECIPE_SEARCH_LIMIT]
+
+        return queryset
     
     # Overwrite the get_serializer_class() used by django by default to
     # determine the class being used for a paarticular action
@@ -102,7 +242,9 @@ class RecipeViewSet(viewsets.ModelViewSet): # ModelViewSet works directly with m
         
         return self.serializer_class
     
-    @action(methods=['POST'], detail=True, url_path='upload-image')
+    # Streams the file to disk and enforces settings.RECIPE_IMAGE_UPLOAD
+    @action(methods=['POST'], detail=True, url_path='upload-image',
+            parser_classes=[ImageUploadParser])
     def upload_image(self,request,pk=None):
         '''Upload an image to recipe.'''
         recipe = self.get_object()
@@ -114,45 +256,122 @@ class RecipeViewSet(viewsets.ModelViewSet): # ModelViewSet works directly with m
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
             
+    def get_export_queryset(self):
+        '''Return the recipes to export, prefetched one chunk at a time.'''
+        queryset = self.get_queryset()
+        # The body is streamed after the request's replica is released
+        database = read_database()
+        if database:
+            queryset = queryset.using(database)
+        return queryset.iterator(chunk_size=settings.RECIPE_EXPORT_CHUNK_SIZE)
+
+    # Not paginated or cached: the response is written while the recipes
+    # are read, so memory use doesn't grow with the number of recipes.
+    @extend_schema(responses={(200, NDJSON_CONTENT_TYPE): serializers.RecipeDetailSerializer})
+    @action(methods=['GET'], detail=False, url_path='export')
+    def export(self, request):
+        '''Stream all of the user's recipes as NDJSON, one recipe per line.'''
+        response = StreamingHttpResponse(
+            export_lines(self.get_export_queryset(), self.get_serializer),
+            content_type=NDJSON_CONTENT_TYPE,
+        )
+        response['Content-Disposition'] = content_disposition(request.user)
+        return response
+
     def perform_create(self, serializer): #overwrite recipe create of viewset to set the user field
         '''Create a new recipe.'''
         '''Overwrite the behavior for when Djando saves 
             a model in a viewset'''
         serializer.save(user=self.request.user)    
 
-class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'assigned_only',
+                OpenApiTypes.INT, enum=[0, 1],
+                description='Filter by items assigned to recipes.',
+            ),
+            OpenApiParameter(
+                'with_counts',
+                OpenApiTypes.INT, enum=[0, 1],
+                description='Include the number of recipes using each item.',
+            ),
+        ]
+    )
+)
+class BaseRecipeAttrViewSet(ReplicaReadMixin,
+                            TimedSerializerMixin,
+                            CachedListMixin,
+                            FastListMixin,
+                            mixins.DestroyModelMixin,
                             mixins.UpdateModelMixin,
                             mixins.ListModelMixin,
                             viewsets.GenericViewSet):
     """Base viewset for recipe attributes."""
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    cache_query_params = {'assigned_only': int, 'with_counts': int}
+    recipe_field = None            # Recipe M2M field linking to the items
+    count_serializer_class = None  # list serializer for ?with_counts=1
+
+    def _flag(self, name):
+        return bool(int(self.request.query_params.get(name, 0)))
 
     def get_queryset(self):
         """Filter queryset to authenticated user."""
-        
-        assigned_only = bool(
-            int(self.request.query_params.get('assigned_only', 0))
-        )
-        
-        queryset = self.queryset
-        
-        if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+        queryset = self.queryset.filter(user=self.request.user)
 
-        return queryset.filter(
-            user=self.request.user
-        ).order_by('-name').distinct()
+        if self._flag('assigned_only'):
+            # EXISTS stops at the first link on the (item_id, recipe_id)
+            # index, where joining the links needed DISTINCT to undo the
+            # duplicates.
+            links = Recipe._meta.get_field(self.recipe_field).remote_field.through
+            queryset = queryset.filter(Exists(links.objects.filter(
+                **{self.queryset.model._meta.model_name: OuterRef('pk')}
+            )))
+
+        if self.action == 'list' and self._flag('with_counts'):
+            # One LEFT JOIN ... GROUP BY for every item of the page
+            queryset = queryset.annotate(recipe_count=Count('recipe'))
+
+        return queryset.order_by('-name')
+
+    def get_serializer_class(self):
+        """Add recipe counts to lists requested ?with_counts=1."""
+        if self.action == 'list' and self._flag('with_counts'):
+            return self.count_serializer_class
+        return self.serializer_class
+
+    def perform_update(self, serializer):
+        """Reject renames that clash with another item of the user."""
+        name = serializer.validated_data.get('name')
+        duplicate = ValidationError({'name': [f'"{name}" already exists.']})
+        if name is not None and self.queryset.filter(
+            user=self.request.user, name=name,
+        ).exclude(pk=serializer.instance.pk).exists():
+            raise duplicate
+
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            # A concurrent rename took the name after the check above
+            raise duplicate
     
 class TagViewSet(BaseRecipeAttrViewSet):
     """Manage tags in the database."""
     serializer_class = serializers.TagSerializer
+    count_serializer_class = serializers.TagCountSerializer
     queryset = Tag.objects.all()
+    recipe_field = 'tags'
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
     """Manage ingredients in the database."""
     serializer_class = serializers.IngredientSerializer
+    count_serializer_class = serializers.IngredientCountSerializer
     queryset = Ingredient.objects.all()
+    recipe_field = 'ingredients'
 
 
 # class TagViewSet(mixins.DestroyModelMixin, # Implement delete and update functionality
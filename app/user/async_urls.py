@@ -0,0 +1,14 @@
+'''
+URL mappings for the async user API.
+'''
+
+from django.urls import path
+
+from user import async_views
+
+app_name = 'user-async'
+
+urlpatterns = [
+    path('token/', async_views.token, name='token'),
+    path('me/', async_views.me, name='me'),
+]
@@ -0,0 +1,95 @@
+'''
+Async views for the user API, and helpers shared by the async views
+'''
+
+import json
+from functools import partial, wraps
+
+from django.http import HttpResponse
+from django.utils.translation import gettext as _
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+
+from user import login
+from user.authentication import CachedTokenAuthentication, aauthenticate, aload_user
+from user.serializers import CredentialsSerializer, UserSerializer
+
+
+def json_response(data, status=200, headers=None):
+    '''Render data the way DRF's JSONRenderer does.'''
+    return HttpResponse(
+        JSONRenderer().render(data),
+        status=status,
+        headers=headers,
+        content_type='application/json',
+    )
+
+
+def async_api_view(view_func=None, methods=('GET',)):
+    '''Turn APIExceptions raised by an async view into DRF-style responses.'''
+    if view_func is None:
+        return partial(async_api_view, methods=methods)
+
+    @require_http_methods(list(methods))
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view_func(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            headers = {}
+            if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                headers['WWW-Authenticate'] = CachedTokenAuthentication.keyword
+            if getattr(exc, 'wait', None):
+                headers['Retry-After'] = str(int(exc.wait))
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            return json_response(data, status=exc.status_code, headers=headers)
+    return wrapper
+
+
+def parse_body(request):
+    '''Return the data of a JSON or form encoded request body.'''
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError as exc:
+            raise exceptions.ParseError(f'JSON parse error - {exc}')
+    return request.POST
+
+
+async def authenticate(request):
+    '''Return the authenticated user or raise NotAuthenticated.'''
+    result = await aauthenticate(request)
+    if result is None:
+        raise exceptions.NotAuthenticated()
+    return result[0]
+
+
+@async_api_view
+async def me(request):
+    '''Return the authenticated user.'''
+    user = await authenticate(request)
+    await aload_user(user)
+    return json_response(UserSerializer(user).data)
+
+
+@csrf_exempt
+@async_api_view(methods=('POST',))
+async def token(request):
+    '''Return the auth token for an email and password.
+
+    Like user:token, but the password is checked off the event loop on a
+    bounded pool; see user/login.py.
+    '''
+    serializer = CredentialsSerializer(data=parse_body(request))
+    serializer.is_valid(raise_exception=True)
+
+    token = await login.aobtain_token(**serializer.validated_data)
+    if token is None:
+        raise exceptions.ValidationError(
+            {'non_field_errors': [_('Unable to authenticate with provided credentials.')]},
+            code='authorization',
+        )
+    return json_response({'token': token.key})
@@ -0,0 +1,207 @@
+'''
+Cached token authentication for the APIs
+'''
+
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    TokenAuthentication,
+    get_authorization_header,
+)
+from rest_framework.authtoken.models import Token
+
+
+class LRUCache:
+    '''Thread-safe, size-bounded LRU mapping whose entries expire after ttl.'''
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_matching(self, predicate):
+        '''Delete every entry whose value matches predicate.'''
+        with self._lock:
+            for key in [k for k, (value, _expires) in self._data.items() if predicate(value)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _settings():
+    return settings.TOKEN_AUTH_CACHE
+
+
+token_cache = LRUCache(
+    max_size=_settings()['MAX_SIZE'],
+    ttl=_settings()['TTL'],
+)
+
+
+def _shared_cache():
+    alias = _settings()['SHARED_CACHE_ALIAS']
+    return caches[alias] if alias else None
+
+
+def _shared_key(key):
+    # Never use the raw token as a key in an external cache
+    return 'auth:token:v2:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def _to_shared(token):
+    '''Return what the shared cache keeps of a token: no password hash or profile.'''
+    return (token.key, token.created, token.user_id, token.user.is_active)
+
+
+def _from_shared(entry):
+    '''Return a token whose user only has the fields kept by _to_shared().'''
+    key, created, user_id, is_active = entry
+    UserModel = get_user_model()
+    user = UserModel.from_db(None, [UserModel._meta.pk.attname, 'is_active'], [user_id, is_active])
+    token = Token(key=key, created=created, user=user)
+    token._state.adding = False
+    return token
+
+
+def load_user(user):
+    '''Load the fields left out of a user resolved from the shared cache.'''
+    deferred = user.get_deferred_fields()
+    if deferred:
+        user.refresh_from_db(fields=deferred)
+
+
+async def aload_user(user):
+    '''Async counterpart of load_user().'''
+    deferred = user.get_deferred_fields()
+    if deferred:
+        await user.arefresh_from_db(fields=deferred)
+
+
+def invalidate_token(key):
+    '''Drop a token from the local and shared caches.'''
+    token_cache.delete(key)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete(_shared_key(key))
+
+
+def invalidate_user(user):
+    '''Drop every cached token of a user.'''
+    token_cache.delete_matching(lambda token: token.user_id == user.pk)
+    if _shared_cache() is not None:
+        for key in Token.objects.filter(user=user).values_list('key', flat=True):
+            invalidate_token(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    '''TokenAuthentication that caches token -> user lookups.
+
+    Resolved tokens are kept in an in-process LRU (and, if configured, the
+    shared cache) for TOKEN_AUTH_CACHE['TTL'] seconds. The shared cache only
+    keeps the token and the user's id and is_active flag; users resolved
+    from it load their other fields when first used (see load_user()).
+    user/signals.py drops entries when a token is deleted or its user is
+    saved or deleted; other processes' LRUs only see that once their entry
+    expires, so keep the TTL short.
+    '''
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            shared = _shared_cache()
+            if shared is not None:
+                entry = shared.get(_shared_key(key))
+                token = entry and _from_shared(entry)
+            if token is None:
+                user, token = super().authenticate_credentials(key)
+                if shared is not None:
+                    shared.set(_shared_key(key), _to_shared(token), _settings()['TTL'])
+            token_cache.set(key, token)
+
+        return _checked_copy(token)
+
+
+def _checked_copy(token):
+    '''Return (user, token) for a resolved token, copied from the cache.'''
+    if not token.user.is_active:
+        raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+    # Requests may change the user they get; never hand out the cached object
+    token = copy.deepcopy(token)
+    return (token.user, token)
+
+
+async def aauthenticate(request):
+    '''Async counterpart of CachedTokenAuthentication.authenticate().
+
+    Returns (user, token), or None when the request has no token header.
+    Raises AuthenticationFailed for invalid tokens.
+    '''
+    keyword = CachedTokenAuthentication.keyword.lower().encode()
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != keyword:
+        return None
+    if len(auth) != 2:
+        raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+
+    token = token_cache.get(key)
+    if token is None:
+        shared = _shared_cache()
+        if shared is not None:
+            entry = await shared.aget(_shared_key(key))
+            token = entry and _from_shared(entry)
+        if token is None:
+            try:
+                token = await Token.objects.select_related('user').aget(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            if shared is not None:
+                await shared.aset(_shared_key(key), _to_shared(token), _settings()['TTL'])
+        token_cache.set(key, token)
+
+    return _checked_copy(token)
@@ -0,0 +1,181 @@
+'''
+Token issuance without blocking on password hashing
+
+Checking a password runs the full PBKDF2 hash, which takes a worker for
+the whole time. The async token endpoint hands the check to a bounded
+pool of threads (hashlib releases the GIL while hashing), and refuses
+new logins with 503 once TOKEN_LOGIN['WORKERS'] + ['QUEUE'] checks are
+in flight, instead of letting them pile up behind each other.
+
+Both token endpoints remember the token of credentials that were just
+verified for TOKEN_LOGIN['REUSE_TTL'] seconds, so a client logging in
+again with the same email and password gets it without another hash.
+Entries are keyed by an HMAC of the credentials and dropped when the
+user or token changes (user/signals.py). The cache is per process and
+those signals only reach the process that made the change, so reusing an
+entry also reads the token with its user (one query) and checks that
+the token still exists, the user is active and the password hash is the
+one that was verified. Failed logins aren't remembered.
+'''
+
+import asyncio
+import hashlib
+import hmac
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, make_password
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions, status
+from rest_framework.authtoken.models import Token
+
+from user.authentication import LRUCache
+
+
+def _settings():
+    return settings.TOKEN_LOGIN
+
+
+login_cache = LRUCache(
+    max_size=_settings()['REUSE_SIZE'],
+    ttl=_settings()['REUSE_TTL'],
+)
+
+
+class LoginBusy(exceptions.APIException):
+    '''Too many password checks in flight; the client should retry.'''
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Too many logins in progress, try again shortly.')
+    default_code = 'login_busy'
+    wait = 1  # sent as Retry-After
+
+
+def credentials_key(email, password):
+    '''Return the login cache key of a pair of credentials.'''
+    # Keyed with SECRET_KEY so the cache never holds anything that can be
+    # checked against a guessed password offline
+    message = f'{email}\0{password}'.encode()
+    return _digest(message)
+
+
+def _digest(message):
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def _reusable(entry, token):
+    '''Return token if it is still the one entry remembered, else None.'''
+    if token is None or not ModelBackend().user_can_authenticate(token.user):
+        return None
+    if not hmac.compare_digest(entry[2], _digest(token.user.password.encode())):
+        return None  # the password changed since it was verified
+    return token
+
+
+def cached_token(email, password):
+    '''Return the token remembered for these credentials, or None.'''
+    entry = login_cache.get(credentials_key(email, password))
+    if entry is None:
+        return None
+    token = Token.objects.select_related('user').filter(key=entry[0]).first()
+    return _reusable(entry, token)
+
+
+async def acached_token(email, password):
+    '''Async counterpart of cached_token().'''
+    entry = login_cache.get(credentials_key(email, password))
+    if entry is None:
+        return None
+    token = await Token.objects.select_related('user').filter(key=entry[0]).afirst()
+    return _reusable(entry, token)
+
+
+def remember(email, password, token):
+    '''Remember the token of verified credentials.'''
+    login_cache.set(
+        credentials_key(email, password),
+        (token.key, token.user_id, _digest(token.user.password.encode())),
+    )
+
+
+def forget_user(user):
+    '''Forget the remembered logins of a user.'''
+    login_cache.delete_matching(lambda entry: entry[1] == user.pk)
+
+
+def forget_token(key):
+    '''Forget the remembered logins using a token.'''
+    login_cache.delete_matching(lambda entry: entry[0] == key)
+
+
+def _verify(encoded, password):
+    if encoded is None:
+        # Hash anyway so unknown emails take as long as wrong passwords,
+        # like ModelBackend
+        make_password(password)
+        return False
+    # No setter: upgrading the hash writes to the database, which this
+    # thread must not do; the sync token endpoint still upgrades hashes
+    return check_password(password, encoded)
+
+
+class PasswordVerifier:
+    '''Runs password checks on a bounded thread pool.
+
+    At most workers checks run at once and queue more wait for a thread;
+    beyond that check() raises LoginBusy right away.
+    '''
+
+    def __init__(self, workers, queue):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix='password-check',
+                )
+            return self._executor
+
+    async def check(self, encoded, password):
+        '''Return whether password matches the encoded hash (None: no user).'''
+        if not self._slots.acquire(blocking=False):
+            raise LoginBusy()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), _verify, encoded, password,
+            )
+        finally:
+            self._slots.release()
+
+
+verifier = PasswordVerifier(workers=_settings()['WORKERS'], queue=_settings()['QUEUE'])
+
+
+async def aobtain_token(email, password):
+    '''Return the token of the user with these credentials, or None.
+
+    Async counterpart of authenticate() with ModelBackend followed by
+    Token.objects.get_or_create(), hashing on the verifier's pool.
+    '''
+    token = await acached_token(email, password)
+    if token is not None:
+        return token
+
+    UserModel = get_user_model()
+    user = await UserModel._default_manager.filter(
+        **{UserModel.USERNAME_FIELD: email}
+    ).afirst()
+    valid = await verifier.check(user.password if user else None, password)
+    if not valid or not ModelBackend().user_can_authenticate(user):
+        return None
+
+    token, _created = await Token.objects.select_related('user').aget_or_create(user=user)
+    remember(email, password, token)
+    return token
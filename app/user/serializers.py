@@ -10,6 +10,9 @@ from django.contrib.auth import (
 from django.utils.translation import gettext as _ # common syntax to do the translations using django
 
 from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+
+from user import login
 
 # class HellloSerializer(serializers.Serializer):
 #     name = serializers.CharField(max_length=10)    
@@ -36,28 +39,37 @@ class UserSerializer(serializers.ModelSerializer):
         
         return user
     
-class AuthTokenSerializer(serializers.Serializer): # Not a model serializer
-    '''Serializer for the user auth token.'''
+class CredentialsSerializer(serializers.Serializer): # Not a model serializer
+    '''Serializer for login credentials, without authenticating them.'''
     email = serializers.EmailField()
     password = serializers.CharField(
         style={'input_type':'password'},
         trim_whitespace=False,
     )
+
+class AuthTokenSerializer(CredentialsSerializer):
+    '''Serializer for the user auth token.'''
     
     def validate(self,attrs):
         '''Validate and authenticate the user.'''
         email = attrs.get('email')
         password = attrs.get('password')
-        user = authenticate(
-                request = self.context.get('request'),
-                username = email,
-                password=password,
-            ) 
-            
-        if not user:
-            msg = _('Unable to authenticate with provided credentials.')
-            raise serializers.ValidationError(msg, code='authorization')
-            
-        attrs['user'] = user # This will be used in the view
+        token = login.cached_token(email, password) # same credentials just verified
+        if token is None:
+            user = authenticate(
+                    request = self.context.get('request'),
+                    username = email,
+                    password=password,
+                )
+
+            if not user:
+                msg = _('Unable to authenticate with provided credentials.')
+                raise serializers.ValidationError(msg, code='authorization')
+
+            token, created = Token.objects.get_or_create(user=user)
+            token.user = user # cached with the token, without a query
+            login.remember(email, password, token)
+
+        attrs['user'] = token.user # This will be used in the view
+        attrs['token'] = token
         return attrs
-    
@@ -0,0 +1,31 @@
+'''
+Signal handlers that invalidate cached token authentication
+'''
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from user.authentication import invalidate_token, invalidate_user
+from user.login import forget_token, forget_user
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_on_token_change(sender, instance, **kwargs):
+    '''Forget a token that was changed or deleted.'''
+    invalidate_token(instance.key)
+    forget_token(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_on_user_change(sender, instance, **kwargs):
+    '''Forget the tokens of a user that was changed or deleted.
+
+    Covers deactivation, password changes and profile edits.
+    '''
+    invalidate_user(instance)
+    forget_user(instance)
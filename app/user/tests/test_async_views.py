@@ -0,0 +1,53 @@
+'''
+Tests for the async user API.
+'''
+
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient, TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from user.authentication import token_cache
+
+ASYNC_ME_URL = reverse('user-async:me')
+
+
+class AsyncMeTests(TestCase):
+    '''Test the async me endpoint.'''
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = AsyncClient()
+
+    async def test_retrieve_profile(self):
+        '''Test the profile of the token's user is returned.'''
+        res = await self.client.get(
+            ASYNC_ME_URL, headers={'Authorization': f'Token {self.token.key}'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), {'name': self.user.name, 'email': self.user.email})
+
+    async def test_retrieve_profile_from_shared_cache(self):
+        '''Test the profile is loaded for a user resolved from the shared cache.'''
+        headers = {'Authorization': f'Token {self.token.key}'}
+        shared = {'MAX_SIZE': 100, 'TTL': 60, 'SHARED_CACHE_ALIAS': 'default'}
+        with self.settings(TOKEN_AUTH_CACHE=shared):
+            await self.client.get(ASYNC_ME_URL, headers=headers)
+            token_cache.clear()  # as seen by another worker
+            res = await self.client.get(ASYNC_ME_URL, headers=headers)
+
+        self.assertEqual(res.json(), {'name': self.user.name, 'email': self.user.email})
+
+    async def test_invalid_token(self):
+        '''Test an unknown token is rejected with a challenge.'''
+        res = await self.client.get(ASYNC_ME_URL, headers={'Authorization': 'Token nope'})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res['WWW-Authenticate'], 'Token')
@@ -0,0 +1,140 @@
+'''
+Tests for cached token authentication.
+'''
+
+import pickle
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import LRUCache, _shared_key, token_cache
+
+ME_URL = reverse('user:me')
+
+
+class LRUCacheTests(SimpleTestCase):
+    '''Test the bounded LRU used for tokens.'''
+
+    def test_evicts_least_recently_used(self):
+        '''Test the oldest unused entry is dropped when full.'''
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+
+    @patch('user.authentication.time.monotonic')
+    def test_entries_expire(self, patched_monotonic):
+        '''Test entries are not returned after the TTL.'''
+        patched_monotonic.return_value = 100
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set('a', 1)
+
+        patched_monotonic.return_value = 161
+
+        self.assertIsNone(cache.get('a'))
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    '''Test authenticating API requests with a cached token.'''
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_cached(self):
+        '''Test a repeated request does not query the token again.'''
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_invalid_token_rejected(self):
+        '''Test an unknown token is still rejected.'''
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_rejected(self):
+        '''Test deleting a token invalidates the cached entry.'''
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        '''Test deactivating a user invalidates the cached entry.'''
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_change_visible(self):
+        '''Test profile changes are not hidden by the cache.'''
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {'name': 'New Name'})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'New Name')
+
+    def test_cached_user_not_shared(self):
+        '''Test requests get their own copy of the cached user.'''
+        self.client.get(ME_URL)
+        cached = token_cache.get(self.token.key)
+
+        self.client.patch(ME_URL, {'name': 'New Name'})
+
+        self.assertEqual(cached.user.name, 'Test User')
+
+    def test_shared_cache(self):
+        '''Test tokens are also resolved from the shared cache.'''
+        shared = {'MAX_SIZE': 100, 'TTL': 60, 'SHARED_CACHE_ALIAS': 'default'}
+        with self.settings(TOKEN_AUTH_CACHE=shared):
+            self.client.get(ME_URL)
+            token_cache.clear()  # as seen by another worker
+            with self.assertNumQueries(1):  # the user's profile, not the token
+                res = self.client.get(ME_URL)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.data['email'], self.user.email)
+
+            self.token.delete()
+            token_cache.clear()
+            res = self.client.get(ME_URL)
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_shared_cache_keeps_no_password(self):
+        '''Test the shared cache holds neither the password hash nor the profile.'''
+        shared = {'MAX_SIZE': 100, 'TTL': 60, 'SHARED_CACHE_ALIAS': 'default'}
+        with self.settings(TOKEN_AUTH_CACHE=shared):
+            self.client.get(ME_URL)
+
+        entry = pickle.dumps(caches['default'].get(_shared_key(self.token.key)))
+        self.assertNotIn(self.user.password.encode(), entry)
+        self.assertNotIn(self.user.email.encode(), entry)
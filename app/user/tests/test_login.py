@@ -0,0 +1,231 @@
+'''
+Tests for token issuance with off-thread password checks.
+'''
+
+import asyncio
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient, TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user import login
+
+TOKEN_URL = reverse('user:token')
+ASYNC_TOKEN_URL = reverse('user-async:token')
+PAYLOAD = {'email': 'user@example.com', 'password': 'testpass123'}
+
+
+class AsyncTokenTests(TestCase):
+    '''Test the async token endpoint.'''
+
+    def setUp(self):
+        login.login_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.client = AsyncClient()
+
+    async def test_create_token(self):
+        '''Test valid credentials get the user's token.'''
+        res = await self.client.post(ASYNC_TOKEN_URL, PAYLOAD, content_type='application/json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        token = await Token.objects.aget(user=self.user)
+        self.assertEqual(res.json(), {'token': token.key})
+
+    async def test_form_encoded(self):
+        '''Test credentials can be posted as a form, like user:token.'''
+        token = await Token.objects.acreate(user=self.user)
+
+        res = await self.client.post(ASYNC_TOKEN_URL, PAYLOAD)
+
+        self.assertEqual(res.json(), {'token': token.key})
+
+    async def test_bad_credentials(self):
+        '''Test a wrong password or unknown email gets no token.'''
+        for payload in (
+            {**PAYLOAD, 'password': 'wrong'},
+            {**PAYLOAD, 'email': 'nobody@example.com'},
+        ):
+            res = await self.client.post(ASYNC_TOKEN_URL, payload, content_type='application/json')
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('non_field_errors', res.json())
+        self.assertFalse(await Token.objects.aexists())
+
+    async def test_inactive_user(self):
+        '''Test inactive users get no token.'''
+        self.user.is_active = False
+        await self.user.asave()
+
+        res = await self.client.post(ASYNC_TOKEN_URL, PAYLOAD, content_type='application/json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_invalid_fields(self):
+        '''Test missing fields are reported per field.'''
+        res = await self.client.post(
+            ASYNC_TOKEN_URL, {'email': 'user@example.com'}, content_type='application/json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('password', res.json())
+
+    async def test_get_not_allowed(self):
+        '''Test only POST is allowed.'''
+        res = await self.client.get(ASYNC_TOKEN_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_repeated_login_not_hashed_again(self):
+        '''Test the same credentials get the token without another check.'''
+        with patch('user.login._verify', wraps=login._verify) as verify:
+            first = await self.client.post(ASYNC_TOKEN_URL, PAYLOAD, content_type='application/json')
+            second = await self.client.post(ASYNC_TOKEN_URL, PAYLOAD, content_type='application/json')
+
+        self.assertEqual(first.json(), second.json())
+        verify.assert_called_once()
+
+    async def test_password_change_forgets_login(self):
+        '''Test old credentials stop working once the password changes.'''
+        await self.client.post(ASYNC_TOKEN_URL, PAYLOAD, content_type='application/json')
+        self.user.set_password('newpass123')
+        await self.user.asave()
+
+        res = await self.client.post(ASYNC_TOKEN_URL, PAYLOAD, content_type='application/json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_deleted_token_not_reused(self):
+        '''Test a login after its token was deleted gets a new one.'''
+        first = await self.client.post(ASYNC_TOKEN_URL, PAYLOAD, content_type='application/json')
+        await Token.objects.filter(user=self.user).adelete()
+
+        second = await self.client.post(ASYNC_TOKEN_URL, PAYLOAD, content_type='application/json')
+
+        self.assertNotEqual(first.json(), second.json())
+        self.assertEqual(second.json()['token'], (await Token.objects.aget(user=self.user)).key)
+
+    async def test_token_deleted_elsewhere_not_reused(self):
+        '''Test a token deleted by another process isn't handed out.'''
+        first = await self.client.post(ASYNC_TOKEN_URL, PAYLOAD, content_type='application/json')
+        with patch('user.signals.forget_token'):  # the signal reaches the other process only
+            await Token.objects.filter(user=self.user).adelete()
+
+        second = await self.client.post(ASYNC_TOKEN_URL, PAYLOAD, content_type='application/json')
+
+        self.assertNotEqual(first.json(), second.json())
+        self.assertEqual(second.json()['token'], (await Token.objects.aget(user=self.user)).key)
+
+    async def test_busy(self):
+        '''Test logins are refused once the pool and its queue are full.'''
+        verifier = login.PasswordVerifier(workers=1, queue=0)
+        verifier._slots.acquire()  # one check in flight
+
+        with patch('user.login.verifier', verifier):
+            res = await self.client.post(ASYNC_TOKEN_URL, PAYLOAD, content_type='application/json')
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '1')
+
+
+class PasswordVerifierTests(TestCase):
+    '''Test the bounded password check pool.'''
+
+    async def test_checks_off_the_event_loop(self):
+        '''Test checks run on the pool's threads, at most workers at once.'''
+        verifier = login.PasswordVerifier(workers=2, queue=2)
+        encoded = await sync_to_async(login.make_password)('secret')
+
+        results = await asyncio.gather(*(
+            verifier.check(encoded, password)
+            for password in ('secret', 'wrong', 'secret', None)
+        ))
+
+        self.assertEqual(results, [True, False, True, False])
+        self.assertLessEqual(len(verifier._get_executor()._threads), 2)
+
+    async def test_queue_full(self):
+        '''Test checks beyond workers + queue are refused right away.'''
+        verifier = login.PasswordVerifier(workers=1, queue=1)
+        encoded = await sync_to_async(login.make_password)('secret')
+
+        results = await asyncio.gather(
+            *(verifier.check(encoded, 'secret') for _ in range(3)), return_exceptions=True,
+        )
+
+        self.assertEqual(results[:2], [True, True])
+        self.assertIsInstance(results[2], login.LoginBusy)
+
+
+class SyncTokenReuseTests(TestCase):
+    '''Test the sync token endpoint reuses just-verified logins.'''
+
+    def setUp(self):
+        login.login_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.client = APIClient()
+
+    def test_repeated_login_not_hashed_again(self):
+        '''Test the same credentials get the token without authenticating again.'''
+        with patch('user.serializers.authenticate', wraps=login.ModelBackend().authenticate) as auth:
+            first = self.client.post(TOKEN_URL, PAYLOAD)
+            second = self.client.post(TOKEN_URL, PAYLOAD)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data, second.data)
+        auth.assert_called_once()
+
+    def test_other_password_checked(self):
+        '''Test a different password is checked, not matched to the cache.'''
+        self.client.post(TOKEN_URL, PAYLOAD)
+
+        res = self.client.post(TOKEN_URL, {**PAYLOAD, 'password': 'wrong'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def _change_elsewhere(self, change):
+        '''Run change() as another process would, without forgetting logins here.'''
+        with patch('user.signals.forget_user'), patch('user.signals.forget_token'):
+            change()
+
+    def test_password_changed_elsewhere(self):
+        '''Test old credentials are checked again after another process changes the password.'''
+        self.client.post(TOKEN_URL, PAYLOAD)
+        self._change_elsewhere(lambda: get_user_model().objects.filter(pk=self.user.pk).update(
+            password=login.make_password('newpass123'),
+        ))
+
+        res = self.client.post(TOKEN_URL, PAYLOAD)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_deactivated_elsewhere(self):
+        '''Test a user deactivated by another process gets no token.'''
+        self.client.post(TOKEN_URL, PAYLOAD)
+        self._change_elsewhere(
+            lambda: get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+        )
+
+        res = self.client.post(TOKEN_URL, PAYLOAD)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_token_deleted_elsewhere(self):
+        '''Test a token deleted by another process isn't handed out.'''
+        first = self.client.post(TOKEN_URL, PAYLOAD)
+        self._change_elsewhere(lambda: Token.objects.filter(user=self.user).delete())
+
+        second = self.client.post(TOKEN_URL, PAYLOAD)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(first.data, second.data)
+        self.assertEqual(second.data['token'], Token.objects.get(user=self.user).key)
@@ -0,0 +1,104 @@
+'''
+Query budgets of the user API.
+'''
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.testing import QueryBudgetMixin, query_budget
+from user.login import login_cache
+from user.serializers import AuthTokenSerializer
+
+CREATE_USER_URL = reverse('user:create')
+TOKEN_URL = reverse('user:token')
+ME_URL = reverse('user:me')
+
+
+class UserQueryBudgetTests(QueryBudgetMixin, TestCase):
+    '''Test the user views run a fixed number of queries.'''
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', name='Test User', password='testpass123'
+        )
+        self.client = APIClient()
+        self.password = make_password('testpass123')
+        self.added = 0
+        login_cache.clear()
+
+    def add_users(self, count):
+        '''Add count other users.'''
+        get_user_model().objects.bulk_create(
+            get_user_model()(email=f'other{n}@example.com', name='Other', password=self.password)
+            for n in range(self.added, self.added + count)
+        )
+        self.added += count
+
+    @query_budget(2)
+    def test_create(self):
+        '''Test creating a user.'''
+        def request():
+            return self.client.post(CREATE_USER_URL, {
+                'email': f'new{self.added}@example.com', 'password': 'testpass123', 'name': 'New',
+            })
+        responses = self.assertQueriesFlat(request, self.add_users)
+        self.assertEqual(responses[-1].status_code, status.HTTP_201_CREATED)
+
+    @query_budget(5)
+    def test_first_token(self):
+        '''Test creating a user's token.'''
+        res = self.client.post(TOKEN_URL, {'email': 'user@example.com', 'password': 'testpass123'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @query_budget(2)
+    def test_token(self):
+        '''Test retrieving an existing token.'''
+        Token.objects.create(user=self.user)
+
+        def request():
+            login_cache.clear()
+            return self.client.post(TOKEN_URL, {'email': 'user@example.com', 'password': 'testpass123'})
+        responses = self.assertQueriesFlat(request, self.add_users)
+        self.assertEqual(responses[-1].status_code, status.HTTP_200_OK)
+
+    @query_budget(1)
+    def test_token_reused(self):
+        '''Test logging in again with the same credentials.'''
+        payload = {'email': 'user@example.com', 'password': 'testpass123'}
+        self.assertTrue(AuthTokenSerializer(data=payload).is_valid())
+
+        responses = self.assertQueriesFlat(lambda: self.client.post(TOKEN_URL, payload), self.add_users)
+        self.assertEqual(responses[-1].status_code, status.HTTP_200_OK)
+
+    @query_budget(0)
+    def test_retrieve_me(self):
+        '''Test retrieving the authenticated user.'''
+        self.client.force_authenticate(self.user)
+        self.assertQueriesFlat(lambda: self.client.get(ME_URL), self.add_users)
+
+    @query_budget(3)
+    def test_update_me(self):
+        '''Test replacing the authenticated user's profile.'''
+        self.client.force_authenticate(self.user)
+        responses = self.assertQueriesFlat(
+            lambda: self.client.put(ME_URL, {
+                'email': 'user@example.com', 'name': 'New name', 'password': 'newpass123',
+            }),
+            self.add_users,
+        )
+        self.assertEqual(responses[-1].status_code, status.HTTP_200_OK)
+
+    @query_budget(1)
+    def test_partial_update_me(self):
+        '''Test updating the authenticated user's name.'''
+        self.client.force_authenticate(self.user)
+        responses = self.assertQueriesFlat(
+            lambda: self.client.patch(ME_URL, {'name': 'New name'}), self.add_users,
+        )
+        self.assertEqual(responses[-1].status_code, status.HTTP_200_OK)
@@ -2,11 +2,15 @@
 Views for the user API.
 '''
 
-from rest_framework import generics , authentication , permissions
+from rest_framework import generics , permissions
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
 
+from core.db import ReplicaReadMixin
+from core.middleware import TimedSerializerMixin
+from user.authentication import CachedTokenAuthentication, load_user
 from user.serializers import (
     UserSerializer, 
     AuthTokenSerializer,
@@ -21,13 +25,20 @@ class CreateTokenView(ObtainAuthToken): # Customize ObtainAuthToken to use our s
     '''We are using the OAT view provided by dajngo and customizing the serializer we created'''
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES # This is optional 
+
+    def post(self, request, *args, **kwargs):
+        '''Return the token the serializer got or reused for the credentials.'''
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'token': serializer.validated_data['token'].key})
         
-class ManageUserView(generics.RetrieveUpdateAPIView): 
+class ManageUserView(ReplicaReadMixin, TimedSerializerMixin, generics.RetrieveUpdateAPIView): 
     '''Manage the authenticated user.'''
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def get_object(self): # '''Retrieve and return the authenticated user.''' 
+        load_user(self.request.user)
         return self.request.user
     